@@ -0,0 +1,171 @@
+from collections.abc import Iterable, Iterator
+from itertools import islice
+
+import numpy as np
+from rapidfuzz.distance import Indel
+from rapidfuzz.process import cdist, cpdist
+
+from .columns import INDEX_DTYPE, SCORE_DTYPE
+
+# Indel.normalized_similarity is what Levenshtein.ratio computes
+SCORER = Indel.normalized_similarity
+# Number of scores computed per call into RapidFuzz
+BLOCK_CELLS = 2_000_000
+
+
+def pair_blocks(
+    n: int,
+    pairs: Iterable[tuple[int, int]] | None = None,
+    block_cells: int = BLOCK_CELLS,
+) -> Iterator[tuple[np.ndarray, np.ndarray, tuple[int, int] | None]]:
+    """
+    Splits the pairs to score into blocks of index arrays.
+
+    Without pairs, the upper triangle of the n x n matrix is split into row ranges and the
+    row range is returned along with the indices so that it can be scored with cdist().
+    Otherwise the pairs are consumed in chunks of block_cells and the row range is None.
+    Either way the indices come out in the order of combinations(range(n), 2).
+
+    Yields
+    -------
+    tuple[np.ndarray, np.ndarray, tuple[int, int] | None]
+        Indices i and j of the pairs in the block, and the row range [start, end).
+    """
+    if pairs is None:
+        rows = max(1, block_cells // max(n, 1))
+        for start in range(0, n, rows):
+            end = min(start + rows, n)
+            # Columns start..n-1, only j > i is kept
+            r, c = np.triu_indices(end - start, k=1, m=n - start)
+            yield r + start, c + start, (start, end)
+        return
+
+    pairs = iter(pairs)
+    while chunk := list(islice(pairs, block_cells)):
+        idx = np.array(chunk, dtype=np.int64).reshape(-1, 2)
+        yield idx[:, 0], idx[:, 1], None
+
+
+def _scores(
+    values: list[str],
+    i: np.ndarray,
+    j: np.ndarray,
+    rows: tuple[int, int] | None,
+    workers: int,
+) -> np.ndarray:
+    """
+    Levenshtein ratio of values[i] and values[j] for every pair of the block.
+    """
+    if rows is None:
+        return cpdist(
+            [values[k] for k in i],
+            [values[k] for k in j],
+            scorer=SCORER,
+            dtype=SCORE_DTYPE,
+            workers=workers,
+        )
+    start, end = rows
+    matrix = cdist(
+        values[start:end],
+        values[start:],
+        scorer=SCORER,
+        dtype=SCORE_DTYPE,
+        workers=workers,
+    )
+    return matrix[i - start, j - start]
+
+
+def _contains(haystack: np.ndarray, needle: np.ndarray) -> np.ndarray:
+    """
+    Element-wise needle in haystack for arrays of strings.
+    """
+    return np.strings.find(haystack, needle) >= 0
+
+
+def batch_bird(
+    table: list[tuple[str, ...]],
+    generic_prefixes: set[str],
+    email_check: bool,
+    pairs: Iterable[tuple[int, int]] | None = None,
+    c4_c7: bool = False,
+    improved: bool = False,
+    workers: int = -1,
+    block_cells: int = BLOCK_CELLS,
+) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Scores developer pairs with the Bird heuristic in blocks, using RapidFuzz across
+    multiple threads instead of calling Levenshtein.ratio() pair by pair.
+
+    Gives the same values as bird_c1_c3_norm() and bird_c4_c7_norm(), or as
+    improved_c1_c3_norm() when improved is set.
+
+    Args
+    ------
+        table : list[tuple[str, ...]]
+            Normalized developers from process_devs(devs).
+        generic_prefixes : set[str]
+            Generic email prefixes.
+        email_check : bool
+            If True, c2 is 0 for pairs with a generic email prefix. Ignored if improved.
+        pairs : Iterable[tuple[int, int]] | None
+            Index pairs (i, j), i < j, to score. All pairs are scored if not given.
+        c4_c7 : bool
+            Also calculate conditions c4 to c7.
+        improved : bool
+            Use the improved email check: c2 is 0 for pairs with a generic email prefix
+            only when c1 < 0.60.
+        workers : int
+            Number of threads used by RapidFuzz, -1 uses all cores.
+        block_cells : int
+            Most scores computed per block, see pair_blocks().
+
+    Yields
+    -------
+    dict[str, np.ndarray]
+        Typed columns (see evaluators.columns) of the pairs of a block: i, j, c1, c2,
+        c3.1, c3.2 and, if c4_c7, c4 to c7.
+    """
+    columns = [list(column) for column in zip(*(norm[:7] for norm in table))]
+    names, firsts, lasts, i_firsts, i_lasts, _, prefixes = columns or [[]] * 7
+    generic = np.array([prefix in generic_prefixes for prefix in prefixes], dtype=bool)
+    if c4_c7:
+        first_arr = np.array(firsts, dtype=str)
+        last_arr = np.array(lasts, dtype=str)
+        i_first_arr = np.array(i_firsts, dtype=str)
+        i_last_arr = np.array(i_lasts, dtype=str)
+        prefix_arr = np.array(prefixes, dtype=str)
+
+    for i, j, rows in pair_blocks(len(table), pairs, block_cells):
+        if len(i) == 0:
+            continue
+        c1 = _scores(names, i, j, rows, workers)
+        c2 = _scores(prefixes, i, j, rows, workers)
+        generic_pair = generic[i] | generic[j]
+        if improved:
+            c2[generic_pair & (c1 < 0.60)] = 0
+        elif email_check:
+            c2[generic_pair] = 0
+        block = {
+            "i": i.astype(INDEX_DTYPE),
+            "j": j.astype(INDEX_DTYPE),
+            "c1": c1,
+            "c2": c2,
+            "c3.1": _scores(firsts, i, j, rows, workers),
+            "c3.2": _scores(lasts, i, j, rows, workers),
+        }
+        if c4_c7:
+            # Since lastname and initials can be empty, perform appropriate checks
+            for col, a, b in (("c4", i, j), ("c6", j, i)):
+                block[col] = (
+                    (i_first_arr[a] != "")
+                    & (last_arr[a] != "")
+                    & _contains(prefix_arr[b], i_first_arr[a])
+                    & _contains(prefix_arr[b], last_arr[a])
+                )
+            for col, a, b in (("c5", i, j), ("c7", j, i)):
+                block[col] = (
+                    (i_last_arr[a] != "")
+                    & _contains(prefix_arr[b], i_last_arr[a])
+                    & _contains(prefix_arr[b], first_arr[a])
+                )
+        yield block
@@ -0,0 +1,102 @@
+from collections.abc import Iterable
+
+import numpy as np
+import pandas as pd
+
+# Pair results are kept as typed columns: int32 developer indices "i" and "j", then one
+# float32 column per similarity score and one bool column per True/False condition, as
+# declared by the evaluator. Names and emails are looked up from the indices only when
+# rows are written.
+INDEX_DTYPE = np.int32
+SCORE_DTYPE = np.float32
+# Columns identifying the pair in every output row
+BASE_COLUMNS = ["name_1", "email_1", "name_2", "email_2"]
+# Pairs per chunk of columns when scoring and writing
+CHUNK_SIZE = 100_000
+
+
+def empty_columns(score_types: dict[str, type]) -> dict[str, np.ndarray]:
+    """
+    Columns without any pair.
+    """
+    columns = {"i": np.empty(0, INDEX_DTYPE), "j": np.empty(0, INDEX_DTYPE)}
+    for col, dtype in score_types.items():
+        columns[col] = np.empty(0, dtype)
+    return columns
+
+
+def to_columns(
+    i: list[int], j: list[int], scores: list[tuple], score_types: dict[str, type]
+) -> dict[str, np.ndarray]:
+    """
+    Converts the pairs (i[k], j[k]) and their score tuples into typed columns.
+
+    Args
+    -------
+    i, j : list[int]
+        Developer indices of the pairs.
+    scores : list[tuple]
+        Scores of every pair, in the order of score_types.
+    score_types : dict[str, type]
+        Name and type of every score, e.g. {"c1": SCORE_DTYPE, "c4": np.bool_}.
+    """
+    if not scores:
+        return empty_columns(score_types)
+    columns = {
+        "i": np.array(i, dtype=INDEX_DTYPE),
+        "j": np.array(j, dtype=INDEX_DTYPE),
+    }
+    for (col, dtype), values in zip(score_types.items(), zip(*scores)):
+        columns[col] = np.array(values, dtype=dtype)
+    return columns
+
+
+def concat_columns(
+    chunks: list[dict[str, np.ndarray]], score_types: dict[str, type]
+) -> dict[str, np.ndarray]:
+    """
+    Joins chunks of columns.
+    """
+    if not chunks:
+        return empty_columns(score_types)
+    if len(chunks) == 1:
+        return chunks[0]
+    return {col: np.concatenate([c[col] for c in chunks]) for col in chunks[0]}
+
+
+def take(columns: dict[str, np.ndarray], rows: np.ndarray | slice) -> dict:
+    """
+    Selects rows, by mask or slice, from every column.
+    """
+    return {col: values[rows] for col, values in columns.items()}
+
+
+def to_frame(
+    columns: dict[str, np.ndarray],
+    names: np.ndarray,
+    emails: np.ndarray,
+    score_cols: Iterable[str],
+) -> pd.DataFrame:
+    """
+    Builds the output rows of the pairs: original names and emails, then the scores.
+
+    Args
+    -------
+    columns : dict[str, np.ndarray]
+        Pair columns.
+    names, emails : np.ndarray
+        Object arrays of the original name and email of every developer.
+    score_cols : Iterable[str]
+        Score columns to write, in order.
+    """
+    score_cols = list(score_cols)
+    i, j = columns["i"], columns["j"]
+    data = {
+        "name_1": names[i],
+        "email_1": emails[i],
+        "name_2": names[j],
+        "email_2": emails[j],
+    }
+    for col in score_cols:
+        data[col] = columns[col]
+    return pd.DataFrame(data, columns=BASE_COLUMNS + score_cols)
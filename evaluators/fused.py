@@ -0,0 +1,320 @@
+import functools
+from collections.abc import Iterable, Iterator
+import numpy as np
+from Levenshtein import ratio as sim
+from .batch import BLOCK_CELLS, batch_bird
+from .columns import CHUNK_SIZE, SCORE_DTYPE
+from .output import print_summary, print_top_k_summary, write_targets, write_top_k
+from .parallel import score_chunks
+from .maps import maps_settings, mapped_chunks
+from .store import store_path, stored_scores
+from .topk import top_k_file
+from .similarity_default import (
+    DEFAULT_SCORES,
+    bird_c4_c7_norm,
+    default_outputs,
+    default_pass_score,
+)
+from .similarity_jaro import JARO_SCORES, jaro_c1_c4_norm, jaro_outputs, jaro_pass_score
+from .similarity_no_c4c7 import NO_C4C7_SCORES, no_c4c7_outputs, no_c4c7_pass_score
+from .similarity_no_c4c7_improved import improved_outputs
+from tools.helpers import process_devs
+from tools.profiling import profiled
+
+# Evaluators of similarity_fused(), in the order of main.py
+EVALUATORS = ("default", "no_c4c7", "jaro", "improved")
+
+# Output column -> fused column, for every evaluator
+_COLUMNS = {
+    "default": {
+        "c1": "c1",
+        "c2": "c2",
+        "c3.1": "c3.1",
+        "c3.2": "c3.2",
+        "c4": "c4",
+        "c5": "c5",
+        "c6": "c6",
+        "c7": "c7",
+    },
+    "no_c4c7": {"c1": "c1", "c2": "c2", "c3.1": "c3.1", "c3.2": "c3.2"},
+    "improved": {"c1": "c1", "c2": "c2_improved", "c3.1": "c3.1", "c3.2": "c3.2"},
+    "jaro": {"c1": "jw_c1", "c2": "jw_c2", "c3": "jw_c3", "c4": "jw_c4"},
+}
+_SCORES = {
+    "default": DEFAULT_SCORES,
+    "no_c4c7": NO_C4C7_SCORES,
+    "improved": NO_C4C7_SCORES,
+    "jaro": JARO_SCORES,
+}
+
+
+def fused_score_types(evaluators: Iterable[str]) -> dict[str, type]:
+    """
+    Columns computed for a set of evaluators and their types. Each column is computed once
+    however many of the evaluators need it.
+    """
+    score_types = {}
+    for evaluator in EVALUATORS:
+        if evaluator in evaluators:
+            for col, source in _COLUMNS[evaluator].items():
+                score_types[source] = _SCORES[evaluator][col]
+    return score_types
+
+
+def fused_scores(
+    norm_a: tuple[str, ...],
+    norm_b: tuple[str, ...],
+    generic_prefixes: set[str],
+    email_check: bool,
+    score_cols: tuple[str, ...],
+) -> tuple:
+    """
+    Scores the columns score_cols of one pair of developers, computing every Levenshtein
+    ratio only once. Gives the same values as the score functions of the evaluators.
+    """
+    name_a, first_a, last_a, _, _, _, prefix_a = norm_a[:7]
+    name_b, first_b, last_b, _, _, _, prefix_b = norm_b[:7]
+    c1 = sim(name_a, name_b)
+    generic = prefix_a in generic_prefixes or prefix_b in generic_prefixes
+    drop_c2 = generic and email_check
+    drop_c2_improved = generic and c1 < 0.60
+    prefix_sim = 0
+    if ("c2" in score_cols and not drop_c2) or (
+        "c2_improved" in score_cols and not drop_c2_improved
+    ):
+        prefix_sim = sim(prefix_a, prefix_b)
+
+    scores = {
+        "c1": c1,
+        "c2": 0 if drop_c2 else prefix_sim,
+        "c2_improved": 0 if drop_c2_improved else prefix_sim,
+        "c3.1": sim(first_a, first_b),
+        "c3.2": sim(last_a, last_b),
+    }
+    if "c4" in score_cols:
+        scores.update(zip(("c4", "c5", "c6", "c7"), bird_c4_c7_norm(norm_a, norm_b)))
+    if "jw_c1" in score_cols:
+        jaro = jaro_c1_c4_norm(norm_a, norm_b, generic_prefixes, email_check)[:4]
+        scores.update(zip(("jw_c1", "jw_c2", "jw_c3", "jw_c4"), jaro))
+    return tuple(scores[col] for col in score_cols)
+
+
+def _batch_chunks(
+    table: list[tuple[str, ...]],
+    generic_prefixes: set[str],
+    email_check: bool,
+    score_types: dict[str, type],
+    pairs: Iterable[tuple[int, int]] | None,
+    block_cells: int,
+) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Fused columns of blocks of pairs, with the Levenshtein ratios from batch_bird().
+    """
+    generic = np.array([norm[6] in generic_prefixes for norm in table], dtype=bool)
+    blocks = batch_bird(
+        table,
+        generic_prefixes,
+        False,
+        pairs,
+        c4_c7="c4" in score_types,
+        block_cells=block_cells,
+    )
+    for block in blocks:
+        i, j = block["i"], block["j"]
+        generic_pair = generic[i] | generic[j]
+        # batch_bird() without email check gives the plain prefix ratio
+        prefix_sim = block.pop("c2")
+        if "c2" in score_types:
+            block["c2"] = np.where(generic_pair & email_check, 0, prefix_sim).astype(
+                SCORE_DTYPE
+            )
+        if "c2_improved" in score_types:
+            block["c2_improved"] = np.where(
+                generic_pair & (block["c1"] < 0.60), 0, prefix_sim
+            ).astype(SCORE_DTYPE)
+        if "jw_c1" in score_types:
+            jaro = [
+                jaro_c1_c4_norm(table[a], table[b], generic_prefixes, email_check)[:4]
+                for a, b in zip(i.tolist(), j.tolist())
+            ]
+            for col, values in zip(("jw_c1", "jw_c2", "jw_c3", "jw_c4"), zip(*jaro)):
+                block[col] = np.array(values, dtype=SCORE_DTYPE)
+        yield {col: block[col] for col in ("i", "j", *score_types)}
+
+
+@profiled("similarity_fused")
+def similarity_fused(
+    devs: list[list[str]],
+    data_folder: str,
+    email_check: bool,
+    generic_prefixes: set[str],
+    thresholds: list[float],
+    evaluators: Iterable[str] = EVALUATORS,
+    table: list[tuple[str, ...]] | None = None,
+    pairs: Iterable[tuple[int, int]] | None = None,
+    backend: str = "pair",
+    workers: int = 1,
+    chunk_size: int | None = None,
+    store: bool = False,
+    output_format: str = "csv",
+    score_maps: bool = False,
+    top_k: int | None = None,
+):
+    """
+    Runs several evaluators over one walk of the developer pairs.
+
+    Every pair is scored once for the union of the conditions of the evaluators, sharing
+    the Levenshtein ratios between them, and the results are written to the files of
+    each evaluator. The files and printed summaries are the same as running the
+    evaluators one after the other, in the order of the evaluators argument.
+
+    Args
+    ------
+        devs : list[list[str]]
+            List of developer lists containing ["name", "email"].
+        data_folder : str
+            Base folder path where output CSV files will be saved (as "{folder}-data").
+        email_check : bool
+            If True, email prefixes matching generic domains are excluded from similarity
+            checks. The improved evaluator always runs with its own email check.
+        threshholds : list[float]
+            List of similarity threshold values (0.0-1.0) to generate separate filtered outputs.
+        evaluators : Iterable[str]
+            Evaluators to run, among "default" (similarity_default), "no_c4c7"
+            (similarity_no_c4c7), "jaro" (similarity_jw_bird) and "improved"
+            (similarity_no_c4c7_email_improved).
+        table : list[tuple[str, ...]] | None
+            Normalized developers from process_devs(devs). Built here if not given.
+        pairs : Iterable[tuple[int, int]] | None
+            Index pairs (i, j), i < j, to score, e.g. from tools.blocking.blocked_pairs().
+            All pairs are scored if not given. Pruned pairs must suit every evaluator.
+        backend : str
+            "pair" scores one pair at a time, "batch" computes the Levenshtein ratios in
+            blocks with RapidFuzz (see evaluators.batch).
+        workers : int
+            Number of processes scoring the pairs in parallel shards, "pair" backend only.
+        chunk_size : int | None
+            If given, pairs are scored and written in chunks of this many rows.
+        store : bool
+            Keep the scores of all pairs in a store in data_folder and, on the next run,
+            score only the pairs involving new developers (see evaluators.store).
+            Needs all pairs, pairs must not be given.
+        output_format : str
+            "csv", or "parquet" to write compressed .parquet files in row groups
+            instead of the .csv files (see evaluators.output.read_pairs()).
+        score_maps : bool
+            Also keep every score of all pairs in condensed arrays on disk, in a
+            "maps_*" folder of data_folder, to write threshold files again for other
+            thresholds without scoring (see tools.rethreshold). Needs all pairs, pairs
+            must not be given.
+        top_k : int | None
+            If given, write the top_k nearest identities of every developer to a
+            "_top={top_k}" file of every evaluator instead of its all-pairs and
+            threshold files (see evaluators.topk).
+    """
+    evaluators = list(evaluators)
+    for evaluator in evaluators:
+        if evaluator not in EVALUATORS:
+            raise ValueError(f"Unknown evaluator: {evaluator}")
+    if table is None:
+        table = process_devs(devs)
+
+    score_types = fused_score_types(evaluators)
+
+    def score(pairs):
+        if backend == "batch":
+            return _batch_chunks(
+                table,
+                generic_prefixes,
+                email_check,
+                score_types,
+                pairs,
+                chunk_size or BLOCK_CELLS,
+            )
+        elif backend == "pair":
+            return score_chunks(
+                table,
+                fused_scores,
+                (generic_prefixes, email_check, tuple(score_types)),
+                score_types,
+                pairs,
+                workers,
+                chunk_size or CHUNK_SIZE,
+            )
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
+
+    if store:
+        if pairs is not None:
+            raise ValueError("The score store needs all pairs, pairs must not be given")
+        settings = repr(
+            ("fused", email_check, sorted(generic_prefixes), list(score_types))
+        )
+        chunks = stored_scores(
+            devs,
+            store_path(data_folder, "fused", settings),
+            settings,
+            score_types,
+            score,
+        )
+    else:
+        chunks = score(pairs)
+    if score_maps:
+        if pairs is not None:
+            raise ValueError("Score maps need all pairs, pairs must not be given")
+        for evaluator in evaluators:
+            chunks = mapped_chunks(
+                chunks,
+                devs,
+                data_folder,
+                maps_settings(evaluator, email_check, generic_prefixes),
+                _SCORES[evaluator],
+                _COLUMNS[evaluator],
+            )
+
+    outputs = {
+        "default": (default_outputs, default_pass_score),
+        "no_c4c7": (no_c4c7_outputs, no_c4c7_pass_score),
+        "jaro": (jaro_outputs, jaro_pass_score),
+    }
+    titles = []
+    targets = []
+    for evaluator in evaluators:
+        if evaluator == "improved":
+            get_outputs, pass_score = improved_outputs, no_c4c7_pass_score
+        else:
+            evaluator_outputs, pass_score = outputs[evaluator]
+            get_outputs = functools.partial(
+                evaluator_outputs, email_check, generic_prefixes
+            )
+        title, all_pairs_file, threshold_files = get_outputs(thresholds)
+        titles.append(title)
+        target = {
+            "columns": _COLUMNS[evaluator],
+            "all_pairs_file": all_pairs_file,
+            "threshold_files": threshold_files,
+            "pass_score": pass_score,
+        }
+        if top_k is not None:
+            target["top_k_file"] = top_k_file(get_outputs, top_k)
+        targets.append(target)
+
+    if top_k is not None:
+        results = write_top_k(
+            chunks, devs, score_types, data_folder, targets, top_k, output_format
+        )
+        for title, (pair_count, rows) in zip(titles, results):
+            print_top_k_summary(title, pair_count, top_k, rows)
+        return
+
+    results = write_targets(
+        chunks,
+        devs,
+        score_types,
+        data_folder,
+        targets,
+        stream=chunk_size is not None,
+        output_format=output_format,
+    )
+    for title, (pair_count, limited) in zip(titles, results):
+        print_summary(title, pair_count, thresholds, limited)
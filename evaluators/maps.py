@@ -0,0 +1,238 @@
+import csv
+import hashlib
+import json
+import os
+from collections.abc import Callable, Iterable, Iterator
+from shutil import rmtree
+
+import numpy as np
+
+from .columns import INDEX_DTYPE
+from tools.profiling import stage
+
+# Developers of the maps, in the order of their indices
+MAPS_DEVS = "devs.csv"
+# Evaluator settings, number of developers and score columns of the maps
+MAPS_META = "meta.json"
+
+
+def maps_settings(
+    evaluator: str, email_check: bool, generic_prefixes: set[str]
+) -> dict:
+    """
+    Settings of the score maps of an evaluator, the same for the evaluator function and
+    similarity_fused(). The improved evaluator always checks emails.
+    """
+    settings = {"evaluator": evaluator, "email_check": email_check}
+    if evaluator == "improved":
+        del settings["email_check"]
+    settings["generic_prefixes"] = sorted(generic_prefixes)
+    return settings
+
+
+def maps_path(data_folder: str, settings: dict) -> str:
+    """
+    Folder of the score maps of an evaluator run with the given settings.
+    """
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+    return os.path.join(data_folder, f"maps_{settings['evaluator']}_{digest[:8]}")
+
+
+def condensed_index(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """
+    Position of the pairs (i, j), i < j, of n developers in the condensed upper
+    triangle, the order of combinations(range(n), 2).
+    """
+    i, j = np.asarray(i, dtype=np.int64), np.asarray(j, dtype=np.int64)
+    return i * (2 * n - i - 1) // 2 + j - i - 1
+
+
+def condensed_pairs(n: int, k: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs (i, j) of n developers at positions k of the condensed upper triangle, the
+    inverse of condensed_index().
+    """
+    k = np.asarray(k, dtype=np.int64)
+    # Pairs before row i of the upper triangle, (n - 1) + (n - 2) + ... + (n - i)
+    starts = np.arange(n, dtype=np.int64)
+    starts = starts * n - starts * (starts + 1) // 2
+    i = np.searchsorted(starts, k, side="right") - 1
+    return i, k - starts[i] + i + 1
+
+
+def open_maps(
+    path: str, n: int, score_types: dict[str, type]
+) -> tuple[str, dict[str, np.ndarray]]:
+    """
+    Creates the condensed arrays of the scores of all pairs of n developers, as
+    writable memory maps in a temporary folder next to path, see close_maps().
+
+    Returns
+    -------
+    tuple[str, dict[str, np.ndarray]]
+        The temporary folder, and the array of every score.
+    """
+    tmp = f"{path}.tmp"
+    rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    maps = {
+        col: np.lib.format.open_memmap(
+            os.path.join(tmp, f"{col}.npy"),
+            mode="w+",
+            dtype=dtype,
+            shape=(n * (n - 1) // 2,),
+        )
+        for col, dtype in score_types.items()
+    }
+    return tmp, maps
+
+
+def write_maps(
+    maps: dict[str, np.ndarray],
+    n: int,
+    chunk: dict[str, np.ndarray],
+    columns: dict[str, str],
+):
+    """
+    Writes the scores of a chunk of pairs of n developers at their positions in the
+    condensed arrays. columns maps every array to its chunk column.
+    """
+    k = condensed_index(n, chunk["i"], chunk["j"])
+    for col, source in columns.items():
+        maps[col][k] = chunk[source]
+
+
+def close_maps(
+    maps: dict[str, np.ndarray],
+    tmp: str,
+    path: str,
+    devs: list[list[str]],
+    meta: dict,
+):
+    """
+    Completes the arrays of open_maps() with the developers and meta data, and puts
+    them in place of path.
+    """
+    for values in maps.values():
+        values.flush()
+    with open(os.path.join(tmp, MAPS_DEVS), "w", newline="") as csvfile:
+        writer = csv.writer(csvfile, delimiter=",", quotechar='"')
+        writer.writerow(["name", "email"])
+        writer.writerows(dev[:2] for dev in devs)
+    with open(os.path.join(tmp, MAPS_META), "w") as file:
+        meta = dict(
+            meta,
+            devs=len(devs),
+            scores={col: values.dtype.name for col, values in maps.items()},
+        )
+        json.dump(meta, file, indent=2)
+    rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def mapped_chunks(
+    chunks: Iterable[dict[str, np.ndarray]],
+    devs: list[list[str]],
+    data_folder: str,
+    settings: dict,
+    score_types: dict[str, type],
+    columns: dict[str, str] | None = None,
+) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Passes the chunks of scored pairs on, writing their scores on the way into
+    condensed arrays on disk, one .npy file per score, with a value for every pair in
+    the order of combinations(range(len(devs)), 2). The developers are kept alongside,
+    so the files can be memory-mapped by later runs (see load_maps()) to filter the
+    pairs again without scoring them.
+
+    The maps are written to a temporary folder and replace the old ones once all
+    chunks are through, the folder is removed if the chunks stop before. The chunks
+    must hold all pairs.
+
+    Args
+    -------
+    chunks : Iterable[dict[str, np.ndarray]]
+        Scored pairs as typed columns (see evaluators.columns).
+    devs : list[list[str]]
+        List of developer lists containing ["name", "email"].
+    data_folder : str
+        Folder of the maps folder, see maps_path().
+    settings : dict
+        Evaluator and its arguments from maps_settings(), saved with the maps.
+    score_types : dict[str, type]
+        Score columns of the evaluator and their types.
+    columns : dict[str, str] | None
+        Score column -> chunk column, the same names if not given.
+
+    Yields
+    -------
+    dict[str, np.ndarray]
+        The chunks, unchanged.
+    """
+    columns = columns or {col: col for col in score_types}
+    n = len(devs)
+    path = maps_path(data_folder, settings)
+    tmp, maps = open_maps(path, n, {col: score_types[col] for col in columns})
+    done = False
+    try:
+        for chunk in chunks:
+            with stage("maps"):
+                write_maps(maps, n, chunk, columns)
+            yield chunk
+        close_maps(maps, tmp, path, devs, {"settings": settings})
+        done = True
+    finally:
+        # Stopped early or failed, the old maps are kept
+        if not done:
+            del maps
+            rmtree(tmp, ignore_errors=True)
+    print(f"Score maps: {path}")
+
+
+def load_maps(path: str) -> tuple[list[list[str]], dict, dict[str, np.ndarray]]:
+    """
+    Opens the score maps written by mapped_chunks().
+
+    Returns
+    -------
+    tuple[list[list[str]], dict, dict[str, np.ndarray]]
+        The developers, the meta data ("settings", "devs" and "scores"), and the
+        read-only memory-mapped array of every score. Only the parts of the arrays
+        that are used are read from disk.
+    """
+    with open(os.path.join(path, MAPS_META), "r") as file:
+        meta = json.load(file)
+    with open(os.path.join(path, MAPS_DEVS), "r", newline="") as csvfile:
+        reader = csv.reader(csvfile, delimiter=",")
+        next(reader)
+        devs = [row for row in reader]
+    maps = {
+        col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r")
+        for col in meta["scores"]
+    }
+    return devs, meta, maps
+
+
+def map_chunks(
+    maps: dict[str, np.ndarray],
+    n: int,
+    keep: Callable[[dict[str, np.ndarray]], np.ndarray] | None,
+    size: int,
+) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Reads the maps of n developers size pairs at a time, and yields the pairs kept by
+    keep, a function giving the rows of a chunk of scores to keep, or all pairs if
+    None, as typed columns (see evaluators.columns).
+    """
+    total = n * (n - 1) // 2
+    for start in range(0, total, size):
+        scores = {col: values[start : start + size] for col, values in maps.items()}
+        if keep is None:
+            rows = np.arange(min(size, total - start))
+        else:
+            rows = keep(scores)
+        i, j = condensed_pairs(n, start + rows)
+        chunk = {"i": i.astype(INDEX_DTYPE), "j": j.astype(INDEX_DTYPE)}
+        for col, values in scores.items():
+            chunk[col] = np.asarray(values[rows])
+        yield chunk
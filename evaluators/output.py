@@ -0,0 +1,433 @@
+import os
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import ExitStack
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .columns import BASE_COLUMNS, CHUNK_SIZE, concat_columns, take, to_frame
+from .topk import top_k_columns
+from tools.profiling import profiled_chunks, stage
+
+# File formats of write_outputs()
+OUTPUT_FORMATS = ("csv", "parquet")
+# Compression of the parquet files
+PARQUET_COMPRESSION = "zstd"
+
+
+def output_name(name: str, output_format: str) -> str:
+    """
+    Name of an output file in the format, e.g. "devs_similarity.parquet" for
+    "devs_similarity.csv".
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return f"{os.path.splitext(name)[0]}.{output_format}"
+
+
+def _csv_writer(stack: ExitStack, path: str, schema: pa.Schema) -> Callable:
+    """
+    Opens a csv output and writes its header, files without pairs still have it.
+    Returns the function writing a frame of rows to it.
+    """
+    file = stack.enter_context(open(path, "w", newline=""))
+    file.write(",".join(schema.names) + "\n")
+    return lambda df: df.to_csv(file, index=False, header=False)
+
+
+def _parquet_writer(stack: ExitStack, path: str, schema: pa.Schema) -> Callable:
+    """
+    Opens a parquet output, every frame written to it is one or more row groups. Names
+    and emails repeat across the rows and are dictionary encoded per row group.
+    """
+    writer = stack.enter_context(
+        pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION)
+    )
+    return lambda df: writer.write_table(
+        pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    )
+
+
+def read_pairs(
+    path: str,
+    columns: list[str] | Callable[[str], bool] | None = None,
+    chunksize: int | None = None,
+) -> pd.DataFrame | Iterator[pd.DataFrame]:
+    """
+    Reads an output file of the evaluators, .csv or .parquet. Only the given columns
+    are read, from a parquet file the others are not even decompressed.
+
+    Args
+    -------
+    path : str
+        Output file, e.g. "three.js-data/devs_similarity.parquet".
+    columns : list[str] | Callable[[str], bool] | None
+        Columns to read, or a function telling whether to read a column. All columns
+        if not given.
+    chunksize : int | None
+        If given, the rows are read in frames of at most this many rows, one at a time.
+
+    Returns
+    -------
+    pd.DataFrame | Iterator[pd.DataFrame]
+        The rows, or their frames with chunksize. Names and emails are strings, empty
+        ones included.
+    """
+    if not path.endswith(".parquet"):
+        return pd.read_csv(
+            path,
+            usecols=columns,
+            dtype={col: str for col in BASE_COLUMNS},
+            keep_default_na=False,
+            chunksize=chunksize,
+        )
+
+    file = pq.ParquetFile(path)
+    if callable(columns):
+        columns = [col for col in file.schema_arrow.names if columns(col)]
+    if chunksize is None:
+        return file.read(columns=columns).to_pandas()
+    return (
+        batch.to_pandas()
+        for batch in file.iter_batches(batch_size=chunksize, columns=columns)
+    )
+
+
+def slices(columns: dict[str, np.ndarray], size: int) -> Iterator[dict]:
+    """
+    Splits columns held in memory into chunks of size rows.
+    """
+    for start in range(0, len(columns["i"]), size):
+        yield take(columns, slice(start, start + size))
+
+
+def threshold_rows(
+    pass_scores: np.ndarray, thresholds: list[float]
+) -> Iterator[np.ndarray]:
+    """
+    Sweeps the thresholds from the lowest up and yields, for each, the rows whose pass
+    score reaches it. The rows of a threshold are searched among those of the previous
+    one only, so every further threshold costs as much as the pairs still left.
+
+    Args
+    -------
+    pass_scores : np.ndarray
+        Highest threshold each pair passes, see write_outputs().
+    thresholds : list[float]
+        Non-decreasing thresholds.
+    """
+    rows = np.arange(len(pass_scores))
+    for t in thresholds:
+        rows = rows[pass_scores[rows] >= t]
+        yield rows
+
+
+def write_outputs(
+    chunks: Iterable[dict[str, np.ndarray]],
+    devs: list[list[str]],
+    score_types: dict[str, type],
+    data_folder: str,
+    all_pairs_file: str | None,
+    threshold_files: list[tuple[float, str]],
+    pass_score: Callable[[dict], np.ndarray],
+    stream: bool = False,
+    output_format: str = "csv",
+) -> tuple[int, list[int]]:
+    """
+    Writes the scored pairs to the all-pairs csv and, in the same pass, the pairs kept by
+    every threshold to the csv of the threshold.
+
+    The evaluator gives the pass score of each pair, the highest threshold at which at
+    least one of its conditions holds, so a pair passes threshold t if its pass score is
+    >= t. The pass scores are computed once per chunk and the threshold files are filled
+    by a single sweep over them (see threshold_rows()).
+
+    The scores stay in typed columns until rows are written, then the names and emails
+    are looked up by developer index. With stream, each chunk is written as soon as it is
+    scored and only one chunk is held in memory at a time. Otherwise all chunks are
+    joined first.
+
+    As in the evaluators, a threshold file only keeps the rows that also passed the
+    thresholds listed before it.
+
+    In parquet, the files get the .parquet extension and keep the score types. Every
+    chunk is written as a row group, compressed with PARQUET_COMPRESSION, so the files
+    take a fraction of the space of the csv files and read_pairs() can load single
+    columns.
+
+    Args
+    -------
+    chunks : Iterable[dict[str, np.ndarray]]
+        Scored pairs as typed columns (see evaluators.columns).
+    devs : list[list[str]]
+        List of developer lists containing ["name", "email"].
+    score_types : dict[str, type]
+        Score columns of the evaluator and their types, in output order.
+    data_folder : str
+        Folder the csv files are written to.
+    all_pairs_file : str | None
+        Name of the csv with all pairs, e.g. "devs_similarity.csv", None to only write
+        the threshold files.
+    threshold_files : list[tuple[float, str]]
+        Threshold and name of its csv file, in the order of the thresholds list.
+    pass_score : Callable[[dict], np.ndarray]
+        Evaluator function giving the pass score of every pair of a chunk.
+    stream : bool
+        Write chunk by chunk instead of joining all chunks first.
+    output_format : str
+        "csv" or "parquet", see OUTPUT_FORMATS.
+
+    Returns
+    -------
+    tuple[int, list[int]]
+        Number of pairs, and number of pairs written for every threshold.
+    """
+    target = {
+        "columns": {col: col for col in score_types},
+        "all_pairs_file": all_pairs_file,
+        "threshold_files": threshold_files,
+        "pass_score": pass_score,
+    }
+    return write_targets(
+        chunks, devs, score_types, data_folder, [target], stream, output_format
+    )[0]
+
+
+def write_targets(
+    chunks: Iterable[dict[str, np.ndarray]],
+    devs: list[list[str]],
+    score_types: dict[str, type],
+    data_folder: str,
+    targets: list[dict],
+    stream: bool = False,
+    output_format: str = "csv",
+) -> list[tuple[int, list[int]]]:
+    """
+    Writes one stream of scored pairs to the files of several evaluators, see
+    write_outputs() for a single evaluator.
+
+    Each target picks its score columns out of the chunks. When targets share the
+    all-pairs file, only the last of them writes it, as when the evaluators run one after
+    the other.
+
+    Args
+    -------
+    chunks : Iterable[dict[str, np.ndarray]]
+        Scored pairs as typed columns (see evaluators.columns).
+    devs : list[list[str]]
+        List of developer lists containing ["name", "email"].
+    score_types : dict[str, type]
+        Score columns of the chunks and their types.
+    data_folder : str
+        Folder the csv files are written to.
+    targets : list[dict]
+        Outputs of every evaluator:
+        "columns": output column -> chunk column, in output order,
+        "all_pairs_file": name of the csv with all pairs, or None,
+        "threshold_files": threshold and name of its csv file, for every threshold,
+        "pass_score": function giving the pass score of every pair of a chunk.
+    stream : bool
+        Write chunk by chunk instead of joining all chunks first.
+    output_format : str
+        "csv" or "parquet", see write_outputs().
+
+    Returns
+    -------
+    list[tuple[int, list[int]]]
+        For every target, number of pairs and number of pairs written for every threshold.
+    """
+    open_writer = {"csv": _csv_writer, "parquet": _parquet_writer}.get(output_format)
+    if open_writer is None:
+        raise ValueError(f"Unknown output format: {output_format}")
+    write_stage = f"to_{output_format}"
+
+    chunks = profiled_chunks(chunks)
+    if not stream:
+        chunks = list(chunks)
+        with stage("concat"):
+            chunks = slices(concat_columns(chunks, score_types), CHUNK_SIZE)
+
+    names = np.array([dev[0] for dev in devs], dtype=object)
+    emails = np.array([dev[1] for dev in devs], dtype=object)
+
+    pairs = 0
+    limited = [[0] * len(target["threshold_files"]) for target in targets]
+    with ExitStack() as stack:
+        writers = []
+        for n, target in enumerate(targets):
+            schema = pa.schema(
+                [(col, pa.string()) for col in BASE_COLUMNS]
+                + [
+                    (col, pa.from_numpy_dtype(np.dtype(score_types[source])))
+                    for col, source in target["columns"].items()
+                ]
+            )
+            all_pairs = None
+            # A later target writing the same file would overwrite this one
+            if target["all_pairs_file"] is not None and all(
+                t["all_pairs_file"] != target["all_pairs_file"]
+                for t in targets[n + 1 :]
+            ):
+                all_pairs = open_writer(
+                    stack,
+                    os.path.join(
+                        data_folder,
+                        output_name(target["all_pairs_file"], output_format),
+                    ),
+                    schema,
+                )
+            # Column for manual annotation
+            schema = schema.insert(0, pa.field("true_pos", pa.int64()))
+            outputs = [
+                open_writer(
+                    stack,
+                    os.path.join(data_folder, output_name(name, output_format)),
+                    schema,
+                )
+                for _, name in target["threshold_files"]
+            ]
+
+            # Filtering by each threshold in turn is filtering by the highest so far
+            effective = []
+            for t, _ in target["threshold_files"]:
+                effective.append(max([t] + effective[-1:]))
+            writers.append((all_pairs, outputs, effective))
+
+        for chunk in chunks:
+            pairs += len(chunk["i"])
+            for target, (all_pairs, outputs, effective), counts in zip(
+                targets, writers, limited
+            ):
+                view = {"i": chunk["i"], "j": chunk["j"]}
+                for col, source in target["columns"].items():
+                    view[col] = chunk[source]
+                score_cols = list(target["columns"])
+
+                if all_pairs is not None:
+                    with stage("to_frame"):
+                        df = to_frame(view, names, emails, score_cols)
+                    with stage(write_stage) as stats:
+                        all_pairs(df)
+                        stats["pairs"] = len(df)
+                if not outputs:
+                    continue
+
+                with stage("threshold"):
+                    # Rows of the lowest threshold hold the rows of all the others
+                    pass_scores = target["pass_score"](view)
+                    kept = np.flatnonzero(pass_scores >= effective[0])
+                    threshold_sets = list(threshold_rows(pass_scores[kept], effective))
+                with stage("to_frame"):
+                    df = to_frame(take(view, kept), names, emails, score_cols)
+                    # Add empty column for manual annotation
+                    df.insert(0, "true_pos", 0)
+                with stage(write_stage) as stats:
+                    for n, (rows, output) in enumerate(zip(threshold_sets, outputs)):
+                        counts[n] += len(rows)
+                        stats["pairs"] = stats.get("pairs", 0) + len(rows)
+                        output(df.iloc[rows])
+    return [(pairs, counts) for counts in limited]
+
+
+def write_top_k(
+    chunks: Iterable[dict[str, np.ndarray]],
+    devs: list[list[str]],
+    score_types: dict[str, type],
+    data_folder: str,
+    targets: list[dict],
+    k: int,
+    output_format: str = "csv",
+) -> list[tuple[int, int]]:
+    """
+    Writes the k nearest identities of every developer, by pass score, instead of the
+    pairs passing the thresholds (see evaluators.topk.top_k_columns()).
+
+    Every row is a developer ("name_1", "email_1"), the "rank" of the neighbour from 1,
+    the neighbour ("name_2", "email_2") and the score columns of the pair. Rows are
+    sorted by developer and rank, so each developer has at most k consecutive rows.
+
+    Args
+    -------
+    chunks : Iterable[dict[str, np.ndarray]]
+        Scored pairs as typed columns (see evaluators.columns).
+    devs : list[list[str]]
+        List of developer lists containing ["name", "email"].
+    score_types : dict[str, type]
+        Score columns of the chunks and their types.
+    data_folder : str
+        Folder the files are written to.
+    targets : list[dict]
+        Outputs of every evaluator:
+        "columns": output column -> chunk column, in output order,
+        "top_k_file": name of its top-k csv file, see evaluators.topk.top_k_file(),
+        "pass_score": function giving the pass score of every pair of a chunk.
+    k : int
+        Number of neighbours per developer.
+    output_format : str
+        "csv" or "parquet", see write_outputs().
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        For every target, number of pairs and number of rows written.
+    """
+    open_writer = {"csv": _csv_writer, "parquet": _parquet_writer}.get(output_format)
+    if open_writer is None:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+    pairs, results = top_k_columns(
+        profiled_chunks(chunks), len(devs), k, score_types, targets
+    )
+    names = np.array([dev[0] for dev in devs], dtype=object)
+    emails = np.array([dev[1] for dev in devs], dtype=object)
+    written = []
+    with ExitStack() as stack:
+        for target, rows in zip(targets, results):
+            schema = pa.schema(
+                [(col, pa.string()) for col in BASE_COLUMNS]
+                + [
+                    (col, pa.from_numpy_dtype(np.dtype(score_types[source])))
+                    for col, source in target["columns"].items()
+                ]
+            ).insert(2, pa.field("rank", pa.int64()))
+            output = open_writer(
+                stack,
+                os.path.join(
+                    data_folder, output_name(target["top_k_file"], output_format)
+                ),
+                schema,
+            )
+            with stage("to_frame"):
+                df = to_frame(rows, names, emails, target["columns"])
+                df.insert(2, "rank", rows["rank"])
+            with stage(f"to_{output_format}") as stats:
+                output(df)
+                stats["pairs"] = len(df)
+            written.append((pairs, len(df)))
+    return written
+
+
+def print_top_k_summary(title: str, pairs: int, k: int, rows: int):
+    """
+    Prints the number of pairs, and of rows of the top-k file.
+    """
+    print(title)
+    print(f"Pairs: {pairs}")
+    print("____________")
+    print(f"Top {k} rows: {rows}")
+    print("__________________________")
+
+
+def print_summary(title: str, pairs: int, thresholds: list[float], limited: list[int]):
+    """
+    Prints the number of pairs, and of pairs kept for every threshold.
+    """
+    print(title)
+    print(f"Pairs: {pairs}")
+    print("____________")
+    for t, count in zip(thresholds, limited):
+        print("Threshold:", t)
+        print(f"Limited Pairs: {count}")
+        print("__________________________")
@@ -0,0 +1,159 @@
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, islice
+
+import numpy as np
+
+from .columns import CHUNK_SIZE, to_columns
+
+# Number of shards per worker, more shards even out the load between workers
+SHARDS_PER_WORKER = 4
+# Shards submitted ahead per worker, results waiting for the consumer are bounded by it
+PENDING_PER_WORKER = 2
+
+# Developer table of a worker process, set once by _init_worker()
+_SHARED = {}
+
+
+def triangle_shards(n: int, shards: int) -> list[tuple[int, int]]:
+    """
+    Splits the upper triangle of the n x n pair matrix into row ranges holding about the
+    same number of pairs. Row i holds the pairs (i, j) for j > i.
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        Row ranges [start, end), in order.
+    """
+    total = n * (n - 1) // 2
+    shards = max(1, min(shards, n))
+    ranges = []
+    start = 0
+    done = 0
+    # The last row holds no pairs, it always ends the last shard
+    for i in range(n - 1):
+        done += n - 1 - i
+        # Close the shard once it reaches its share of the pairs
+        if done * shards >= total * (len(ranges) + 1) and i + 1 < n - 1:
+            ranges.append((start, i + 1))
+            start = i + 1
+    if start < n:
+        ranges.append((start, n))
+    return ranges
+
+
+def _init_worker(table: list[tuple[str, ...]], score: Callable, args: tuple):
+    """
+    Receives the developer table once per worker process, instead of once per shard.
+    """
+    _SHARED.update(table=table, score=score, args=args)
+
+
+def _score_pairs(
+    table: list[tuple[str, ...]],
+    score: Callable,
+    args: tuple,
+    score_types: dict[str, type],
+    pairs: Iterable[tuple[int, int]],
+) -> dict[str, np.ndarray]:
+    """
+    Scores pairs one by one into typed columns.
+    """
+    i, j, scores = [], [], []
+    for a, b in pairs:
+        i.append(a)
+        j.append(b)
+        scores.append(score(table[a], table[b], *args))
+    return to_columns(i, j, scores, score_types)
+
+
+def _score_shard(
+    shard: tuple[int, int] | list[tuple[int, int]], score_types: dict[str, type]
+) -> dict[str, np.ndarray]:
+    """
+    Scores one shard, a row range of the upper triangle or a list of pairs, in a worker.
+    """
+    table, score, args = (_SHARED[k] for k in ("table", "score", "args"))
+    if isinstance(shard, tuple):
+        start, end = shard
+        shard = ((a, b) for a in range(start, end) for b in range(a + 1, len(table)))
+    return _score_pairs(table, score, args, score_types, shard)
+
+
+def _pair_shards(
+    pairs: Iterable[tuple[int, int]], size: int
+) -> Iterator[list[tuple[int, int]]]:
+    pairs = iter(pairs)
+    while shard := list(islice(pairs, size)):
+        yield shard
+
+
+def score_chunks(
+    table: list[tuple[str, ...]],
+    score: Callable,
+    args: tuple,
+    score_types: dict[str, type],
+    pairs: Iterable[tuple[int, int]] | None = None,
+    workers: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Scores developer pairs one pair at a time, in a single process or in a pool of worker
+    processes, and yields the results in chunks of typed columns (see evaluators.columns).
+
+    With workers > 1 the pairs are split into shards, row ranges of the upper triangle or
+    chunks of the given pairs, and the shards are yielded in order, so the result is the
+    same as scoring the pairs one by one in a single process. At most
+    PENDING_PER_WORKER shards per worker are submitted ahead of the consumer, so scored
+    shards do not pile up in memory and the given pairs are only read as needed.
+
+    Args
+    ------
+        table : list[tuple[str, ...]]
+            Normalized developers from process_devs().
+        score : Callable
+            Module level function of an evaluator, score(norm_a, norm_b, *args) -> tuple,
+            giving the scores of one pair.
+        args : tuple
+            Extra arguments passed to score.
+        score_types : dict[str, type]
+            Name and type of the values returned by score (see evaluators.columns).
+        pairs : Iterable[tuple[int, int]] | None
+            Index pairs (i, j), i < j, to score. All pairs are scored if not given.
+        workers : int
+            Number of worker processes.
+        chunk_size : int
+            Most pairs in one chunk or shard.
+    """
+    if workers <= 1:
+        if pairs is None:
+            pairs = combinations(range(len(table)), 2)
+        for chunk in _pair_shards(pairs, chunk_size):
+            yield _score_pairs(table, score, args, score_types, chunk)
+        return
+
+    if pairs is None:
+        n = len(table)
+        total = n * (n - 1) // 2
+        shards = triangle_shards(
+            n, max(workers * SHARDS_PER_WORKER, -(-total // chunk_size))
+        )
+    else:
+        shards = _pair_shards(pairs, chunk_size)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(table, score, args),
+    ) as executor:
+        pending = deque()
+        shards = iter(shards)
+        for shard in islice(shards, workers * PENDING_PER_WORKER):
+            pending.append(executor.submit(_score_shard, shard, score_types))
+        while pending:
+            chunk = pending.popleft().result()
+            # Keep the workers busy while the consumer handles the chunk
+            for shard in islice(shards, 1):
+                pending.append(executor.submit(_score_shard, shard, score_types))
+            yield chunk
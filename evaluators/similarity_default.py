@@ -1,8 +1,32 @@
-import os
-import pandas as pd
-from itertools import combinations
+from collections.abc import Iterable
+import numpy as np
 from Levenshtein import ratio as sim
-from tools.helpers import process, most_common_prefixes
+from .batch import BLOCK_CELLS, batch_bird
+from .columns import CHUNK_SIZE, SCORE_DTYPE
+from .output import (
+    print_summary,
+    print_top_k_summary,
+    write_outputs,
+    write_top_k,
+)
+from .parallel import score_chunks
+from .maps import maps_settings, mapped_chunks
+from .store import store_path, stored_scores
+from .topk import top_k_file
+from tools.helpers import process, process_devs, most_common_prefixes
+from tools.profiling import profiled
+
+# Score columns of devs_similarity.csv and their types
+DEFAULT_SCORES = {
+    "c1": SCORE_DTYPE,
+    "c2": SCORE_DTYPE,
+    "c3.1": SCORE_DTYPE,
+    "c3.2": SCORE_DTYPE,
+    "c4": np.bool_,
+    "c5": np.bool_,
+    "c6": np.bool_,
+    "c7": np.bool_,
+}
 
 
 def bird_c1_c3(
@@ -14,8 +38,23 @@ def bird_c1_c3(
     """
     Calculates the first three conditions of the Bird heuristic.
     """
-    name_a, first_a, last_a, _, _, email_a, prefix_a = process(dev_a)
-    name_b, first_b, last_b, _, _, email_b, prefix_b = process(dev_b)
+    return bird_c1_c3_norm(
+        process(dev_a), process(dev_b), generic_prefixes, email_check
+    )
+
+
+def bird_c1_c3_norm(
+    norm_a: tuple[str, ...],
+    norm_b: tuple[str, ...],
+    generic_prefixes: set[str],
+    email_check: bool,
+):
+    """
+    Calculates the first three conditions of the Bird heuristic from already normalized
+    developers (rows of process_devs()).
+    """
+    name_a, first_a, last_a, _, _, email_a, prefix_a = norm_a[:7]
+    name_b, first_b, last_b, _, _, email_b, prefix_b = norm_b[:7]
     # Conditions of Bird heuristic
     c1 = sim(name_a, name_b)
     # CHECK FOR A SAME EMAIL-PREFIX
@@ -33,8 +72,16 @@ def bird_c4_c7(dev_a: list[str], dev_b: list[str]):
     """
     Calculates conditions c4 to c7 of the Bird heuristic.
     """
-    _, first_a, last_a, i_first_a, i_last_a, _, prefix_a = process(dev_a)
-    _, first_b, last_b, i_first_b, i_last_b, _, prefix_b = process(dev_b)
+    return bird_c4_c7_norm(process(dev_a), process(dev_b))
+
+
+def bird_c4_c7_norm(norm_a: tuple[str, ...], norm_b: tuple[str, ...]):
+    """
+    Calculates conditions c4 to c7 of the Bird heuristic from already normalized
+    developers (rows of process_devs()).
+    """
+    _, first_a, last_a, i_first_a, i_last_a, _, prefix_a = norm_a[:7]
+    _, first_b, last_b, i_first_b, i_last_b, _, prefix_b = norm_b[:7]
     c4 = c5 = c6 = c7 = False
     # Since lastname and initials can be empty, perform appropriate checks
     if i_first_a != "" and last_a != "":
@@ -52,12 +99,72 @@ def bird_c4_c7(dev_a: list[str], dev_b: list[str]):
     return c4, c5, c6, c7
 
 
+def default_scores(
+    norm_a: tuple[str, ...],
+    norm_b: tuple[str, ...],
+    generic_prefixes: set[str],
+    email_check: bool,
+) -> tuple:
+    """
+    Scores c1-c7 of one pair of developers, in the order of DEFAULT_SCORES.
+    """
+    c1, c2, c31, c32, _, _ = bird_c1_c3_norm(
+        norm_a, norm_b, generic_prefixes, email_check
+    )
+    return (c1, c2, c31, c32) + bird_c4_c7_norm(norm_a, norm_b)
+
+
+def default_pass_score(columns: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Highest threshold at which at least one of the conditions c1-c7 is True, for every
+    pair. c4-c7 do not depend on the threshold, pairs meeting one of them pass them all.
+    """
+    pass_score = np.maximum(
+        np.maximum(columns["c1"], columns["c2"]),
+        np.minimum(columns["c3.1"], columns["c3.2"]),
+    )
+    pass_score[columns["c4"] | columns["c5"] | columns["c6"] | columns["c7"]] = np.inf
+    return pass_score
+
+
+def default_outputs(
+    email_check: bool, generic_prefixes: set[str], thresholds: list[float]
+) -> tuple[str, str, list[tuple[float, str]]]:
+    """
+    Title of the printed summary, all-pairs csv file, and threshold and csv file of every
+    threshold of similarity_default().
+    """
+    # a csv file will be created for every threshold value, you may add or edit to the list
+    threshold_files = [
+        (
+            t,
+            f"devs_similarity{"_email_check=" if email_check else ""}{len(generic_prefixes) if email_check else ""}_t={t}.csv",
+        )
+        for t in thresholds
+    ]
+    return (
+        f"\nDefault bird, email check = {str(email_check)}",
+        "devs_similarity.csv",
+        threshold_files,
+    )
+
+
+@profiled("similarity_default")
 def similarity_default(
     devs: list[list[str]],
     data_folder: str,
     email_check: bool,
     generic_prefixes: set[str],
     thresholds: list[float],
+    table: list[tuple[str, ...]] | None = None,
+    pairs: Iterable[tuple[int, int]] | None = None,
+    backend: str = "pair",
+    workers: int = 1,
+    chunk_size: int | None = None,
+    store: bool = False,
+    output_format: str = "csv",
+    score_maps: bool = False,
+    top_k: int | None = None,
 ):
     """
     Calculates similarity between developer name pairs using the Bird heuristic.
@@ -76,6 +183,37 @@ def similarity_default(
             If True, email prefixes matching generic domains are excluded from similarity checks.
         threshholds : list[float]
             List of similarity threshold values (0.0-1.0) to generate separate filtered outputs.
+        table : list[tuple[str, ...]] | None
+            Normalized developers from process_devs(devs). Built here if not given.
+        pairs : Iterable[tuple[int, int]] | None
+            Index pairs (i, j), i < j, to score, e.g. from tools.blocking.blocked_pairs().
+            All pairs are scored if not given.
+        backend : str
+            "pair" scores one pair at a time with Levenshtein, "batch" scores blocks of
+            pairs with RapidFuzz across all cores (see evaluators.batch).
+        workers : int
+            Number of processes scoring the pairs in parallel shards, the output is the
+            same as with one process.
+        chunk_size : int | None
+            If given, pairs are scored and written in chunks of this many rows and the
+            threshold files are filtered on the fly, so memory stays flat however many
+            developers there are. All pairs are kept in memory if None.
+        store : bool
+            Keep the scores of all pairs in a store in data_folder and, on the next run,
+            score only the pairs involving new developers (see evaluators.store).
+            Needs all pairs, pairs must not be given.
+        output_format : str
+            "csv", or "parquet" to write compressed .parquet files in row groups
+            instead of the .csv files (see evaluators.output.read_pairs()).
+        score_maps : bool
+            Also keep every score of all pairs in condensed arrays on disk, in a
+            "maps_*" folder of data_folder, to write threshold files again for other
+            thresholds without scoring (see tools.rethreshold). Needs all pairs, pairs
+            must not be given.
+        top_k : int | None
+            If given, write the top_k nearest identities of every developer, by pass
+            score, to a "_top={top_k}" file instead of the all-pairs and threshold
+            files, keeping only O(n·top_k) pairs in memory (see evaluators.topk).
 
     Outputs
     ------
@@ -84,101 +222,84 @@ def similarity_default(
         devs_similarity_t={threshold}.csv
             Filtered pairs meeting threshold criteria (one per threshold)
     """
-    SIMILARITY = []
-
-    for dev_a, dev_b in combinations(devs, 2):
-        # Pre-process both developers
-        c1, c2, c31, c32, email_a, email_b = bird_c1_c3(
-            dev_a, dev_b, generic_prefixes, email_check
-        )
+    if table is None:
+        table = process_devs(devs)
 
-        c4, c5, c6, c7 = bird_c4_c7(dev_a, dev_b)
+    def score(pairs):
+        if backend == "batch":
+            return batch_bird(
+                table,
+                generic_prefixes,
+                email_check,
+                pairs,
+                c4_c7=True,
+                block_cells=chunk_size or BLOCK_CELLS,
+            )
+        elif backend == "pair":
+            return score_chunks(
+                table,
+                default_scores,
+                (generic_prefixes, email_check),
+                DEFAULT_SCORES,
+                pairs,
+                workers,
+                chunk_size or CHUNK_SIZE,
+            )
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
 
-        # Save similarity data for each conditions. Original names are saved
-        SIMILARITY.append(
-            [dev_a[0], email_a, dev_b[0], email_b, c1, c2, c31, c32, c4, c5, c6, c7]
+    if store:
+        if pairs is not None:
+            raise ValueError("The score store needs all pairs, pairs must not be given")
+        settings = repr(("default", email_check, sorted(generic_prefixes)))
+        chunks = stored_scores(
+            devs,
+            store_path(data_folder, "default", settings),
+            settings,
+            DEFAULT_SCORES,
+            score,
+        )
+    else:
+        chunks = score(pairs)
+    if score_maps:
+        if pairs is not None:
+            raise ValueError("Score maps need all pairs, pairs must not be given")
+        chunks = mapped_chunks(
+            chunks,
+            devs,
+            data_folder,
+            maps_settings("default", email_check, generic_prefixes),
+            DEFAULT_SCORES,
         )
-    print(f"\nDefault bird, email check = {str(email_check)}")
-    print(f"Pairs: {len(SIMILARITY)}")
-    print("____________")
-
-    # Save data on all pairs (might be too big -> comment out to avoid)
-    cols = [
-        "name_1",
-        "email_1",
-        "name_2",
-        "email_2",
-        "c1",
-        "c2",
-        "c3.1",
-        "c3.2",
-        "c4",
-        "c5",
-        "c6",
-        "c7",
-    ]
-
-    df = pd.DataFrame(SIMILARITY, columns=cols)
 
-    df.to_csv(
-        os.path.join(f"{data_folder}", "devs_similarity.csv"),
-        index=False,
-        header=True,
+    title, all_pairs_file, threshold_files = default_outputs(
+        email_check, generic_prefixes, thresholds
     )
 
-    # Set similarity threshold, check c1-c3 against the threshold
-    # a csv file will be created for every threshold value, you may add or edit to the list
-    for t in thresholds:
-        print("Threshold:", t)
-        df["c1_check"] = df["c1"] >= t
-        df["c2_check"] = df["c2"] >= t
-        df["c3_check"] = (df["c3.1"] >= t) & (df["c3.2"] >= t)
-        # Keep only rows where at least one condition is True
-
-        df = df[
-            df[
-                [
-                    "c1_check",
-                    "c2_check",
-                    "c3_check",
-                    "c4",
-                    "c5",
-                    "c6",
-                    "c7",
-                ]
-            ].any(axis=1)
-        ]
-
-        print(f"Limited Pairs: {len(df)}")
-        print("__________________________")
-
-        # Omit "check" columns, save to csv
-
-        df = df[
-            [
-                "name_1",
-                "email_1",
-                "name_2",
-                "email_2",
-                "c1",
-                "c2",
-                "c3.1",
-                "c3.2",
-                "c4",
-                "c5",
-                "c6",
-                "c7",
-            ]
-        ]
-
-        # Add empty column for manual annotation
-        df.insert(0, "true_pos", 0)
-
-        df.to_csv(
-            os.path.join(
-                f"{data_folder}",
-                f"devs_similarity{"_email_check=" if email_check else ""}{len(generic_prefixes) if email_check else ""}_t={t}.csv",
+    if top_k is not None:
+        target = {
+            "columns": {col: col for col in DEFAULT_SCORES},
+            "top_k_file": top_k_file(
+                lambda ts: default_outputs(email_check, generic_prefixes, ts), top_k
             ),
-            index=False,
-            header=True,
-        )
+            "pass_score": default_pass_score,
+        }
+        pair_count, rows = write_top_k(
+            chunks, devs, DEFAULT_SCORES, data_folder, [target], top_k, output_format
+        )[0]
+        print_top_k_summary(title, pair_count, top_k, rows)
+        return
+
+    # Save data on all pairs (might be too big -> comment out to avoid)
+    pair_count, limited = write_outputs(
+        chunks,
+        devs,
+        DEFAULT_SCORES,
+        data_folder,
+        all_pairs_file,
+        threshold_files,
+        default_pass_score,
+        stream=chunk_size is not None,
+        output_format=output_format,
+    )
+    print_summary(title, pair_count, thresholds, limited)
@@ -1,16 +1,49 @@
-import os
-import pandas as pd
-from itertools import combinations
+from collections.abc import Iterable
+import numpy as np
 from pyjarowinkler.distance import get_jaro_winkler_similarity as jaro_win_sim
-from tools.helpers import process, most_common_prefixes
+from .columns import CHUNK_SIZE, SCORE_DTYPE
+from .output import (
+    print_summary,
+    print_top_k_summary,
+    write_outputs,
+    write_top_k,
+)
+from .parallel import score_chunks
+from .maps import maps_settings, mapped_chunks
+from .store import store_path, stored_scores
+from .topk import top_k_file
+from tools.helpers import process_devs, most_common_prefixes
+from tools.profiling import profiled
+
+# Score columns of devs_jw_similarity.csv and their types
+JARO_SCORES = {
+    "c1": SCORE_DTYPE,
+    "c2": SCORE_DTYPE,
+    "c3": SCORE_DTYPE,
+    "c4": SCORE_DTYPE,
+}
 
 
 def jaro_c1_c4(
     dev_a: list[str], dev_b: list[str], generic_prefixes: set[str], email_check: bool
 ):
     # Pre-process both developers
-    name_a, first_a, last_a, i_first_a, i_last_a, email_a, prefix_a = process(dev_a)
-    name_b, first_b, last_b, i_first_b, i_last_b, email_b, prefix_b = process(dev_b)
+    norm_a, norm_b = process_devs([dev_a, dev_b])
+    return jaro_c1_c4_norm(norm_a, norm_b, generic_prefixes, email_check)
+
+
+def jaro_c1_c4_norm(
+    norm_a: tuple[str, ...],
+    norm_b: tuple[str, ...],
+    generic_prefixes: set[str],
+    email_check: bool,
+):
+    """
+    Calculates the Jaro-Winkler conditions from already normalized developers
+    (rows of process_devs()), using their precomputed composite keys.
+    """
+    name_a, _, _, _, _, email_a, prefix_a, i_first_last_a, i_last_first_a = norm_a
+    name_b, _, _, _, _, email_b, prefix_b, i_first_last_b, i_last_first_b = norm_b
 
     # Conditions
     c1 = jaro_win_sim(name_a, name_b, ignore_case=True)
@@ -21,27 +54,71 @@ def jaro_c1_c4(
 
     c3 = 0
     c4 = 0
-    if i_first_a != "" and last_a != "" and i_first_b != "" and last_b != "":
-        c3 = jaro_win_sim(
-            "".join((i_first_a, last_a)),
-            "".join((i_first_b, last_b)),
-            ignore_case=True,
-        )
-    if i_last_a != "" and first_a != "" and i_last_b != "" and first_b != "":
-        c4 = jaro_win_sim(
-            "".join((i_last_a, first_a)),
-            "".join((i_last_b, first_b)),
-            ignore_case=True,
-        )
+    # Composite keys are empty when a name part is missing
+    if i_first_last_a != "" and i_first_last_b != "":
+        c3 = jaro_win_sim(i_first_last_a, i_first_last_b, ignore_case=True)
+    if i_last_first_a != "" and i_last_first_b != "":
+        c4 = jaro_win_sim(i_last_first_a, i_last_first_b, ignore_case=True)
     return c1, c2, c3, c4, email_a, email_b
 
 
+def jaro_scores(
+    norm_a: tuple[str, ...],
+    norm_b: tuple[str, ...],
+    generic_prefixes: set[str],
+    email_check: bool,
+) -> tuple:
+    """
+    Scores c1-c4 of one pair of developers, in the order of JARO_SCORES.
+    """
+    return jaro_c1_c4_norm(norm_a, norm_b, generic_prefixes, email_check)[:4]
+
+
+def jaro_pass_score(columns: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Highest threshold at which at least one of the conditions c1-c4 is True, for every
+    pair.
+    """
+    return np.maximum.reduce([columns[col] for col in ("c1", "c2", "c3", "c4")])
+
+
+def jaro_outputs(
+    email_check: bool, generic_prefixes: set[str], thresholds: list[float]
+) -> tuple[str, str, list[tuple[float, str]]]:
+    """
+    Title of the printed summary, all-pairs csv file, and threshold and csv file of every
+    threshold of similarity_jw_bird().
+    """
+    # a csv file will be created for every threshold value, you may add or edit to the list
+    threshold_files = [
+        (
+            t,
+            f"devs_jw_similarity{"_email_check=" if email_check else ""}{len(generic_prefixes) if email_check else ""}_t={t}.csv",
+        )
+        for t in thresholds
+    ]
+    return (
+        f"\nJaro-winkler bird, email check = {str(email_check)}",
+        "devs_jw_similarity.csv",
+        threshold_files,
+    )
+
+
+@profiled("similarity_jw_bird")
 def similarity_jw_bird(
     devs: list[list[str]],
     data_folder: str,
     email_check: bool,
     generic_prefixes: set[str],
     thresholds: list[float],
+    table: list[tuple[str, ...]] | None = None,
+    pairs: Iterable[tuple[int, int]] | None = None,
+    workers: int = 1,
+    chunk_size: int | None = None,
+    store: bool = False,
+    output_format: str = "csv",
+    score_maps: bool = False,
+    top_k: int | None = None,
 ):
     """
     Calculates similarity between developer name pairs using a modified Bird heuristic.
@@ -63,6 +140,34 @@ def similarity_jw_bird(
             If True, email prefixes matching generic domains are excluded from similarity checks.
         threshholds : list[float]
             List of similarity threshold values (0.0-1.0) to generate separate filtered outputs.
+        table : list[tuple[str, ...]] | None
+            Normalized developers from process_devs(devs). Built here if not given.
+        pairs : Iterable[tuple[int, int]] | None
+            Index pairs (i, j), i < j, to score, e.g. from tools.blocking.blocked_pairs().
+            All pairs are scored if not given.
+        workers : int
+            Number of processes scoring the pairs in parallel shards, the output is the
+            same as with one process.
+        chunk_size : int | None
+            If given, pairs are scored and written in chunks of this many rows and the
+            threshold files are filtered on the fly, so memory stays flat however many
+            developers there are. All pairs are kept in memory if None.
+        store : bool
+            Keep the scores of all pairs in a store in data_folder and, on the next run,
+            score only the pairs involving new developers (see evaluators.store).
+            Needs all pairs, pairs must not be given.
+        output_format : str
+            "csv", or "parquet" to write compressed .parquet files in row groups
+            instead of the .csv files (see evaluators.output.read_pairs()).
+        score_maps : bool
+            Also keep every score of all pairs in condensed arrays on disk, in a
+            "maps_*" folder of data_folder, to write threshold files again for other
+            thresholds without scoring (see tools.rethreshold). Needs all pairs, pairs
+            must not be given.
+        top_k : int | None
+            If given, write the top_k nearest identities of every developer, by pass
+            score, to a "_top={top_k}" file instead of the all-pairs and threshold
+            files, keeping only O(n·top_k) pairs in memory (see evaluators.topk).
 
     Outputs
     ------
@@ -71,85 +176,72 @@ def similarity_jw_bird(
         devs_similarity_t={threshold}.csv
             Filtered pairs meeting threshold criteria (one per threshold)
     """
-    SIMILARITY = []
+    if table is None:
+        table = process_devs(devs)
+
+    def score(pairs):
+        return score_chunks(
+            table,
+            jaro_scores,
+            (generic_prefixes, email_check),
+            JARO_SCORES,
+            pairs,
+            workers,
+            chunk_size or CHUNK_SIZE,
+        )
 
-    for dev_a, dev_b in combinations(devs, 2):
-        c1, c2, c3, c4, email_a, email_b = jaro_c1_c4(
-            dev_a, dev_b, generic_prefixes, email_check
+    if store:
+        if pairs is not None:
+            raise ValueError("The score store needs all pairs, pairs must not be given")
+        settings = repr(("jaro", email_check, sorted(generic_prefixes)))
+        chunks = stored_scores(
+            devs,
+            store_path(data_folder, "jaro", settings),
+            settings,
+            JARO_SCORES,
+            score,
+        )
+    else:
+        chunks = score(pairs)
+    if score_maps:
+        if pairs is not None:
+            raise ValueError("Score maps need all pairs, pairs must not be given")
+        chunks = mapped_chunks(
+            chunks,
+            devs,
+            data_folder,
+            maps_settings("jaro", email_check, generic_prefixes),
+            JARO_SCORES,
         )
-        # Save similarity data for each conditions. Original names are saved
-        SIMILARITY.append([dev_a[0], email_a, dev_b[0], email_b, c1, c2, c3, c4])
 
-    print(f"\nJaro-winkler bird, email check = {str(email_check)}")
-    print(f"Pairs: {len(SIMILARITY)}")
-    print("____________")
+    title, all_pairs_file, threshold_files = jaro_outputs(
+        email_check, generic_prefixes, thresholds
+    )
 
-    # Save data on all pairs
-    cols = [
-        "name_1",
-        "email_1",
-        "name_2",
-        "email_2",
-        "c1",
-        "c2",
-        "c3",
-        "c4",
-    ]
-    df = pd.DataFrame(SIMILARITY, columns=cols)
+    if top_k is not None:
+        target = {
+            "columns": {col: col for col in JARO_SCORES},
+            "top_k_file": top_k_file(
+                lambda ts: jaro_outputs(email_check, generic_prefixes, ts), top_k
+            ),
+            "pass_score": jaro_pass_score,
+        }
+        pair_count, rows = write_top_k(
+            chunks, devs, JARO_SCORES, data_folder, [target], top_k, output_format
+        )[0]
+        print_top_k_summary(title, pair_count, top_k, rows)
+        return
 
-    df.to_csv(
-        os.path.join(f"{data_folder}", "devs_jw_similarity.csv"),
-        index=False,
-        header=True,
+    # Save data on all pairs
+    pair_count, limited = write_outputs(
+        chunks,
+        devs,
+        JARO_SCORES,
+        data_folder,
+        all_pairs_file,
+        threshold_files,
+        jaro_pass_score,
+        stream=chunk_size is not None,
+        output_format=output_format,
     )
-    # Set similarity threshold, check c1-c4 against the threshold
-    # a csv file will be created for every threshold value, you may add or edit to the list
-    for t in thresholds:
-        print("Threshold:", t)
-        df["c1_check"] = df["c1"] >= t
-        df["c2_check"] = df["c2"] >= t
-        df["c3_check"] = df["c3"] >= t
-        df["c4_check"] = df["c4"] >= t
-
-        # Keep only rows where at least one condition is True
-
-        df = df[
-            df[
-                [
-                    "c1_check",
-                    "c2_check",
-                    "c3_check",
-                    "c4_check",
-                ]
-            ].any(axis=1)
-        ]
-
-        print(f"Limited Pairs: {len(df)}")
-        print("__________________________")
-
-        # Omit "check" columns, save to csv
-
-        df = df[
-            [
-                "name_1",
-                "email_1",
-                "name_2",
-                "email_2",
-                "c1",
-                "c2",
-                "c3",
-                "c4",
-            ]
-        ]
-
-        # Add empty column for manual annotation
-        df.insert(0, "true_pos", 0)
-
-        df.to_csv(
-            os.path.join(
-                f"{data_folder}",
-                f"devs_jw_similarity{"_email_check=" if email_check else ""}{len(generic_prefixes) if email_check else ""}_t={t}.csv",
-            ),
-            index=False,
-            header=True,
-        )
+    print_summary(title, pair_count, thresholds, limited)
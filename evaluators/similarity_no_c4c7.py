@@ -1,16 +1,91 @@
-import os
-import pandas as pd
-from itertools import combinations
-from .similarity_default import bird_c1_c3
-from tools.helpers import most_common_prefixes
+from collections.abc import Iterable
+import numpy as np
+from .similarity_default import bird_c1_c3_norm
+from .batch import BLOCK_CELLS, batch_bird
+from .columns import CHUNK_SIZE, SCORE_DTYPE
+from .output import (
+    print_summary,
+    print_top_k_summary,
+    write_outputs,
+    write_top_k,
+)
+from .parallel import score_chunks
+from .maps import maps_settings, mapped_chunks
+from .store import store_path, stored_scores
+from .topk import top_k_file
+from tools.helpers import process_devs, most_common_prefixes
+from tools.profiling import profiled
+
+# Score columns of devs_similarity.csv without c4-c7, and their types
+NO_C4C7_SCORES = {
+    "c1": SCORE_DTYPE,
+    "c2": SCORE_DTYPE,
+    "c3.1": SCORE_DTYPE,
+    "c3.2": SCORE_DTYPE,
+}
+
+
+def no_c4c7_scores(
+    norm_a: tuple[str, ...],
+    norm_b: tuple[str, ...],
+    generic_prefixes: set[str],
+    email_check: bool,
+) -> tuple:
+    """
+    Scores c1-c3 of one pair of developers, in the order of NO_C4C7_SCORES.
+    """
+    return bird_c1_c3_norm(norm_a, norm_b, generic_prefixes, email_check)[:4]
+
+
+def no_c4c7_pass_score(columns: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Highest threshold at which at least one of the conditions c1-c3 is True, for every
+    pair.
+    """
+    return np.maximum(
+        np.maximum(columns["c1"], columns["c2"]),
+        np.minimum(columns["c3.1"], columns["c3.2"]),
+    )
 
 
+def no_c4c7_outputs(
+    email_check: bool, generic_prefixes: set[str], thresholds: list[float]
+) -> tuple[str, str, list[tuple[float, str]]]:
+    """
+    Title of the printed summary, all-pairs csv file, and threshold and csv file of every
+    threshold of similarity_no_c4c7().
+    """
+    # a csv file will be created for every threshold value, you may add or edit to the list
+    threshold_files = [
+        (
+            t,
+            f"devs_similarity_no_c4c7{"_email_check=" if email_check else ""}{len(generic_prefixes) if email_check else ""}_t={t}.csv",
+        )
+        for t in thresholds
+    ]
+    return (
+        f"\nnoc4c7 Bird, email check = {str(email_check)}",
+        "devs_similarity.csv",
+        threshold_files,
+    )
+
+
+@profiled("similarity_no_c4c7")
 def similarity_no_c4c7(
     devs: list[list[str]],
     data_folder: str,
     email_check: bool,
     generic_prefixes: set[str],
     thresholds: list[float],
+    table: list[tuple[str, ...]] | None = None,
+    pairs: Iterable[tuple[int, int]] | None = None,
+    backend: str = "pair",
+    workers: int = 1,
+    chunk_size: int | None = None,
+    store: bool = False,
+    output_format: str = "csv",
+    score_maps: bool = False,
+    top_k: int | None = None,
 ):
     """
     Calculates similarity between developer name pairs using the Bird heuristic.
@@ -29,6 +104,37 @@ def similarity_no_c4c7(
             If True, email prefixes matching generic domains are excluded from similarity checks.
         threshholds : list[float]
             List of similarity threshold values (0.0-1.0) to generate separate filtered outputs.
+        table : list[tuple[str, ...]] | None
+            Normalized developers from process_devs(devs). Built here if not given.
+        pairs : Iterable[tuple[int, int]] | None
+            Index pairs (i, j), i < j, to score, e.g. from tools.blocking.blocked_pairs().
+            All pairs are scored if not given.
+        backend : str
+            "pair" scores one pair at a time with Levenshtein, "batch" scores blocks of
+            pairs with RapidFuzz across all cores (see evaluators.batch).
+        workers : int
+            Number of processes scoring the pairs in parallel shards, the output is the
+            same as with one process.
+        chunk_size : int | None
+            If given, pairs are scored and written in chunks of this many rows and the
+            threshold files are filtered on the fly, so memory stays flat however many
+            developers there are. All pairs are kept in memory if None.
+        store : bool
+            Keep the scores of all pairs in a store in data_folder and, on the next run,
+            score only the pairs involving new developers (see evaluators.store).
+            Needs all pairs, pairs must not be given.
+        output_format : str
+            "csv", or "parquet" to write compressed .parquet files in row groups
+            instead of the .csv files (see evaluators.output.read_pairs()).
+        score_maps : bool
+            Also keep every score of all pairs in condensed arrays on disk, in a
+            "maps_*" folder of data_folder, to write threshold files again for other
+            thresholds without scoring (see tools.rethreshold). Needs all pairs, pairs
+            must not be given.
+        top_k : int | None
+            If given, write the top_k nearest identities of every developer, by pass
+            score, to a "_top={top_k}" file instead of the all-pairs and threshold
+            files, keeping only O(n·top_k) pairs in memory (see evaluators.topk).
 
     Outputs
     -------
@@ -37,75 +143,83 @@ def similarity_no_c4c7(
         devs_similarity_no_c4c7_t={threshold}.csv
             Filtered pairs meeting threshold criteria (one per threshold)
     """
-    SIMILARITY = []
-
-    for dev_a, dev_b in combinations(devs, 2):
-        c1, c2, c31, c32, email_a, email_b = bird_c1_c3(
-            dev_a, dev_b, generic_prefixes, email_check
+    if table is None:
+        table = process_devs(devs)
+
+    def score(pairs):
+        if backend == "batch":
+            return batch_bird(
+                table,
+                generic_prefixes,
+                email_check,
+                pairs,
+                block_cells=chunk_size or BLOCK_CELLS,
+            )
+        elif backend == "pair":
+            return score_chunks(
+                table,
+                no_c4c7_scores,
+                (generic_prefixes, email_check),
+                NO_C4C7_SCORES,
+                pairs,
+                workers,
+                chunk_size or CHUNK_SIZE,
+            )
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
+
+    if store:
+        if pairs is not None:
+            raise ValueError("The score store needs all pairs, pairs must not be given")
+        settings = repr(("no_c4c7", email_check, sorted(generic_prefixes)))
+        chunks = stored_scores(
+            devs,
+            store_path(data_folder, "no_c4c7", settings),
+            settings,
+            NO_C4C7_SCORES,
+            score,
+        )
+    else:
+        chunks = score(pairs)
+    if score_maps:
+        if pairs is not None:
+            raise ValueError("Score maps need all pairs, pairs must not be given")
+        chunks = mapped_chunks(
+            chunks,
+            devs,
+            data_folder,
+            maps_settings("no_c4c7", email_check, generic_prefixes),
+            NO_C4C7_SCORES,
         )
 
-        # Similarity without c4 - c7
-        SIMILARITY.append([dev_a[0], email_a, dev_b[0], email_b, c1, c2, c31, c32])
+    title, all_pairs_file, threshold_files = no_c4c7_outputs(
+        email_check, generic_prefixes, thresholds
+    )
 
-    print(f"\nnoc4c7 Bird, email check = {str(email_check)}")
-    print(f"Pairs: {len(SIMILARITY)}")
-    print("____________")
+    if top_k is not None:
+        target = {
+            "columns": {col: col for col in NO_C4C7_SCORES},
+            "top_k_file": top_k_file(
+                lambda ts: no_c4c7_outputs(email_check, generic_prefixes, ts), top_k
+            ),
+            "pass_score": no_c4c7_pass_score,
+        }
+        pair_count, rows = write_top_k(
+            chunks, devs, NO_C4C7_SCORES, data_folder, [target], top_k, output_format
+        )[0]
+        print_top_k_summary(title, pair_count, top_k, rows)
+        return
 
     # Save data on all pairs (might be too big -> comment out to avoid)
-    cols = [
-        "name_1",
-        "email_1",
-        "name_2",
-        "email_2",
-        "c1",
-        "c2",
-        "c3.1",
-        "c3.2",
-    ]
-    df = pd.DataFrame(SIMILARITY, columns=cols)
-
-    df.to_csv(
-        os.path.join(f"{data_folder}", "devs_similarity.csv"),
-        index=False,
-        header=True,
+    pair_count, limited = write_outputs(
+        chunks,
+        devs,
+        NO_C4C7_SCORES,
+        data_folder,
+        all_pairs_file,
+        threshold_files,
+        no_c4c7_pass_score,
+        stream=chunk_size is not None,
+        output_format=output_format,
     )
-
-    # Set similarity threshold, check c1-c3 against the threshold
-    # a csv file will be created for every threshold value, you may add or edit to the list
-    for t in thresholds:
-        print("Threshold:", t)
-        df["c1_check"] = df["c1"] >= t
-        df["c2_check"] = df["c2"] >= t
-        df["c3_check"] = (df["c3.1"] >= t) & (df["c3.2"] >= t)
-        # Keep only rows where at least one condition is True
-
-        df = df[df[["c1_check", "c2_check", "c3_check"]].any(axis=1)]
-
-        print(f"Limited Pairs: {len(df)}")
-        print("__________________________")
-
-        # Omit "check" columns, save to csv
-        df = df[
-            [
-                "name_1",
-                "email_1",
-                "name_2",
-                "email_2",
-                "c1",
-                "c2",
-                "c3.1",
-                "c3.2",
-            ]
-        ]
-
-        # Add empty column for manual annotation
-        df.insert(0, "true_pos", 0)
-
-        df.to_csv(
-            os.path.join(
-                f"{data_folder}",
-                f"devs_similarity_no_c4c7{"_email_check=" if email_check else ""}{len(generic_prefixes) if email_check else ""}_t={t}.csv",
-            ),
-            index=False,
-            header=True,
-        )
+    print_summary(title, pair_count, thresholds, limited)
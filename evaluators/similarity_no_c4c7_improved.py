@@ -1,15 +1,91 @@
-import os
-import pandas as pd
-from itertools import combinations
+from collections.abc import Iterable
 from Levenshtein import ratio as sim
-from tools.helpers import process, most_common_prefixes
+from .batch import BLOCK_CELLS, batch_bird
+from .columns import CHUNK_SIZE
+from .output import (
+    print_summary,
+    print_top_k_summary,
+    write_outputs,
+    write_top_k,
+)
+from .parallel import score_chunks
+from .maps import maps_settings, mapped_chunks
+from .store import store_path, stored_scores
+from .topk import top_k_file
+from .similarity_no_c4c7 import NO_C4C7_SCORES, no_c4c7_pass_score
+from tools.helpers import process_devs, most_common_prefixes
+from tools.profiling import profiled
+
+
+def improved_c1_c3_norm(
+    norm_a: tuple[str, ...], norm_b: tuple[str, ...], generic_prefixes: set[str]
+):
+    """
+    Calculates the first three conditions of the Bird heuristic with the improved email check
+    from already normalized developers (rows of process_devs()).
+    c2 is only dropped for generic prefixes when the names are not similar (c1 < 0.60).
+    """
+    name_a, first_a, last_a, _, _, email_a, prefix_a = norm_a[:7]
+    name_b, first_b, last_b, _, _, email_b, prefix_b = norm_b[:7]
+    # Conditions of Bird heuristic
+    c1 = sim(name_a, name_b)
+    # CHECK FOR A SAME EMAIL-PREFIX
+    if prefix_a in generic_prefixes or prefix_b in generic_prefixes:
+        if c1 < 0.60:
+            c2 = 0
+        else:
+            c2 = sim(prefix_a, prefix_b)
+    else:
+        c2 = sim(prefix_a, prefix_b)
+    c31 = sim(first_a, first_b)
+    c32 = sim(last_a, last_b)
+
+    return c1, c2, c31, c32, email_a, email_b
+
+
+def improved_scores(
+    norm_a: tuple[str, ...], norm_b: tuple[str, ...], generic_prefixes: set[str]
+) -> tuple:
+    """
+    Scores c1-c3 of one pair of developers with the improved email check, in the order of
+    NO_C4C7_SCORES.
+    """
+    return improved_c1_c3_norm(norm_a, norm_b, generic_prefixes)[:4]
+
+
+def improved_outputs(
+    thresholds: list[float],
+) -> tuple[str, str, list[tuple[float, str]]]:
+    """
+    Title of the printed summary, all-pairs csv file, and threshold and csv file of every
+    threshold of similarity_no_c4c7_email_improved().
+    """
+    # a csv file will be created for every threshold value, you may add or edit to the list
+    threshold_files = [
+        (t, f"devs_similarity_no_c4c7_improved_t={t}.csv") for t in thresholds
+    ]
+    return (
+        "\nno_c4c7 improved, email check -> True",
+        "devs_similarity.csv",
+        threshold_files,
+    )
 
 
+@profiled("similarity_no_c4c7_email_improved")
 def similarity_no_c4c7_email_improved(
     devs: list[list[str]],
     data_folder: str,
     generic_prefixes: set[str],
     thresholds: list[float],
+    table: list[tuple[str, ...]] | None = None,
+    pairs: Iterable[tuple[int, int]] | None = None,
+    backend: str = "pair",
+    workers: int = 1,
+    chunk_size: int | None = None,
+    store: bool = False,
+    output_format: str = "csv",
+    score_maps: bool = False,
+    top_k: int | None = None,
 ):
     """
     Calculates similarity between developer name pairs using the Bird heuristic.
@@ -28,6 +104,37 @@ def similarity_no_c4c7_email_improved(
             If True, email prefixes matching generic domains are excluded from similarity checks.
         threshholds : list[float]
             List of similarity threshold values (0.0-1.0) to generate separate filtered outputs.
+        table : list[tuple[str, ...]] | None
+            Normalized developers from process_devs(devs). Built here if not given.
+        pairs : Iterable[tuple[int, int]] | None
+            Index pairs (i, j), i < j, to score, e.g. from tools.blocking.blocked_pairs().
+            All pairs are scored if not given.
+        backend : str
+            "pair" scores one pair at a time with Levenshtein, "batch" scores blocks of
+            pairs with RapidFuzz across all cores (see evaluators.batch).
+        workers : int
+            Number of processes scoring the pairs in parallel shards, the output is the
+            same as with one process.
+        chunk_size : int | None
+            If given, pairs are scored and written in chunks of this many rows and the
+            threshold files are filtered on the fly, so memory stays flat however many
+            developers there are. All pairs are kept in memory if None.
+        store : bool
+            Keep the scores of all pairs in a store in data_folder and, on the next run,
+            score only the pairs involving new developers (see evaluators.store).
+            Needs all pairs, pairs must not be given.
+        output_format : str
+            "csv", or "parquet" to write compressed .parquet files in row groups
+            instead of the .csv files (see evaluators.output.read_pairs()).
+        score_maps : bool
+            Also keep every score of all pairs in condensed arrays on disk, in a
+            "maps_*" folder of data_folder, to write threshold files again for other
+            thresholds without scoring (see tools.rethreshold). Needs all pairs, pairs
+            must not be given.
+        top_k : int | None
+            If given, write the top_k nearest identities of every developer, by pass
+            score, to a "_top={top_k}" file instead of the all-pairs and threshold
+            files, keeping only O(n·top_k) pairs in memory (see evaluators.topk).
 
     Outputs
     -------
@@ -36,86 +143,80 @@ def similarity_no_c4c7_email_improved(
         devs_similarity_no_c4c7_t={threshold}.csv
             Filtered pairs meeting threshold criteria (one per threshold)
     """
-    SIMILARITY = []
-
-    for dev_a, dev_b in combinations(devs, 2):
-        name_a, first_a, last_a, _, _, email_a, prefix_a = process(dev_a)
-        name_b, first_b, last_b, _, _, email_b, prefix_b = process(dev_b)
-        # Conditions of Bird heuristic
-        c1 = sim(name_a, name_b)
-        # CHECK FOR A SAME EMAIL-PREFIX
-        if prefix_a in generic_prefixes or prefix_b in generic_prefixes:
-            if c1 < 0.60:
-                c2 = 0
-            else:
-                c2 = sim(prefix_a, prefix_b)
+    if table is None:
+        table = process_devs(devs)
+
+    def score(pairs):
+        if backend == "batch":
+            return batch_bird(
+                table,
+                generic_prefixes,
+                True,
+                pairs,
+                improved=True,
+                block_cells=chunk_size or BLOCK_CELLS,
+            )
+        elif backend == "pair":
+            return score_chunks(
+                table,
+                improved_scores,
+                (generic_prefixes,),
+                NO_C4C7_SCORES,
+                pairs,
+                workers,
+                chunk_size or CHUNK_SIZE,
+            )
         else:
-            c2 = sim(prefix_a, prefix_b)
-        c31 = sim(first_a, first_b)
-        c32 = sim(last_a, last_b)
+            raise ValueError(f"Unknown backend: {backend}")
+
+    if store:
+        if pairs is not None:
+            raise ValueError("The score store needs all pairs, pairs must not be given")
+        settings = repr(("improved", sorted(generic_prefixes)))
+        chunks = stored_scores(
+            devs,
+            store_path(data_folder, "improved", settings),
+            settings,
+            NO_C4C7_SCORES,
+            score,
+        )
+    else:
+        chunks = score(pairs)
+    if score_maps:
+        if pairs is not None:
+            raise ValueError("Score maps need all pairs, pairs must not be given")
+        chunks = mapped_chunks(
+            chunks,
+            devs,
+            data_folder,
+            maps_settings("improved", True, generic_prefixes),
+            NO_C4C7_SCORES,
+        )
 
-        # Similarity without c4 - c7
-        SIMILARITY.append([dev_a[0], email_a, dev_b[0], email_b, c1, c2, c31, c32])
+    title, all_pairs_file, threshold_files = improved_outputs(thresholds)
 
-    print("\nno_c4c7 improved, email check -> True")
-    print(f"Pairs: {len(SIMILARITY)}")
-    print("____________")
+    if top_k is not None:
+        target = {
+            "columns": {col: col for col in NO_C4C7_SCORES},
+            "top_k_file": top_k_file(improved_outputs, top_k),
+            "pass_score": no_c4c7_pass_score,
+        }
+        pair_count, rows = write_top_k(
+            chunks, devs, NO_C4C7_SCORES, data_folder, [target], top_k, output_format
+        )[0]
+        print_top_k_summary(title, pair_count, top_k, rows)
+        return
 
     # Save data on all pairs (might be too big -> comment out to avoid)
-    cols = [
-        "name_1",
-        "email_1",
-        "name_2",
-        "email_2",
-        "c1",
-        "c2",
-        "c3.1",
-        "c3.2",
-    ]
-    df = pd.DataFrame(SIMILARITY, columns=cols)
-
-    df.to_csv(
-        os.path.join(f"{data_folder}", "devs_similarity.csv"),
-        index=False,
-        header=True,
+    pair_count, limited = write_outputs(
+        chunks,
+        devs,
+        NO_C4C7_SCORES,
+        data_folder,
+        all_pairs_file,
+        threshold_files,
+        no_c4c7_pass_score,
+        stream=chunk_size is not None,
+        output_format=output_format,
     )
-
-    # Set similarity threshold, check c1-c3 against the threshold
-    # a csv file will be created for every threshold value, you may add or edit to the list
-    for t in thresholds:
-        print("Threshold:", t)
-        df["c1_check"] = df["c1"] >= t
-        df["c2_check"] = df["c2"] >= t
-        df["c3_check"] = (df["c3.1"] >= t) & (df["c3.2"] >= t)
-        # Keep only rows where at least one condition is True
-
-        df = df[df[["c1_check", "c2_check", "c3_check"]].any(axis=1)]
-
-        print(f"Limited Pairs: {len(df)}")
-        print("__________________________")
-
-        # Omit "check" columns, save to csv
-        df = df[
-            [
-                "name_1",
-                "email_1",
-                "name_2",
-                "email_2",
-                "c1",
-                "c2",
-                "c3.1",
-                "c3.2",
-            ]
-        ]
-
-        # Add empty column for manual annotation
-        df.insert(0, "true_pos", 0)
-
-        df.to_csv(
-            os.path.join(
-                f"{data_folder}",
-                f"devs_similarity_no_c4c7_improved_t={t}.csv",
-            ),
-            index=False,
-            header=True,
-        )
+    print_summary(title, pair_count, thresholds, limited)
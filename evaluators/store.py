@@ -0,0 +1,153 @@
+import hashlib
+import os
+from collections.abc import Callable, Iterable, Iterator
+from shutil import rmtree
+
+import numpy as np
+
+from .columns import CHUNK_SIZE
+from .maps import (
+    close_maps,
+    condensed_pairs,
+    load_maps,
+    map_chunks,
+    open_maps,
+    write_maps,
+)
+
+
+def store_path(data_folder: str, evaluator: str, settings: str) -> str:
+    """
+    Score store folder of an evaluator run with the given settings.
+    """
+    digest = hashlib.sha1(settings.encode()).hexdigest()[:8]
+    return os.path.join(data_folder, f"scores_{evaluator}_{digest}")
+
+
+def _load(
+    path: str, settings: str
+) -> tuple[list[list[str]], dict[str, np.ndarray]] | None:
+    """
+    Opens a score store, or None if there is none or it was made with other settings.
+    """
+    if not os.path.isdir(path):
+        return None
+    devs, meta, maps = load_maps(path)
+    if meta["settings"] != settings:
+        print(f"Score store {path} has other settings, scoring all pairs")
+        return None
+    return devs, maps
+
+
+def new_pairs(n: int, new: np.ndarray) -> Iterator[tuple[int, int]]:
+    """
+    Pairs (i, j), i < j, of n developers where i or j is in new, in the order of
+    combinations(range(n), 2).
+    """
+    is_new = np.zeros(n, dtype=bool)
+    is_new[new] = True
+    new = np.sort(new).tolist()
+    for i in range(n):
+        if is_new[i]:
+            yield from ((i, j) for j in range(i + 1, n))
+        else:
+            yield from ((i, j) for j in new if j > i)
+
+
+def _copy_stored(
+    stored: dict[str, np.ndarray],
+    moved: np.ndarray,
+    maps: dict[str, np.ndarray],
+    n: int,
+):
+    """
+    Copies the stored scores of the pairs of developers still in devs to their new
+    positions in the condensed arrays of n developers, CHUNK_SIZE pairs at a time.
+    """
+    old_n = len(moved)
+    total = old_n * (old_n - 1) // 2
+    for start in range(0, total, CHUNK_SIZE):
+        i, j = condensed_pairs(old_n, np.arange(start, min(start + CHUNK_SIZE, total)))
+        i, j = moved[i], moved[j]
+        rows = np.flatnonzero((i >= 0) & (j >= 0))
+        chunk = {"i": i[rows], "j": j[rows]}
+        for col, values in stored.items():
+            chunk[col] = values[start : start + CHUNK_SIZE][rows]
+        write_maps(maps, n, chunk, {col: col for col in stored})
+
+
+def stored_scores(
+    devs: list[list[str]],
+    path: str,
+    settings: str,
+    score_types: dict[str, type],
+    score: Callable[[Iterable[tuple[int, int]] | None], Iterable[dict]],
+) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Scores all pairs of devs, reusing the scores kept in a store by an earlier run.
+
+    Developers are matched to the store by name and email, so devs.csv may have grown
+    and been re-sorted since. Only the pairs involving a developer missing from the
+    store are scored, then the store is updated. Pairs of developers no longer in devs
+    are dropped. The result is the same as scoring all pairs, in the order of
+    combinations(range(len(devs)), 2).
+
+    The store holds the scores as condensed arrays, one value per pair (see
+    evaluators.maps). The old store is memory-mapped and copied to the new one, and the
+    new pairs are written into it, a chunk at a time, so memory stays flat. Copying
+    still reads and writes every stored pair, which takes a fraction of the time of
+    scoring them.
+
+    Args
+    -------
+    devs : list[list[str]]
+        List of developer lists containing ["name", "email"].
+    path : str
+        Store folder, see store_path().
+    settings : str
+        Evaluator and its arguments. A store made with other settings is rebuilt.
+    score_types : dict[str, type]
+        Score columns of the evaluator and their types.
+    score : Callable
+        Scores the given pairs, or all pairs if None, into chunks of typed columns.
+
+    Yields
+    -------
+    dict[str, np.ndarray]
+        Chunks of typed columns, see evaluators.columns.
+    """
+    n = len(devs)
+    stored = _load(path, settings)
+    index = {(dev[0], dev[1]): k for k, dev in enumerate(devs)}
+    if stored is not None:
+        # Position of every stored developer in devs, -1 if it is gone
+        moved = np.array([index.get(tuple(dev), -1) for dev in stored[0]], np.int64)
+        # Stored pairs must stay ordered, scores such as c4 and c6 are not symmetric
+        if np.any(np.diff(moved[moved >= 0]) <= 0):
+            print(f"Developers of {path} were reordered, scoring all pairs")
+            stored = None
+
+    columns = {col: col for col in score_types}
+    tmp, maps = open_maps(path, n, score_types)
+    done = False
+    try:
+        if stored is None:
+            for chunk in score(None):
+                write_maps(maps, n, chunk, columns)
+                yield chunk
+        else:
+            _copy_stored(stored[1], moved, maps, n)
+            new = np.setdiff1d(np.arange(n), moved[moved >= 0])
+            print(f"Score store: {len(new)} new developers")
+            if len(new):
+                for chunk in score(new_pairs(n, new)):
+                    write_maps(maps, n, chunk, columns)
+            stored = None
+            # All pairs are in place, read them back in order
+            yield from map_chunks(maps, n, None, CHUNK_SIZE)
+        close_maps(maps, tmp, path, devs, {"settings": settings})
+        done = True
+    finally:
+        if not done:
+            del maps
+            rmtree(tmp, ignore_errors=True)
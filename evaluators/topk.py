@@ -0,0 +1,130 @@
+from collections.abc import Callable, Iterable
+
+import numpy as np
+
+from .columns import CHUNK_SIZE, INDEX_DTYPE, concat_columns, take
+
+
+def top_k_file(get_outputs: Callable[[list[float]], tuple], k: int) -> str:
+    """
+    Name of the top-k file of an evaluator, the name of its threshold files with
+    "_top=k" instead of "_t=threshold".
+
+    Args
+    -------
+    get_outputs : Callable[[list[float]], tuple]
+        Outputs of the evaluator for the given thresholds, e.g.
+        lambda thresholds: no_c4c7_outputs(email_check, generic_prefixes, thresholds).
+    k : int
+        Number of neighbours per developer.
+    """
+    _, _, threshold_files = get_outputs([0])
+    return threshold_files[0][1].replace("_t=0.csv", f"_top={k}.csv")
+
+
+def _merge(
+    kept: dict[str, np.ndarray], new: dict[str, np.ndarray], k: int, kth: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    Keeps the k best neighbours of every developer among those kept so far and new
+    ones, and updates kth, the score a new neighbour must reach to get in.
+    """
+    # New neighbours below the kth best of their developer cannot get in
+    new = take(new, new["score"] >= kth[new["dev"]])
+    if not len(new["dev"]):
+        return kept
+    candidates = concat_columns([kept, new], {})
+    # By developer, best score first, ties to the first neighbour
+    order = np.lexsort((candidates["other"], -candidates["score"], candidates["dev"]))
+    devs = candidates["dev"][order]
+    starts = np.flatnonzero(np.r_[True, devs[1:] != devs[:-1]])
+    counts = np.diff(np.r_[starts, len(devs)])
+    rank = np.arange(len(devs)) - np.repeat(starts, counts)
+    kept = take(candidates, order[rank < k])
+
+    full = starts[counts >= k]
+    kth[devs[full]] = candidates["score"][order[full + k - 1]]
+    return kept
+
+
+def top_k_columns(
+    chunks: Iterable[dict[str, np.ndarray]],
+    n: int,
+    k: int,
+    score_types: dict[str, type],
+    targets: list[dict],
+) -> tuple[int, list[dict[str, np.ndarray]]]:
+    """
+    Streams through the scored pairs and keeps, for every developer, the k pairs with
+    the highest pass score, the nearest identities of the developer.
+
+    Every developer has a bounded set of at most k neighbours. A chunk only adds the
+    pairs reaching the kth best score of one of their developers so far, then the sets
+    are cut back to k, so memory stays O(n·k) however many pairs are scored.
+
+    Args
+    -------
+    chunks : Iterable[dict[str, np.ndarray]]
+        Scored pairs as typed columns (see evaluators.columns).
+    n : int
+        Number of developers.
+    k : int
+        Number of neighbours per developer.
+    score_types : dict[str, type]
+        Score columns of the chunks and their types.
+    targets : list[dict]
+        Outputs of every evaluator:
+        "columns": output column -> chunk column, in output order,
+        "pass_score": function giving the pass score of every pair of a chunk.
+
+    Returns
+    -------
+    tuple[int, list[dict[str, np.ndarray]]]
+        Number of pairs, and for every target the rows of every developer, sorted by
+        developer and rank: "i" the developer, "j" the neighbour, "rank" from 1,
+        "score" the pass score, and the score columns of the pair.
+    """
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    kept, kth = [], []
+    for target in targets:
+        columns = {
+            "dev": np.empty(0, INDEX_DTYPE),
+            "other": np.empty(0, INDEX_DTYPE),
+            "score": np.empty(0, np.float64),
+        }
+        for col, source in target["columns"].items():
+            columns[col] = np.empty(0, score_types[source])
+        kept.append(columns)
+        kth.append(np.full(n, -np.inf))
+
+    pairs = 0
+    for chunk in chunks:
+        pairs += len(chunk["i"])
+        # Merged CHUNK_SIZE pairs at a time, so that the kth best scores filter out
+        # most pairs of large chunks (e.g. of the batch backend) before sorting
+        for start in range(0, len(chunk["i"]), CHUNK_SIZE):
+            part = take(chunk, slice(start, start + CHUNK_SIZE))
+            for n_target, target in enumerate(targets):
+                view = {col: part[source] for col, source in target["columns"].items()}
+                score = target["pass_score"](view).astype(np.float64)
+                # Every pair is a neighbour of both of its developers
+                new = {
+                    "dev": np.concatenate([part["i"], part["j"]]),
+                    "other": np.concatenate([part["j"], part["i"]]),
+                    "score": np.concatenate([score, score]),
+                }
+                for col, values in view.items():
+                    new[col] = np.concatenate([values, values])
+                kept[n_target] = _merge(kept[n_target], new, k, kth[n_target])
+
+    results = []
+    for columns in kept:
+        devs = columns.pop("dev")
+        starts = np.flatnonzero(np.r_[True, devs[1:] != devs[:-1]][: len(devs)])
+        counts = np.diff(np.r_[starts, len(devs)])
+        rank = np.arange(len(devs)) - np.repeat(starts, counts)
+        rows = {"i": devs, "j": columns.pop("other"), "rank": rank + 1}
+        rows.update(columns)
+        results.append(rows)
+    return pairs, results
@@ -1,41 +1,80 @@
-from tools.helpers import get_repository, most_common_prefixes
+from tools.helpers import (
+    CLONE_CACHE,
+    GENERIC_PREFIXES,
+    get_repository,
+    most_common_prefixes,
+    process_devs,
+)
 
 # import all evaluation functions
 from evaluators.similarity_default import similarity_default
 from evaluators.similarity_jaro import similarity_jw_bird
 from evaluators.similarity_no_c4c7 import similarity_no_c4c7
 from evaluators.similarity_no_c4c7_improved import similarity_no_c4c7_email_improved
+from evaluators.fused import similarity_fused
 
 
 def main():
     repo_uri = ""
-    devs, folder_path = get_repository(repo_uri)
+    # With cache_dir=CLONE_CACHE remote repositories are mirrored in repo-cache/ and
+    # only fetched on later runs, without it they are cloned again every time
+    # update=True mines only the commits added since the last run into devs.csv
+    # fast=True reads the developers straight from git log, much faster than PyDriller
+    # mailmap=True collapses the aliases of the repository's .mailmap in devs.csv
+    # For many repositories, tools.mining.mine_repositories(repo_uris, workers=8)
+    # mines them in parallel, each into its own data folder.
+    devs, folder_path = get_repository(repo_uri, cache_dir=CLONE_CACHE)
 
     # Check for generic email-prefix
     email_check = True
-    generic_prefixes = {
-        "mail",
-        "github",
-        "git",
-        "info",
-        "hello",
-        "me",
-        "contact",
-        "dev",
-        "support",
-        "admin",
-    }
+    generic_prefixes = GENERIC_PREFIXES
     # Set the thresholds to use
     thresholds = [0.9, 0.99]
 
     # print the 10 most common email prefixes
     most_common_prefixes(devs, 10)
 
+    # Normalize developers once, shared by all evaluators
+    table = process_devs(devs)
+
+    # To skip pairs that share no name token, surname or email prefix, pass
+    # blocked_pairs(table, ignore_prefixes=generic_prefixes) after table.
+    # It is a generator, create a new one for every evaluator.
+    # threshold_join_pairs(table, min(thresholds), generic_prefixes) skips only the
+    # pairs that cannot reach the lowest threshold, so the _t= files stay the same
+    # (use an empty set for the improved evaluator, and c4_c7=True for the default one).
+
+    # The Levenshtein evaluators also take backend="batch" to score pairs in blocks
+    # with RapidFuzz on all cores instead of one pair at a time.
+    # All evaluators take workers=N to score the pairs in N processes instead.
+    # With chunk_size=100_000 they write the pairs in chunks instead of keeping all
+    # of them in memory.
+    # With store=True the scores are kept in the data folder, and later runs only
+    # score the pairs of new developers.
+    # With output_format="parquet" the files are written as compressed .parquet files,
+    # read them back with evaluators.output.read_pairs(path, columns).
+    # With score_maps=True the scores are also kept on disk, and
+    # tools.rethreshold.rethreshold() writes the _t= files for other thresholds or
+    # conditions without scoring again.
+    # With top_k=5 only the 5 nearest identities of every developer are written,
+    # to a _top=5 file, in O(n·k) memory.
+    # To profile a run stage by stage, wrap it in
+    # with profile_run(profile_report_path(folder_path)):
+    # from tools.profiling (memory=True also traces the peak memory of every stage).
+
+    # To score the pairs once for several evaluators, use instead
+    # similarity_fused(devs, folder_path, email_check, generic_prefixes, thresholds,
+    #                  ["no_c4c7", "improved"], table)
+
     # If more similarity versions, add booleans or make a new function
-    # similarity_default(devs, folder_path, email_check, generic_prefixes, thresholds)
-    similarity_no_c4c7(devs, folder_path, email_check, generic_prefixes, thresholds)
-    # similarity_jw_bird(devs, folder_path, email_check, generic_prefixes, thresholds)
-    similarity_no_c4c7_email_improved(devs, folder_path, generic_prefixes, thresholds)
+    # similarity_default(devs, folder_path, email_check, generic_prefixes, thresholds, table)
+    similarity_no_c4c7(
+        devs, folder_path, email_check, generic_prefixes, thresholds, table
+    )
+    # similarity_jw_bird(devs, folder_path, email_check, generic_prefixes, thresholds, table)
+    similarity_no_c4c7_email_improved(
+        devs, folder_path, generic_prefixes, thresholds, table
+    )
 
 
 if __name__ == "__main__":
@@ -1,4 +1,10 @@
 import os
+import json
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
 from shutil import rmtree
 
 from evaluators.similarity_default import (
@@ -8,10 +14,30 @@ from evaluators.similarity_default import (
 )
 
 from evaluators.similarity_jaro import similarity_jw_bird, jaro_c1_c4
-from evaluators.similarity_no_c4c7 import similarity_no_c4c7
+from evaluators.similarity_no_c4c7 import (
+    NO_C4C7_SCORES,
+    no_c4c7_scores,
+    similarity_no_c4c7,
+)
 from evaluators.similarity_no_c4c7_improved import similarity_no_c4c7_email_improved
 
-from tools.helpers import get_repository
+from evaluators.columns import to_columns
+from evaluators.fused import similarity_fused
+from evaluators.maps import load_maps, mapped_chunks, maps_path, maps_settings
+from evaluators.output import read_pairs, threshold_rows
+from evaluators.parallel import PENDING_PER_WORKER, score_chunks, triangle_shards
+from tools.helpers import get_repository, process_devs
+from tools.profiling import profile_run, stage
+from tools.rethreshold import rethreshold
+from tools.synthetic import synthetic_devs
+from tools.benchmark import (
+    compare_baseline,
+    run_benchmarks,
+    sample_pairs,
+    save_baseline,
+)
+from tools.blocking import blocked_pairs
+from tools.simjoin import threshold_join_pairs
 
 DEV_A = ["John Doe", "john.doe@example.com"]
 DEV_B = ["Jane Doe", "jane.doe@example.com"]
@@ -124,6 +150,347 @@ def test_sim_no_c4_c7(capsys):
     )
 
 
+def test_sim_no_c4_c7_table(capsys):
+    """Precomputed table gives the same output as normalizing inside the evaluator."""
+    similarity_no_c4c7(DEVS, DATAFOLDER, False, GENERIC_PREFIXES, THRESHOLDS)
+    path = os.path.join(DATAFOLDER, f"devs_similarity_no_c4c7_t={THRESHOLDS[0]}.csv")
+    with open(path) as file:
+        expected = file.read()
+
+    similarity_no_c4c7(
+        DEVS, DATAFOLDER, False, GENERIC_PREFIXES, THRESHOLDS, process_devs(DEVS)
+    )
+    captured = capsys.readouterr()
+
+    assert "Pairs: 6" in captured.out
+    with open(path) as file:
+        assert file.read() == expected
+
+
+def test_sim_no_c4_c7_blocked_pairs(capsys):
+    """Only the candidate pairs from blocking are scored."""
+    devs = [
+        ["John Doe", "jd@example.com"],
+        ["Mark Twain", "mark@example.com"],
+        ["Jane Doe", "jane@example.com"],
+    ]
+    table = process_devs(devs)
+    similarity_no_c4c7(
+        devs,
+        DATAFOLDER,
+        False,
+        GENERIC_PREFIXES,
+        THRESHOLDS,
+        table,
+        blocked_pairs(table),
+    )
+
+    captured = capsys.readouterr()
+
+    assert "pruned 2 of 3" in captured.out
+    assert "Pairs: 1" in captured.out
+
+
+def test_default_sim_threshold_join(capsys):
+    """The similarity join gives the same threshold file as scoring every pair."""
+    similarity_default(DEVS, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS)
+    path = os.path.join(
+        DATAFOLDER,
+        f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_t={THRESHOLDS[0]}.csv",
+    )
+    with open(path) as file:
+        expected = file.read()
+
+    table = process_devs(DEVS)
+    pairs = threshold_join_pairs(table, min(THRESHOLDS), GENERIC_PREFIXES, c4_c7=True)
+    similarity_default(
+        DEVS, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS, table, pairs
+    )
+    captured = capsys.readouterr()
+
+    assert "Similarity join:" in captured.out
+    with open(path) as file:
+        assert file.read() == expected
+
+
+def test_default_sim_batch_backend(capsys):
+    """The batched RapidFuzz backend writes the same files as the per-pair one."""
+    outputs = []
+    for backend in ("pair", "batch"):
+        similarity_default(
+            DEVS, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS, backend=backend
+        )
+        files = []
+        for name in (
+            "devs_similarity.csv",
+            f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_t={THRESHOLDS[0]}.csv",
+        ):
+            with open(os.path.join(DATAFOLDER, name)) as file:
+                files.append(file.read())
+        outputs.append(files)
+
+    captured = capsys.readouterr()
+
+    assert captured.out.count("Pairs: 6") == 2
+    assert outputs[0] == outputs[1]
+
+
+def test_sim_c4c7_improved_batch_backend_pairs(capsys):
+    """Batched scoring of an explicit pair stream."""
+    devs = [
+        ["Jane Doe", "github@gmail.com"],
+        ["John Doe", "github@gmail.com"],
+        ["Mark Twain", "github@gmail.com"],
+    ]
+    similarity_no_c4c7_email_improved(
+        devs, DATAFOLDER, GENERIC_PREFIXES, THRESHOLDS, pairs=[(0, 1), (1, 2)]
+    )
+    path = os.path.join(DATAFOLDER, "devs_similarity.csv")
+    with open(path) as file:
+        expected = file.read()
+
+    similarity_no_c4c7_email_improved(
+        devs,
+        DATAFOLDER,
+        GENERIC_PREFIXES,
+        THRESHOLDS,
+        pairs=[(0, 1), (1, 2)],
+        backend="batch",
+    )
+    captured = capsys.readouterr()
+
+    assert captured.out.count("Pairs: 2") == 2
+    with open(path) as file:
+        assert file.read() == expected
+
+
+def test_sim_no_c4_c7_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown backend"):
+        similarity_no_c4c7(
+            DEVS, DATAFOLDER, False, GENERIC_PREFIXES, THRESHOLDS, backend="gpu"
+        )
+
+
+def test_triangle_shards():
+    shards = triangle_shards(10, 3)
+
+    # Consecutive row ranges covering all rows
+    assert shards[0][0] == 0
+    assert shards[-1][1] == 10
+    assert all(a[1] == b[0] for a, b in zip(shards, shards[1:]))
+    # Early rows hold more pairs, so their ranges are shorter
+    assert shards == [(0, 2), (2, 4), (4, 10)]
+    assert triangle_shards(0, 4) == []
+
+
+def test_score_chunks_bounded():
+    """Workers only read the pairs of the shards submitted ahead of the consumer."""
+    table = process_devs(synthetic_devs(30))
+    read = []
+
+    def lazy_pairs():
+        for pair in combinations(range(len(table)), 2):
+            read.append(pair)
+            yield pair
+
+    workers, chunk_size = 2, 5
+    chunks = score_chunks(
+        table,
+        no_c4c7_scores,
+        (GENERIC_PREFIXES, True),
+        NO_C4C7_SCORES,
+        lazy_pairs(),
+        workers,
+        chunk_size,
+    )
+    first = next(chunks)
+    # The submitted shards and the one submitted in place of the first
+    assert len(read) <= (workers * PENDING_PER_WORKER + 1) * chunk_size
+    rest = list(chunks)
+    assert len(read) == 30 * 29 // 2
+    assert len(first["i"]) == chunk_size
+    assert np.concatenate([first["i"]] + [c["i"] for c in rest]).tolist() == [
+        i for i, _ in read
+    ]
+
+
+def test_to_columns():
+    types = {"c1": np.float32, "c4": np.bool_}
+    columns = to_columns([0, 0], [1, 2], [(1.0, False), (0.5, True)], types)
+
+    assert columns["i"].dtype == np.int32
+    assert columns["c1"].dtype == np.float32
+    assert columns["c4"].tolist() == [False, True]
+    # Empty chunks keep their types
+    assert to_columns([], [], [], types)["c4"].dtype == np.bool_
+
+
+def test_threshold_rows():
+    pass_scores = np.array([0.5, 0.95, np.inf, 0.8, 0.9], dtype=np.float32)
+    rows = [r.tolist() for r in threshold_rows(pass_scores, [0.8, 0.9, 0.9, 1.0])]
+
+    assert rows == [[1, 2, 3, 4], [1, 2, 4], [1, 2, 4], [2]]
+
+
+def test_sim_jaro_workers(capsys):
+    """Sharded scoring in a process pool writes the same file as one process."""
+    outputs = []
+    for workers, pairs in ((1, None), (2, None), (2, [(0, 1), (0, 3), (2, 3)])):
+        similarity_jw_bird(
+            DEVS,
+            DATAFOLDER,
+            False,
+            GENERIC_PREFIXES,
+            THRESHOLDS,
+            pairs=pairs,
+            workers=workers,
+        )
+        with open(os.path.join(DATAFOLDER, "devs_jw_similarity.csv")) as file:
+            outputs.append(file.read().splitlines())
+
+    captured = capsys.readouterr()
+
+    assert captured.out.count("Pairs: 6") == 2
+    assert "Pairs: 3" in captured.out
+    assert outputs[0] == outputs[1]
+    # Pairs (0, 1), (0, 3) and (2, 3), in order
+    pairs = [line.split(",")[:4] for line in outputs[2]]
+    assert pairs == [outputs[0][k].split(",")[:4] for k in (0, 1, 3, 6)]
+
+
+def test_default_sim_chunk_size(capsys):
+    """Streaming in chunks writes the same files and counts as the in-memory run."""
+    names = [
+        "devs_similarity.csv",
+        f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_t={THRESHOLDS[0]}.csv",
+        f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_t=0.99.csv",
+    ]
+    outputs = []
+    for chunk_size in (None, 4):
+        similarity_default(
+            DEVS,
+            DATAFOLDER,
+            True,
+            GENERIC_PREFIXES,
+            THRESHOLDS + [0.99],
+            chunk_size=chunk_size,
+        )
+        files = []
+        for name in names:
+            with open(os.path.join(DATAFOLDER, name)) as file:
+                files.append(file.read())
+        outputs.append(files)
+
+    captured = capsys.readouterr()
+    runs = captured.out.split("Default bird")
+
+    assert outputs[0] == outputs[1]
+    assert runs[1].strip() == runs[2].strip()
+
+
+def test_sim_jaro_chunk_size_no_pairs(capsys):
+    """Streamed files keep their header when no pair is scored."""
+    similarity_jw_bird(
+        DEVS, DATAFOLDER, False, GENERIC_PREFIXES, THRESHOLDS, pairs=[], chunk_size=2
+    )
+
+    captured = capsys.readouterr()
+
+    assert "Pairs: 0" in captured.out
+    with open(
+        os.path.join(DATAFOLDER, f"devs_jw_similarity_t={THRESHOLDS[0]}.csv")
+    ) as f:
+        assert f.read() == "true_pos,name_1,email_1,name_2,email_2,c1,c2,c3,c4\n"
+
+
+def test_sim_fused(capsys):
+    """One fused run writes the same files and summaries as the evaluators in turn."""
+    names = [
+        "devs_similarity.csv",
+        f"devs_similarity_no_c4c7_email_check={len(GENERIC_PREFIXES)}_t={THRESHOLDS[0]}.csv",
+        f"devs_jw_similarity_email_check={len(GENERIC_PREFIXES)}_t={THRESHOLDS[0]}.csv",
+        f"devs_similarity_no_c4c7_improved_t={THRESHOLDS[0]}.csv",
+    ]
+    outputs = []
+    for fused in (False, True):
+        if fused:
+            similarity_fused(
+                DEVS,
+                DATAFOLDER,
+                True,
+                GENERIC_PREFIXES,
+                THRESHOLDS,
+                ["no_c4c7", "jaro", "improved"],
+            )
+        else:
+            similarity_no_c4c7(DEVS, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS)
+            similarity_jw_bird(DEVS, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS)
+            similarity_no_c4c7_email_improved(
+                DEVS, DATAFOLDER, GENERIC_PREFIXES, THRESHOLDS
+            )
+        files = []
+        for name in names:
+            with open(os.path.join(DATAFOLDER, name)) as file:
+                files.append(file.read())
+        outputs.append(files)
+        outputs.append(capsys.readouterr().out)
+
+    assert outputs[0] == outputs[2]
+    assert outputs[1] == outputs[3]
+    with pytest.raises(ValueError, match="Unknown evaluator"):
+        similarity_fused(
+            DEVS, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS, ["levenshtein"]
+        )
+
+
+def test_default_sim_store(capsys):
+    """Scores of new developers are merged into the store, same files as a full run."""
+    name = f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_t={THRESHOLDS[0]}.csv"
+    outputs = []
+    for devs, store in ((DEVS[1:], True), (DEVS, True), (DEVS, False)):
+        similarity_default(
+            devs, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS, store=store
+        )
+        with open(os.path.join(DATAFOLDER, name)) as file:
+            outputs.append(file.read())
+
+    captured = capsys.readouterr()
+
+    assert "Score store: 1 new developers" in captured.out
+    assert outputs[1] == outputs[2]
+    with pytest.raises(ValueError, match="needs all pairs"):
+        similarity_default(
+            DEVS, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS, pairs=[], store=True
+        )
+
+
+def test_store_stream(tmp_path, capsys):
+    """An updated store streams the same pairs as a full run, gone developers dropped."""
+    devs = synthetic_devs(40, seed=5)
+    name = f"devs_similarity_no_c4c7_email_check={len(GENERIC_PREFIXES)}_t=0.5.csv"
+    outputs = []
+    # Three developers added and one gone since the first run
+    updated = devs[:20] + devs[21:]
+    for run_devs, store in ((devs[3:], True), (updated, True), (updated, False)):
+        similarity_no_c4c7(
+            run_devs,
+            str(tmp_path),
+            True,
+            GENERIC_PREFIXES,
+            [0.5],
+            chunk_size=7,
+            store=store,
+        )
+        with open(tmp_path / name) as file:
+            outputs.append(file.read())
+
+    assert "Score store: 3 new developers" in capsys.readouterr().out
+    assert outputs[1] == outputs[2]
+    (store,) = [path for path in os.listdir(tmp_path) if path.startswith("scores_")]
+    assert not store.endswith(".tmp")
+    assert os.path.isfile(tmp_path / store / "devs.csv")
+
+
 def test_sim_no_c4_c7_email(capsys):
     similarity_no_c4c7(DEVS, DATAFOLDER, True, GENERIC_PREFIXES, THRESHOLDS)
 
@@ -254,3 +621,277 @@ def test_sim_c4c7_improved_generic_c2not0(capsys):
             f"devs_similarity_no_c4c7_improved_t={THRESHOLDS[0]}.csv",
         )
     )
+
+
+def test_sample_pairs():
+    """Sampled pairs are distinct, ordered pairs, all of them when size is large."""
+    assert sample_pairs(20, 500) == list(combinations(range(20), 2))
+    pairs = sample_pairs(1000, 300, seed=4)
+    assert len(set(pairs)) == 300
+    assert pairs == sorted(pairs)
+    assert all(0 <= i < j < 1000 for i, j in pairs)
+
+
+def test_benchmarks(tmp_path, capsys):
+    """Benchmarks run offline and are compared with a saved baseline."""
+    results = run_benchmarks((40, 60), ("no_c4c7",), max_pairs=1000)
+    assert [(r["devs"], r["pairs"], r["sampled"]) for r in results] == [
+        (40, 780, False),
+        (60, 1000, True),
+    ]
+    assert all(r["pairs_per_second"] > 0 for r in results)
+
+    baseline = str(tmp_path / "baseline.json")
+    save_baseline(results, baseline)
+    slower = [dict(r, pairs_per_second=r["pairs_per_second"] / 2) for r in results]
+    assert len(compare_baseline(slower, baseline)) == 2
+    assert compare_baseline(results, baseline) == []
+    assert "Regressions: 0" in capsys.readouterr().out
+
+
+def test_profile_run(tmp_path, capsys):
+    """Stages of an evaluator are reported with their pairs, and only when profiling."""
+    with stage("off") as counts:
+        counts["pairs"] = 1
+    devs = [DEV_A, DEV_B, DEV_A_GEN, DEV_B_NOT_SAME_INIT]
+    report_file = str(tmp_path / "profile.json")
+    with profile_run(report_file, memory=True) as report:
+        similarity_no_c4c7(
+            devs, str(tmp_path), True, GENERIC_PREFIXES, [0.5, 0.9], chunk_size=4
+        )
+    with open(report_file) as file:
+        assert json.load(file) == report
+    stages = {entry["stage"]: entry for entry in report["stages"]}
+    assert "off" not in stages
+    assert list(stages)[:2] == ["similarity_no_c4c7", "similarity_no_c4c7/process_devs"]
+    assert stages["similarity_no_c4c7/score"]["pairs"] == 6
+    assert stages["similarity_no_c4c7/to_csv"]["pairs"] >= 6
+    assert all(entry["peak_mb"] > 0 for entry in stages.values())
+    assert report["seconds"] >= stages["similarity_no_c4c7"]["seconds"]
+    assert f"Profile report: {report_file}" in capsys.readouterr().out
+
+
+def test_default_sim_parquet(tmp_path):
+    """Parquet files hold the rows of the csv files, one row group per chunk."""
+    names = [
+        "devs_similarity",
+        f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_t={THRESHOLDS[0]}",
+        f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_t=0.99",
+    ]
+    for output_format in ("csv", "parquet"):
+        os.mkdir(tmp_path / output_format)
+        similarity_default(
+            DEVS,
+            str(tmp_path / output_format),
+            True,
+            GENERIC_PREFIXES,
+            THRESHOLDS + [0.99],
+            chunk_size=4,
+            output_format=output_format,
+        )
+    for name in names:
+        csv_df = read_pairs(str(tmp_path / "csv" / f"{name}.csv"))
+        parquet_df = read_pairs(str(tmp_path / "parquet" / f"{name}.parquet"))
+        # Scores are float32 in parquet as in the evaluators
+        pd.testing.assert_frame_equal(parquet_df, csv_df, check_dtype=False)
+
+    all_pairs = str(tmp_path / "parquet" / "devs_similarity.parquet")
+    metadata = pq.ParquetFile(all_pairs).metadata
+    assert metadata.num_row_groups == -(-metadata.num_rows // 4)
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+    assert read_pairs(all_pairs, ["c1"]).columns.tolist() == ["c1"]
+    frames = list(read_pairs(all_pairs, lambda col: col.startswith("c"), chunksize=4))
+    assert sum(len(df) for df in frames) == metadata.num_rows
+    assert frames[0].columns.tolist() == [
+        "c1",
+        "c2",
+        "c3.1",
+        "c3.2",
+        "c4",
+        "c5",
+        "c6",
+        "c7",
+    ]
+    with pytest.raises(ValueError, match="Unknown output format"):
+        similarity_default(
+            DEVS,
+            str(tmp_path),
+            True,
+            GENERIC_PREFIXES,
+            THRESHOLDS,
+            output_format="xlsx",
+        )
+
+
+def test_rethreshold(tmp_path, capsys):
+    """Threshold files rebuilt from score maps are those of a new scoring run."""
+    thresholds = [0.7, 0.9]
+    os.mkdir(tmp_path / "rethreshold")
+    for name, maps in (("maps", True), ("scored", False), ("fused", True)):
+        os.mkdir(tmp_path / name)
+        if name == "fused":
+            similarity_fused(
+                DEVS,
+                str(tmp_path / name),
+                True,
+                GENERIC_PREFIXES,
+                [0.99],
+                ["default", "jaro"],
+                score_maps=maps,
+            )
+            continue
+        similarity_default(
+            DEVS,
+            str(tmp_path / name),
+            True,
+            GENERIC_PREFIXES,
+            [0.99] if maps else thresholds,
+            chunk_size=4,
+            score_maps=maps,
+        )
+    capsys.readouterr()
+
+    maps_folder = maps_path(
+        str(tmp_path / "maps"), maps_settings("default", True, GENERIC_PREFIXES)
+    )
+    devs, meta, maps = load_maps(maps_folder)
+    n = len(DEVS)
+    assert devs == [dev[:2] for dev in DEVS] and meta["devs"] == n
+    assert isinstance(maps["c1"], np.memmap) and len(maps["c1"]) == n * (n - 1) // 2
+    # Fused runs write the same maps
+    fused_folder = maps_path(
+        str(tmp_path / "fused"), maps_settings("default", True, GENERIC_PREFIXES)
+    )
+    for col, values in load_maps(fused_folder)[2].items():
+        assert np.array_equal(values, maps[col])
+
+    pairs, limited = rethreshold(maps_folder, thresholds, str(tmp_path / "rethreshold"))
+    assert pairs == n * (n - 1) // 2
+    assert f"Limited Pairs: {limited[0]}" in capsys.readouterr().out
+    for t in thresholds:
+        name = f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_t={t}.csv"
+        with open(tmp_path / "scored" / name) as scored, open(
+            tmp_path / "rethreshold" / name
+        ) as rebuilt:
+            assert rebuilt.read() == scored.read()
+
+    _, limited_c1 = rethreshold(maps_folder, [0.7], conditions=["c1"])
+    df = read_pairs(
+        os.path.join(
+            str(tmp_path / "maps"),
+            f"devs_similarity_email_check={len(GENERIC_PREFIXES)}_c1_t=0.7.csv",
+        )
+    )
+    assert len(df) == limited_c1[0] <= limited[0]
+    assert (df["c1"] >= 0.7).all()
+    with pytest.raises(ValueError, match="Unknown condition"):
+        rethreshold(maps_folder, [0.7], conditions=["c8"])
+    with pytest.raises(ValueError, match="need all pairs"):
+        similarity_default(
+            DEVS,
+            str(tmp_path),
+            True,
+            GENERIC_PREFIXES,
+            [0.7],
+            pairs=[],
+            score_maps=True,
+        )
+
+
+def test_mapped_chunks_cleanup(tmp_path):
+    """Maps stopped before all chunks are through leave no temporary folder behind."""
+    devs = [dev[:2] for dev in DEVS]
+    n = len(devs)
+    settings = maps_settings("default", True, GENERIC_PREFIXES)
+    path = maps_path(str(tmp_path), settings)
+    i, j = np.triu_indices(n, 1)
+    pairs = {"i": i, "j": j, "c1": np.linspace(0, 1, len(i))}
+
+    def chunks(fail=False):
+        for start in range(0, len(i), 2):
+            if fail and start:
+                raise RuntimeError("scoring failed")
+            yield {col: values[start : start + 2] for col, values in pairs.items()}
+
+    mapped = list(mapped_chunks(chunks(), devs, str(tmp_path), settings, {"c1": float}))
+    assert len(mapped) == (len(i) + 1) // 2
+
+    # The consumer stops early
+    stopped = mapped_chunks(chunks(), devs, str(tmp_path), settings, {"c1": float})
+    next(stopped)
+    assert os.path.isdir(f"{path}.tmp")
+    stopped.close()
+    assert not os.path.exists(f"{path}.tmp")
+    # The scoring fails
+    with pytest.raises(RuntimeError, match="scoring failed"):
+        for _ in mapped_chunks(
+            chunks(True), devs, str(tmp_path), settings, {"c1": float}
+        ):
+            pass
+    assert not os.path.exists(f"{path}.tmp")
+    # The maps of the complete run are kept
+    assert np.array_equal(load_maps(path)[2]["c1"], pairs["c1"])
+
+
+def test_top_k(tmp_path, capsys):
+    """Streamed top-k neighbours are those of sorting all pairs, for every developer."""
+    devs = synthetic_devs(60, seed=3)
+    k = 3
+    similarity_no_c4c7(devs, str(tmp_path), True, GENERIC_PREFIXES, [0.9])
+    similarity_no_c4c7(
+        devs, str(tmp_path), True, GENERIC_PREFIXES, [0.9], chunk_size=50, top_k=k
+    )
+    assert f"Top {k} rows: {60 * k}" in capsys.readouterr().out
+
+    pairs = read_pairs(str(tmp_path / "devs_similarity.csv"))
+    c3 = np.minimum(pairs["c3.1"], pairs["c3.2"])
+    pairs["score"] = np.maximum.reduce([pairs["c1"], pairs["c2"], c3]).astype(
+        np.float32
+    )
+    index = {(name, email): n for n, (name, email) in enumerate(devs)}
+    pairs["i"] = [index[dev] for dev in zip(pairs["name_1"], pairs["email_1"])]
+    pairs["j"] = [index[dev] for dev in zip(pairs["name_2"], pairs["email_2"])]
+    both = pd.concat(
+        [
+            pairs[["i", "j", "score"]],
+            pairs[["j", "i", "score"]].set_axis(["i", "j", "score"], axis=1),
+        ]
+    )
+    expected = (
+        both.sort_values(["i", "score", "j"], ascending=[True, False, True])
+        .groupby("i")
+        .head(k)
+    )
+
+    name = f"devs_similarity_no_c4c7_email_check={len(GENERIC_PREFIXES)}_top={k}.csv"
+    top = read_pairs(str(tmp_path / name))
+    assert top.columns.tolist()[:5] == [
+        "name_1",
+        "email_1",
+        "rank",
+        "name_2",
+        "email_2",
+    ]
+    assert top["rank"].tolist() == [1, 2, 3] * 60
+    assert [index[dev] for dev in zip(top["name_1"], top["email_1"])] == expected[
+        "i"
+    ].tolist()
+    assert [index[dev] for dev in zip(top["name_2"], top["email_2"])] == expected[
+        "j"
+    ].tolist()
+
+    # One fused run writes the same file
+    os.mkdir(tmp_path / "fused")
+    similarity_fused(
+        devs,
+        str(tmp_path / "fused"),
+        True,
+        GENERIC_PREFIXES,
+        [0.9],
+        ["no_c4c7", "jaro"],
+        top_k=k,
+    )
+    with open(tmp_path / name) as file, open(tmp_path / "fused" / name) as fused:
+        assert fused.read() == file.read()
+    with pytest.raises(ValueError, match="k must be at least 1"):
+        similarity_no_c4c7(devs, str(tmp_path), True, GENERIC_PREFIXES, [0.9], top_k=0)
@@ -1,9 +1,31 @@
 import pytest
+import json
 import os
-from shutil import rmtree
-from tools.helpers import process, most_common_prefixes, get_repository
-from tools.true_positive import calc_tp
-from tools.combine_same_rows import annotate
+import numpy as np
+import pandas as pd
+import subprocess
+from shutil import copyfile, rmtree
+from tools.helpers import (
+    process,
+    process_devs,
+    most_common_prefixes,
+    get_repository,
+    mine_devs,
+    parse_mailmap,
+    apply_mailmap,
+    mirror_path,
+)
+from tools.mining import mine_repositories
+from tools.true_positive import calc_tp, tp_stats, write_tp_stats
+from tools.curves import best_thresholds, precision_curves
+from tools.combine_same_rows import annotate, annotate_dir
+from tools.blocking import blocking_keys, blocked_pairs
+from tools.clustering import cluster_ids, cluster_pairs, write_clusters
+from tools.labels import import_labels, label_file, open_labels
+from tools.profiling import profile_run
+from tools.synthetic import GENERIC_PREFIXES as SYNTHETIC_PREFIXES, synthetic_devs
+from tools.simjoin import ratio_bound, threshold_join_pairs, _multiset
+from Levenshtein import ratio
 
 
 def test_process_normal_name():
@@ -45,6 +67,94 @@ def test_process_two_spaces():
     assert prefix == "mrtestdriver"
 
 
+def test_process_devs_table():
+    devs = [
+        ["John Doe", "john.doe@example.com"],
+        ["house", "house@med.us"],
+    ]
+    table = process_devs(devs)
+
+    assert len(table) == 2
+    # Same values as process() followed by the composite keys
+    assert table[0][:7] == process(devs[0])
+    assert table[0][7] == "jdoe"
+    assert table[0][8] == "djohn"
+    # No last name -> composite keys are empty
+    assert table[1][7] == ""
+    assert table[1][8] == ""
+
+
+def test_blocking_keys():
+    norm = process_devs([["John Doe", "john.doe@example.com"]])[0]
+
+    assert blocking_keys(norm) == {
+        ("tokens", "john"),
+        ("tokens", "doe"),
+        ("surname", "doe"),
+        ("prefix", "john.doe"),
+    }
+    assert ("qgram", "ohn") in blocking_keys(norm, keys=("qgram",))
+    assert blocking_keys(norm, ignore_prefixes={"john.doe"}, keys=("prefix",)) == set()
+
+
+def test_blocked_pairs(capsys):
+    devs = [
+        ["John Doe", "jd@example.com"],
+        ["Mark Twain", "mark@example.com"],
+        ["Jane Doe", "jane@example.com"],
+        ["M. Twain", "mark@other.com"],
+    ]
+    pairs = list(blocked_pairs(process_devs(devs)))
+    captured = capsys.readouterr()
+
+    # Doe pair and Twain pair, in combinations() order
+    assert pairs == [(0, 2), (1, 3)]
+    assert "Blocking: 2 candidate pairs, pruned 4 of 6" in captured.out
+
+
+def test_ratio_bound():
+    for a, b in [("john", "jon"), ("anna", "nana"), ("", ""), ("", "x"), ("ab", "ba")]:
+        # Equal bounds may differ in the last bit of the float
+        assert ratio(a, b) <= ratio_bound(_multiset(a), _multiset(b)) + 1e-9
+    assert ratio_bound(_multiset(""), _multiset("")) == 1
+
+
+def test_threshold_join_pairs(capsys):
+    devs = [
+        ["John Doe", "jd@example.com"],
+        ["Mark Twain", "github@example.com"],
+        ["Jon Doe", "jon@example.com"],
+        ["Someone Else", "github@other.com"],
+        ["Twain", "mtwain@example.com"],
+    ]
+    table = process_devs(devs)
+    pairs = list(threshold_join_pairs(table, 0.8, {"github"}))
+    captured = capsys.readouterr()
+
+    # Only the two Does can reach 0.8, generic prefixes do not pair up
+    assert pairs == [(0, 2)]
+    assert "Similarity join: 1 candidate pairs, pruned 9 of 10" in captured.out
+
+    # c4: initial of the first name and the last name in the email prefix
+    assert (1, 4) in threshold_join_pairs(table, 0.8, {"github"}, c4_c7=True)
+    # Same pairs as without the join for a zero threshold
+    assert len(list(threshold_join_pairs(table, 0))) == 10
+
+
+def test_synthetic_devs():
+    """Seeded developers are distinct, sorted, and hold aliases and generic prefixes."""
+    devs = synthetic_devs(2000, seed=1)
+    assert devs == synthetic_devs(2000, seed=1)
+    assert devs != synthetic_devs(2000, seed=2)
+    assert len({tuple(dev) for dev in devs}) == 2000
+    assert devs == sorted(devs)
+    prefixes = [dev[1].split("@")[0] for dev in devs]
+    assert sum(prefix in SYNTHETIC_PREFIXES for prefix in prefixes) > 100
+    # Alias families share emails
+    assert len(set(dev[1] for dev in devs)) < 2000
+    assert any(not name.isascii() for name, _ in devs)
+
+
 def test_most_common_prefixes_prints_top(capsys):
     devs = [
         ["A", "alpha@example.com"],
@@ -98,6 +208,260 @@ def test_repo_folder_exists(capsys):
     rmtree(datafolder)
 
 
+def test_mine_devs_since(tmp_path):
+    """Incremental mining walks the commits added since, also from merged branches."""
+    repo = str(tmp_path / "repo")
+
+    def commit(*args, name="Dev A", email="a@example.com"):
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=name,
+            GIT_AUTHOR_EMAIL=email,
+            GIT_COMMITTER_NAME=name,
+            GIT_COMMITTER_EMAIL=email,
+        )
+        subprocess.run(["git", "-C", repo, *args], check=True, env=env)
+
+    subprocess.run(["git", "init", "-q", "-b", "main", repo], check=True)
+    assert mine_devs(repo) == (set(), None)
+
+    commit("commit", "-q", "--allow-empty", "-m", "first")
+    commit("checkout", "-q", "-b", "side")
+    commit("commit", "-q", "--allow-empty", "-m", "side", name="Dev S", email="s@x.com")
+    commit("checkout", "-q", "main")
+    devs, head = mine_devs(repo)
+    assert devs == {("Dev A", "a@example.com")}
+
+    # The side branch was created before head, but merged after it
+    commit(
+        "merge", "-q", "--no-ff", "side", "-m", "merge", name="Dev B", email="b@x.com"
+    )
+    devs, new_head = mine_devs(repo, head)
+    assert devs == {("Dev B", "b@x.com"), ("Dev S", "s@x.com")}
+    assert new_head != head
+    assert mine_devs(repo, new_head) == (set(), new_head)
+    # Unknown commit, e.g. after a force push
+    assert len(mine_devs(repo, "0" * 40)[0]) == 3
+
+
+def test_mine_devs_mirror(tmp_path):
+    """A remote is mirrored once into the cache, then only updated, also offline."""
+    remote = tmp_path / "remote.git"
+    work = str(tmp_path / "work")
+    cache = str(tmp_path / "cache")
+    subprocess.run(["git", "init", "-q", "--bare", str(remote)], check=True)
+    subprocess.run(["git", "clone", "-q", str(remote), work], check=True)
+    uri = remote.as_uri()
+
+    def push(name, email):
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=name,
+            GIT_AUTHOR_EMAIL=email,
+            GIT_COMMITTER_NAME=name,
+            GIT_COMMITTER_EMAIL=email,
+        )
+        subprocess.run(
+            ["git", "-C", work, "commit", "-q", "--allow-empty", "-m", name],
+            check=True,
+            env=env,
+        )
+        subprocess.run(["git", "-C", work, "push", "-q", "origin", "HEAD"], check=True)
+
+    push("Dev A", "a@example.com")
+    devs, head = mine_devs(uri, cache_dir=cache)
+    assert devs == {("Dev A", "a@example.com")}
+    mirror = mirror_path(uri, cache)
+    assert os.listdir(cache) == [os.path.basename(mirror)]
+    # Marks the mirror, a new clone would not have it
+    open(os.path.join(mirror, "marker"), "w").close()
+
+    push("Dev B", "b@example.com")
+    assert mine_devs(uri, head, cache_dir=cache)[0] == {("Dev B", "b@example.com")}
+    assert os.path.isfile(os.path.join(mirror, "marker"))
+
+    # The remote is gone, the mirror is used as it is
+    remote.rename(tmp_path / "moved.git")
+    assert len(mine_devs(uri, cache_dir=cache)[0]) == 2
+
+
+def test_mailmap():
+    """The four .mailmap forms, matched regardless of case, and comments as git."""
+    mailmap = parse_mailmap(
+        "# comment\n"
+        "Proper A <a@x.com>\n"
+        "<b@x.com> <B@old.com>\n"
+        "Proper C <c@x.com> <c@old.com>\n"
+        "Proper D <d@x.com> Old D <d@old.com> # trailing\n"
+        "<a@new.com> <a@x.com>\n"
+        "Proper E <e@x.com> # was <e@old.com>\n"
+        "Proper \\#F <f#1@x.com> <f@old.com>\n"
+        "C# Team <cs@x.com>\n"
+        "# Skipped <s@x.com> <s@old.com>\n"
+    )
+    assert apply_mailmap(mailmap, "A", "a@x.com") == ("Proper A", "a@new.com")
+    assert apply_mailmap(mailmap, "B", "b@old.com") == ("B", "b@x.com")
+    assert apply_mailmap(mailmap, "C", "C@old.com") == ("Proper C", "c@x.com")
+    assert apply_mailmap(mailmap, "old d", "d@old.com") == ("Proper D", "d@x.com")
+    assert apply_mailmap(mailmap, "Other", "d@old.com") == ("Other", "d@old.com")
+    # As git check-mailmap: only lines starting with "#" are comments, so "# was" is
+    # the commit name of the second email, and "#" elsewhere is kept as written
+    assert apply_mailmap(mailmap, "# WAS", "e@old.com") == ("Proper E", "e@x.com")
+    assert apply_mailmap(mailmap, "E", "e@old.com") == ("E", "e@old.com")
+    assert apply_mailmap(mailmap, "E", "e@x.com") == ("E", "e@x.com")
+    assert apply_mailmap(mailmap, "F", "f@old.com") == ("Proper \\#F", "f#1@x.com")
+    assert apply_mailmap(mailmap, "cs", "cs@x.com") == ("C# Team", "cs@x.com")
+    assert apply_mailmap(mailmap, "S", "s@old.com") == ("S", "s@old.com")
+
+
+def test_get_repository_mailmap(tmp_path, monkeypatch, capsys):
+    """Aliases of the .mailmap are collapsed in devs.csv and listed in mailmap.csv."""
+    monkeypatch.chdir(tmp_path)
+    repo = str(tmp_path / "repo")
+    subprocess.run(["git", "init", "-q", "-b", "main", repo], check=True)
+
+    def commit(name, email, mailmap=None):
+        if mailmap is not None:
+            (tmp_path / "repo" / ".mailmap").write_text(mailmap)
+            subprocess.run(["git", "-C", repo, "add", ".mailmap"], check=True)
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=name,
+            GIT_AUTHOR_EMAIL=email,
+            GIT_COMMITTER_NAME=name,
+            GIT_COMMITTER_EMAIL=email,
+        )
+        subprocess.run(
+            ["git", "-C", repo, "commit", "-q", "--allow-empty", "-m", name],
+            check=True,
+            env=env,
+        )
+
+    commit("Dev A", "a@example.com", "Dev A <a@example.com> <a@old.com>\n")
+    commit("dev-a", "a@old.com")
+    commit("Dev B", "b@example.com")
+    devs, folder = get_repository(repo, mailmap=True)
+    assert devs == [["Dev A", "a@example.com"], ["Dev B", "b@example.com"]]
+    with open(os.path.join(folder, "mailmap.csv")) as file:
+        assert file.read().splitlines() == [
+            "name,email,canonical_name,canonical_email",
+            "dev-a,a@old.com,Dev A,a@example.com",
+        ]
+    assert "Mailmap: 1 aliases resolved" in capsys.readouterr().out
+
+    # An update resolves the new commits, and the old aliases, with the new .mailmap
+    commit("Bee", "bee@example.com", "Dev B <b@example.com> <bee@example.com>\n")
+    devs, _ = get_repository(repo, update=True, mailmap=True)
+    assert devs == [
+        ["Dev A", "a@example.com"],
+        ["Dev B", "b@example.com"],
+        ["dev-a", "a@old.com"],
+    ]
+    with open(os.path.join(folder, "mailmap.csv")) as file:
+        assert file.read().splitlines()[1:] == [
+            "Bee,bee@example.com,Dev B,b@example.com"
+        ]
+
+
+def test_mine_devs_fast(tmp_path):
+    """Reading git log gives the same developers as walking commits with PyDriller."""
+    repo = str(tmp_path / "repo")
+    subprocess.run(["git", "init", "-q", "-b", "main", repo], check=True)
+    for name, email in (
+        ("José Müller", "jose@example.com"),
+        ("  Spaced  Name", "spaced@example.com"),
+        ("No Email", ""),
+    ):
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=name,
+            GIT_AUTHOR_EMAIL=email,
+            GIT_COMMITTER_NAME="Committer",
+            GIT_COMMITTER_EMAIL="committer@example.com",
+        )
+        subprocess.run(
+            ["git", "-C", repo, "commit", "-q", "--allow-empty", "-m", name],
+            check=True,
+            env=env,
+        )
+
+    fast = mine_devs(repo, fast=True)
+    assert fast == mine_devs(repo)
+    assert ("Committer", "committer@example.com") in fast[0]
+    assert len(fast[0]) == 4
+
+
+def test_mine_repositories(tmp_path, monkeypatch, capsys):
+    """Repositories are mined in parallel, a failing one does not stop the others and
+    a repeated one is mined once."""
+    monkeypatch.chdir(tmp_path)
+    repos = []
+    for name in ("first", "second"):
+        repo = str(tmp_path / "repos" / name)
+        subprocess.run(["git", "init", "-q", repo], check=True)
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=name,
+            GIT_AUTHOR_EMAIL=f"{name}@example.com",
+            GIT_COMMITTER_NAME=name,
+            GIT_COMMITTER_EMAIL=f"{name}@example.com",
+        )
+        subprocess.run(
+            ["git", "-C", repo, "commit", "-q", "--allow-empty", "-m", name],
+            check=True,
+            env=env,
+        )
+        repos.append(repo)
+    missing = str(tmp_path / "repos" / "missing")
+
+    result = mine_repositories([repos[0], missing, repos[1], repos[0]], workers=2)
+
+    captured = capsys.readouterr()
+    assert result == {
+        repos[0]: ([["first", "first@example.com"]], "first-data"),
+        repos[1]: ([["second", "second@example.com"]], "second-data"),
+    }
+    assert os.path.isfile(os.path.join("second-data", "devs.csv"))
+    # No data folder is left behind for the failed repository
+    assert not os.path.exists("missing-data")
+    assert "Repositories: 3, failed: 1" in captured.out
+    assert "same data folder" not in captured.out
+
+
+def test_cluster_ids():
+    """Pairs are merged transitively, clusters are numbered by their first identity."""
+    clusters = cluster_ids(7, [(5, 6), (1, 4), (4, 3), (6, 1), (2, 2)])
+    assert clusters.tolist() == [0, 1, 2, 1, 1, 1, 1]
+    assert cluster_ids(3, []).tolist() == [0, 1, 2]
+
+
+def test_cluster_pairs(tmp_path, capsys):
+    """Only true positives are merged with true_pos_only, devs become singletons."""
+    pair_file = "tests/csvs/test_annotated.csv"
+    identities, clusters = cluster_pairs([pair_file], true_pos_only=True)
+    assert identities[:3] == [
+        ("Aki Rodic", "rodic@adobe.com"),
+        ("Aki Rodić", "aleksandar.xyz@gmail.com"),
+        ("Aleksandar Rodic", "aleksandar.xyz@gmail.com"),
+    ]
+    assert clusters.tolist() == [0, 0, 0, 1, 1]
+    assert "Identities: 5, clusters: 2" in capsys.readouterr().out
+
+    devs = [["Solo", "solo@example.com"], ["Yomotsu", "admin@yomotsu.net"]]
+    identities, clusters = cluster_pairs([pair_file], devs)
+    assert identities[:2] == [tuple(dev) for dev in devs]
+    assert clusters.tolist() == [0, 1, 2, 2, 2, 1, 1, 1, 3, 3]
+
+    output_file = tmp_path / "clusters.csv"
+    write_clusters(identities, clusters, output_file)
+    rows = output_file.read_text().splitlines()
+    assert rows[0] == "name,email,cluster,canonical_name,canonical_email,size"
+    assert rows[1] == "Solo,solo@example.com,0,Solo,solo@example.com,1"
+    assert (
+        rows[-1] == "Antonio Gomez,hello@antoniogomez.me,3,Al McElrath,hello@yrns.org,2"
+    )
+
+
 def test_true_positive_calc():
     """Test TP, folder contains 1 valid and 1 invalid file."""
     path = "tests/csvs"
@@ -114,6 +478,72 @@ def test_true_positive_calc():
     )
 
 
+def test_tp_stats(tmp_path, capsys):
+    """Structured TP statistics of files and folders, in parallel."""
+    all_tp = tmp_path / "all_tp.csv"
+    all_tp.write_text("true_pos,name_1\n1,a\n1,b\n")
+    paths = ["tests/csvs", "annotated-three.js", str(all_tp)]
+    results = tp_stats(paths, workers=2)
+    assert results == tp_stats(paths)
+    assert "Files: 10, annotated: 9" in capsys.readouterr().out
+    assert results[0] == {
+        "path": os.path.join("tests/csvs", "test_annotated.csv"),
+        "file": "test_annotated.csv",
+        "pairs": 6,
+        "tp": 3,
+        "fp": 3,
+        "tp_fp": 1.0,
+        "precision": 0.5,
+    }
+    # No false positives
+    assert results[-1]["tp_fp"] is None
+    assert results[-1]["precision"] == 1.0
+
+    write_tp_stats(results, str(tmp_path / "stats.json"))
+    with open(tmp_path / "stats.json") as file:
+        assert json.load(file) == results
+    write_tp_stats(results, str(tmp_path / "stats.csv"))
+    with open(tmp_path / "stats.csv") as file:
+        lines = file.read().splitlines()
+    assert lines[0] == "path,file,pairs,tp,fp,tp_fp,precision"
+    assert lines[2].endswith(
+        "test_new_with_less.csv,test_new_with_less.csv,4,0,4,0.0,0.0"
+    )
+
+
+def test_precision_curves(tmp_path):
+    """Counts of every threshold and combination match filtering the file directly."""
+    path = "annotated-three.js/devs_similarity_no_c4c7_t=0.9_ANNOTATED_MAIN.csv"
+    curves = precision_curves(path, [0.9, 0.95, 1.0])
+    assert len(curves) == 7 * 3
+    df = pd.read_csv(path)
+    c3 = np.minimum(df["c3.1"], df["c3.2"])
+    for t in (0.9, 0.95, 1.0):
+        kept = (df["c1"] >= t) | (c3 >= t)
+        row = curves[(curves["conditions"] == "c1+c3") & (curves["threshold"] == t)]
+        assert row["pairs"].item() == kept.sum()
+        assert row["tp"].item() == (df["true_pos"][kept] == 1).sum()
+
+    # c4-c7 of the default evaluator pass at any threshold
+    default = tmp_path / "default.csv"
+    default.write_text(
+        "true_pos,name_1,email_1,name_2,email_2,c1,c2,c3.1,c3.2,c4,c5,c6,c7\n"
+        "1,a,a@x,b,b@x,0.95,0.1,0.1,0.1,False,False,False,False\n"
+        "1,a,a@x,c,c@x,0.1,0.1,0.1,0.1,False,True,False,False\n"
+        "0,b,b@x,c,c@x,0.1,0.99,0.1,0.1,False,False,False,False\n"
+    )
+    curves = precision_curves(str(default), [0.9, 0.96], ["c1", "c2", "c4-c7"])
+    all_conditions = curves[curves["conditions"] == "c1+c2+c4-c7"]
+    assert all_conditions["pairs"].tolist() == [3, 2]
+    assert all_conditions["tp"].tolist() == [2, 1]
+    best = best_thresholds(curves, 0.9)
+    assert best[["conditions", "threshold", "tp"]].values.tolist() == [
+        ["c1+c4-c7", 0.9, 2],
+        ["c1", 0.9, 1],
+        ["c4-c7", 0.9, 1],
+    ]
+
+
 def test_combine_rows_correct_files():
     """Test that annotate succeeds when new file is subset of annotated file."""
     annotate(
@@ -155,3 +585,88 @@ def test_combine_rows_create_new_dir():
     )
 
     assert os.path.isdir("tests/annotated_test_dir")
+
+
+def test_combine_rows_dir(tmp_path, capsys):
+    """Every threshold file of a folder is annotated against one original file."""
+    threshold_dir = tmp_path / "data"
+    threshold_dir.mkdir()
+    for name in ("test_annotated", "test_new_with_less", "test_new_with_unique"):
+        copyfile(f"tests/csvs/{name}.csv", threshold_dir / f"{name}.csv")
+    copyfile("tests/csvs/test_no_tp_col.csv", threshold_dir / "devs.csv")
+
+    annotated = annotate_dir(
+        str(threshold_dir / "test_annotated.csv"),
+        str(threshold_dir),
+        str(tmp_path / "annotated"),
+    )
+    output = str(tmp_path / "annotated" / "test_new_with_less_ANNOTATED.csv")
+    assert annotated == {str(threshold_dir / "test_new_with_less.csv"): output}
+    with open(output) as file:
+        assert [line[:2] for line in file.read().splitlines()] == [
+            "tr",
+            "1,",
+            "1,",
+            "0,",
+            "0,",
+        ]
+    assert "New File contains unique data!" in capsys.readouterr().out
+
+
+def test_labels(tmp_path, capsys):
+    """Labels are imported once and looked up by pair, in either order."""
+    connection = open_labels(str(tmp_path / "labels.sqlite"))
+    relabel = tmp_path / "relabel.csv"
+    relabel.write_text(
+        "true_pos,name_1,email_1,name_2,email_2\n"
+        "1,Akihiro Oyamada,admin@yomotsu.net,Shlomi Nissan,admin@betamark.com\n"
+    )
+    annotated = ["tests/csvs/test_annotated.csv", "tests/csvs/test_no_tp_col.csv"]
+    assert import_labels(connection, annotated + [str(relabel)]) == 6
+    assert "Skipped tests/csvs/test_no_tp_col.csv" in capsys.readouterr().out
+
+    pairs = tmp_path / "pairs.csv"
+    pairs.write_text(
+        "name_1,email_1,name_2,email_2,c1\n"
+        "Aki Rodić,ALEKSANDAR.xyz@gmail.com,Aki Rodic,rodic@adobe.com,1.0\n"
+        "Shlomi Nissan,admin@betamark.com,Akihiro Oyamada,admin@yomotsu.net,0.3\n"
+        "Al McElrath,hello@yrns.org,Antonio Gomez,hello@antoniogomez.me,0.3\n"
+        "New Dev,new@example.com,Aki Rodic,rodic@adobe.com,0.5\n"
+    )
+    output = tmp_path / "labelled.csv"
+    assert label_file(connection, str(pairs), str(output)) == (4, 3, 2)
+    assert [line[:2] for line in output.read_text().splitlines()] == [
+        "tr",
+        "1,",
+        "1,",
+        "0,",
+        "0,",
+    ]
+    connection.close()
+
+
+def test_profile_get_repository(tmp_path, monkeypatch):
+    """Mining is reported as stages of get_repository."""
+    monkeypatch.chdir(tmp_path)
+    repo = str(tmp_path / "repo")
+    subprocess.run(["git", "init", "-q", "-b", "main", repo], check=True)
+    subprocess.run(
+        ["git", "-C", repo, "commit", "-q", "--allow-empty", "-m", "first"],
+        check=True,
+        env=dict(
+            os.environ,
+            GIT_AUTHOR_NAME="Dev A",
+            GIT_AUTHOR_EMAIL="a@example.com",
+            GIT_COMMITTER_NAME="Dev B",
+            GIT_COMMITTER_EMAIL="b@example.com",
+        ),
+    )
+    with profile_run(str(tmp_path / "profile.json")) as report:
+        get_repository(repo)
+    stages = {entry["stage"]: entry for entry in report["stages"]}
+    assert list(stages) == [
+        "get_repository",
+        "get_repository/clone",
+        "get_repository/mine",
+    ]
+    assert stages["get_repository/mine"]["devs"] == 2
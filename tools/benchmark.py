@@ -0,0 +1,201 @@
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from evaluators.maps import condensed_pairs
+from evaluators.similarity_default import similarity_default
+from evaluators.similarity_jaro import similarity_jw_bird
+from evaluators.similarity_no_c4c7 import similarity_no_c4c7
+from evaluators.similarity_no_c4c7_improved import similarity_no_c4c7_email_improved
+from tools.helpers import process_devs
+from tools.profiling import max_rss_mb
+from tools.synthetic import GENERIC_PREFIXES, synthetic_devs
+
+# Evaluators timed by run_benchmarks()
+EVALUATORS = ("default", "no_c4c7", "improved", "jaro")
+# Number of developers of the synthetic populations
+SIZES = (1_000, 10_000, 50_000)
+# Most pairs scored per run, larger populations are scored on a sample of their pairs
+MAX_PAIRS = 500_000
+# Baseline of compare_baseline()
+BASELINE_FILE = "benchmark_baseline.json"
+
+
+def sample_pairs(n: int, size: int, seed: int = 0) -> list[tuple[int, int]]:
+    """
+    size pairs (i, j), i < j, of n developers drawn uniformly without repetition, in the
+    order of combinations(range(n), 2).
+    """
+    total = n * (n - 1) // 2
+    rng = np.random.default_rng(seed)
+    k = np.sort(rng.choice(total, size=min(size, total), replace=False))
+    i, j = condensed_pairs(n, k)
+    return list(zip(i.tolist(), j.tolist()))
+
+
+def _run(evaluator: str, n: int, max_pairs: int, seed: int) -> dict:
+    """
+    Times one evaluator on a synthetic population, in a fresh process of its own so
+    that its peak memory is its own.
+    """
+    devs = synthetic_devs(n, seed)
+    table = process_devs(devs)
+    total = n * (n - 1) // 2
+    pairs = None if total <= max_pairs else sample_pairs(n, max_pairs, seed)
+    thresholds = [0.9, 0.99]
+    generic_prefixes = set(GENERIC_PREFIXES)
+
+    with tempfile.TemporaryDirectory() as data_folder, contextlib.redirect_stdout(
+        io.StringIO()
+    ):
+        start = time.perf_counter()
+        if evaluator == "default":
+            similarity_default(
+                devs, data_folder, True, generic_prefixes, thresholds, table, pairs
+            )
+        elif evaluator == "no_c4c7":
+            similarity_no_c4c7(
+                devs, data_folder, True, generic_prefixes, thresholds, table, pairs
+            )
+        elif evaluator == "improved":
+            similarity_no_c4c7_email_improved(
+                devs, data_folder, generic_prefixes, thresholds, table, pairs
+            )
+        elif evaluator == "jaro":
+            similarity_jw_bird(
+                devs, data_folder, True, generic_prefixes, thresholds, table, pairs
+            )
+        else:
+            raise ValueError(f"Unknown evaluator: {evaluator}")
+        seconds = time.perf_counter() - start
+
+    scored = total if pairs is None else len(pairs)
+    return {
+        "evaluator": evaluator,
+        "devs": n,
+        "pairs": scored,
+        "sampled": pairs is not None,
+        "seconds": seconds,
+        "pairs_per_second": scored / seconds,
+        "peak_mb": max_rss_mb(),
+    }
+
+
+def run_benchmarks(
+    sizes: tuple[int, ...] = SIZES,
+    evaluators: tuple[str, ...] = EVALUATORS,
+    max_pairs: int = MAX_PAIRS,
+    seed: int = 0,
+) -> list[dict]:
+    """
+    Times the evaluators on seeded synthetic developers (see tools.synthetic), offline.
+
+    Every run scores all pairs and writes the csv files of the evaluator to a temporary
+    folder. Populations with more than max_pairs pairs are scored on a uniform sample of
+    max_pairs pairs instead, so pairs per second stay comparable while 50k developers
+    (1.25 billion pairs) take seconds. Each run is a separate process, for its peak
+    memory.
+
+    Args
+    -------
+    sizes : tuple[int, ...]
+        Numbers of developers.
+    evaluators : tuple[str, ...]
+        Among "default", "no_c4c7", "improved" and "jaro".
+    max_pairs : int
+        Most pairs scored per run.
+    seed : int
+        Seed of the developers and of the pair samples.
+
+    Returns
+    -------
+    list[dict]
+        For every size and evaluator: "evaluator", "devs", "pairs", "sampled",
+        "seconds", "pairs_per_second" and "peak_mb" (peak resident memory of the run).
+    """
+    results = []
+    context = multiprocessing.get_context("spawn")
+    print(f"{'Evaluator':<10} {'Devs':>7} {'Pairs':>10} {'Pairs/s':>10} {'Peak MB':>8}")
+    for n in sizes:
+        for evaluator in evaluators:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(_run, evaluator, n, max_pairs, seed).result()
+            results.append(result)
+            peak = f"{result['peak_mb']:.0f}" if result["peak_mb"] is not None else "-"
+            sampled = "*" if result["sampled"] else " "
+            print(
+                f"{evaluator:<10} {n:>7} {result['pairs']:>10}{sampled}"
+                f"{result['pairs_per_second']:>10.0f} {peak:>8}"
+            )
+    if any(result["sampled"] for result in results):
+        print("* sample of the pairs")
+    return results
+
+
+def save_baseline(results: list[dict], path: str = BASELINE_FILE):
+    """
+    Saves the results of run_benchmarks() as the baseline of later runs.
+    """
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def compare_baseline(
+    results: list[dict], path: str = BASELINE_FILE, tolerance: float = 0.2
+) -> list[dict]:
+    """
+    Compares the results of run_benchmarks() with a saved baseline, and prints the
+    change of pairs per second of every run found in both.
+
+    Args
+    -------
+    results : list[dict]
+        Results of run_benchmarks().
+    path : str
+        Baseline from save_baseline().
+    tolerance : float
+        Slowdown, as a share of the baseline pairs per second, reported as a regression.
+
+    Returns
+    -------
+    list[dict]
+        Regressions: the results at least tolerance slower than the baseline, with the
+        "baseline" pairs per second.
+    """
+    with open(path, "r") as file:
+        baseline = {
+            (result["evaluator"], result["devs"], result["pairs"]): result
+            for result in json.load(file)
+        }
+    regressions = []
+    for result in results:
+        base = baseline.get((result["evaluator"], result["devs"], result["pairs"]))
+        if base is None:
+            continue
+        change = result["pairs_per_second"] / base["pairs_per_second"] - 1
+        status = "REGRESSION" if change <= -tolerance else ""
+        print(f"{result['evaluator']:<10} {result['devs']:>7} {change:>+8.1%} {status}")
+        if status:
+            regressions.append(dict(result, baseline=base["pairs_per_second"]))
+    print(f"Regressions: {len(regressions)}")
+    return regressions
+
+
+def main():
+    results = run_benchmarks()
+    # The first run becomes the baseline, later runs are compared with it
+    if os.path.isfile(BASELINE_FILE):
+        compare_baseline(results)
+    else:
+        save_baseline(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import Iterator
+
+# Blocking keys used when none are specified
+BLOCKING_KEYS = ("tokens", "surname", "prefix")
+
+
+def blocking_keys(
+    norm: tuple[str, ...],
+    keys: tuple[str, ...] = BLOCKING_KEYS,
+    surname_length: int = 4,
+    q: int = 3,
+    ignore_prefixes: set[str] = frozenset(),
+) -> set[tuple[str, str]]:
+    """
+    Collects the blocking keys of one normalized developer.
+
+    Args
+    -------
+    norm : tuple[str, ...]
+        Row of process_devs()
+    keys : tuple[str, ...]
+        Which kinds of keys to generate:
+            - "tokens": every word of the normalized name
+            - "surname": the first surname_length characters of the last name
+            - "prefix": the email prefix, unless it is in ignore_prefixes
+            - "qgram": every character q-gram of the normalized name
+    surname_length : int
+        Length of the surname prefix key.
+    q : int
+        Length of the q-gram keys.
+    ignore_prefixes : set[str]
+        Email prefixes that should not form a block, e.g. the generic prefixes.
+
+    Returns
+    -------
+    set[tuple[str, str]]
+        Keys as (kind, value), so that values of different kinds never collide.
+    """
+    name, _, last, _, _, _, prefix = norm[:7]
+    result = set()
+
+    if "tokens" in keys:
+        result.update(("tokens", token) for token in name.split())
+    if "surname" in keys and last != "":
+        result.add(("surname", last[:surname_length]))
+    if "prefix" in keys and prefix != "" and prefix not in ignore_prefixes:
+        result.add(("prefix", prefix.casefold()))
+    if "qgram" in keys:
+        compact = name.replace(" ", "")
+        # Names shorter than q form a single gram, an empty name has none
+        if 0 < len(compact) <= q:
+            result.add(("qgram", compact))
+        else:
+            result.update(
+                ("qgram", compact[i : i + q]) for i in range(len(compact) - q + 1)
+            )
+    return result
+
+
+def blocked_pairs(
+    table: list[tuple[str, ...]],
+    keys: tuple[str, ...] = BLOCKING_KEYS,
+    surname_length: int = 4,
+    q: int = 3,
+    ignore_prefixes: set[str] = frozenset(),
+    max_block_size: int | None = None,
+) -> Iterator[tuple[int, int]]:
+    """
+    Yields the index pairs (i, j), i < j, of developers sharing at least one blocking key.
+
+    Pairs come out in the same order as combinations(range(len(table)), 2), so the
+    evaluators produce their rows in the usual order, only without the pruned pairs.
+    The number of kept and pruned pairs is printed once the stream is exhausted.
+
+    Args
+    -------
+    table : list[tuple[str, ...]]
+        Normalized developers from process_devs()
+    keys, surname_length, q, ignore_prefixes :
+        See blocking_keys().
+    max_block_size : int | None
+        Blocks larger than this are skipped, as they would not prune anything. None keeps
+        every block.
+    """
+    index = defaultdict(list)
+    dev_keys = []
+    for i, norm in enumerate(table):
+        dev_key = blocking_keys(norm, keys, surname_length, q, ignore_prefixes)
+        dev_keys.append(dev_key)
+        for key in dev_key:
+            index[key].append(i)
+
+    if max_block_size is not None:
+        index = {k: v for k, v in index.items() if len(v) <= max_block_size}
+
+    kept = 0
+    for i, dev_key in enumerate(dev_keys):
+        candidates = set()
+        for key in dev_key:
+            block = index.get(key)
+            if block:
+                # Blocks are sorted, only partners after i are needed
+                candidates.update(block[bisect_right(block, i) :])
+        kept += len(candidates)
+        for j in sorted(candidates):
+            yield i, j
+
+    total = len(table) * (len(table) - 1) // 2
+    print(f"Blocking: {kept} candidate pairs, pruned {total - kept} of {total}")
@@ -0,0 +1,150 @@
+import csv
+import os
+from array import array
+from collections.abc import Iterable
+
+import numpy as np
+
+from evaluators.output import read_pairs
+
+# Columns of the developers of a pair in the output csv files
+PAIR_COLUMNS = ["name_1", "email_1", "name_2", "email_2"]
+# Rows of a pair csv file read at a time
+READ_CHUNK = 100_000
+
+
+def cluster_ids(n: int, edges: Iterable[tuple[int, int]]) -> np.ndarray:
+    """
+    Groups n identities into clusters with a disjoint-set forest, merging the two
+    identities of every edge, and the clusters of both, transitively.
+
+    Union by size and path halving keep the trees flat, so the cost is near-linear in
+    the number of edges.
+
+    Args
+    -------
+    n : int
+        Number of identities.
+    edges : Iterable[tuple[int, int]]
+        Index pairs (i, j) of identities that are the same developer.
+
+    Returns
+    -------
+    np.ndarray
+        Cluster of every identity. Clusters are numbered from 0 in the order of their
+        first identity, which is the canonical identity of the cluster.
+    """
+    parent = list(range(n))
+    size = [1] * n
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for a, b in edges:
+        root_a, root_b = find(a), find(b)
+        if root_a == root_b:
+            continue
+        if size[root_a] < size[root_b]:
+            root_a, root_b = root_b, root_a
+        parent[root_b] = root_a
+        size[root_a] += size[root_b]
+
+    numbers = {}
+    clusters = [numbers.setdefault(find(a), len(numbers)) for a in range(n)]
+    return np.array(clusters, dtype=np.int64)
+
+
+def cluster_pairs(
+    pair_files: list[str],
+    devs: list[list[str]] | None = None,
+    true_pos_only: bool = False,
+) -> tuple[list[tuple[str, str]], np.ndarray]:
+    """
+    Merges the developers of matched pairs into identity clusters, see cluster_ids().
+
+    The pairs are read from csv or parquet files written by the evaluators, e.g. the
+    "devs_similarity_*_t=*.csv" files, which only hold the pairs passing their
+    threshold, or their annotated copies.
+
+    Args
+    -------
+    pair_files : list[str]
+        Paths of csv or parquet files with "name_1", "email_1", "name_2" and "email_2" columns.
+    devs : list[list[str]] | None
+        List of developer lists containing ["name", "email"]. If given, every developer
+        gets a cluster, a singleton if it is in no pair, and comes before the
+        identities only found in the pairs.
+    true_pos_only : bool
+        Only merge the pairs annotated as true positives (true_pos of 1).
+
+    Returns
+    -------
+    tuple[list[tuple[str, str]], np.ndarray]
+        The (name, email) identities, and the cluster of every identity.
+    """
+    identities = [tuple(dev[:2]) for dev in devs or []]
+    index = {identity: k for k, identity in enumerate(identities)}
+
+    def number(identity):
+        k = index.setdefault(identity, len(identities))
+        if k == len(identities):
+            identities.append(identity)
+        return k
+
+    # Identity numbers of the two sides of every pair, compact for millions of pairs
+    side_1, side_2 = array("q"), array("q")
+    for pair_file in pair_files:
+        columns = PAIR_COLUMNS + (["true_pos"] if true_pos_only else [])
+        for chunk in read_pairs(pair_file, columns, chunksize=READ_CHUNK):
+            if true_pos_only:
+                chunk = chunk[chunk["true_pos"].astype(int) == 1]
+            for name_1, email_1, name_2, email_2 in zip(
+                *(chunk[col] for col in PAIR_COLUMNS)
+            ):
+                side_1.append(number((name_1, email_1)))
+                side_2.append(number((name_2, email_2)))
+
+    clusters = cluster_ids(len(identities), zip(side_1, side_2))
+    sizes = np.bincount(clusters)
+    print(f"Matched pairs: {len(side_1)}")
+    print(f"Identities: {len(identities)}, clusters: {len(sizes)}")
+    if len(sizes):
+        print(f"Largest cluster: {sizes.max()}, merged clusters: {(sizes > 1).sum()}")
+    return identities, clusters
+
+
+def write_clusters(
+    identities: list[tuple[str, str]], clusters: np.ndarray, output_file: str
+):
+    """
+    Writes the cluster of every identity to a csv with the columns name, email, cluster,
+    the canonical name and email of the cluster, and the size of the cluster.
+    """
+    sizes = np.bincount(clusters)
+    canonical = {}
+    for identity, cluster in zip(identities, clusters.tolist()):
+        canonical.setdefault(cluster, identity)
+    with open(output_file, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile, delimiter=",", quotechar='"')
+        writer.writerow(
+            ["name", "email", "cluster", "canonical_name", "canonical_email", "size"]
+        )
+        for identity, cluster in zip(identities, clusters.tolist()):
+            writer.writerow([*identity, cluster, *canonical[cluster], sizes[cluster]])
+
+
+def main():
+    # Matched pairs, e.g. a threshold file or an annotated copy of it
+    pair_files = ["three.js-data/devs_similarity_no_c4c7_improved_t=0.9.csv"]
+    # Only merge the pairs annotated as true positives
+    true_pos_only = False
+    output_file = os.path.join("three.js-data", "identity_clusters.csv")
+    identities, clusters = cluster_pairs(pair_files, true_pos_only=true_pos_only)
+    write_clusters(identities, clusters, output_file)
+
+
+if __name__ == "__main__":
+    main()
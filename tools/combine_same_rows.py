@@ -2,49 +2,87 @@ import csv
 import os
 
 
-def annotate(annotated_file: str, file_to_annotate: str, annotated_dir: str):
-    """
-    Copies the annotations from the original file to a new one.
-    Requires the new file to be smaller than the original, and the process with which
-    the new file was produced HAS TO BE REDUCTIVE compared to the old one.
-    Creates a directory named annotated if it doesn't exist, where the resulting csv file will be written.
+def annotation_index(annotated_file: str) -> tuple[dict[tuple[str, ...], bool], int]:
     """
-    annotated_csv = []
-    new_csv = []
+    Reads an annotated file into an index of its pairs, in a single streaming pass.
 
+    Returns
+    -------
+    tuple[dict[tuple[str, ...], bool], int]
+        (name_1, email_1, name_2, email_2) -> whether any row of the pair is annotated
+        as true positive, and the number of rows.
+    """
+    index = {}
+    rows = 0
     with open(annotated_file, "r", newline="") as csvfile:
         reader = csv.reader(csvfile, delimiter=",")
+        # First element is header, skip
+        next(reader, None)
         for row in reader:
-            annotated_csv.append(row)
-    # First element is header, skip
-    annotated_csv = annotated_csv[1:]
-
-    with open(file_to_annotate, "r", newline="") as csvfile:
-        reader = csv.reader(csvfile, delimiter=",")
-        for row in reader:
-            new_csv.append(row)
-    # First element is header, skip
-    new_csv = new_csv[1:]
+            rows += 1
+            key = tuple(row[1:5])
+            index[key] = index.get(key, False) or int(row[0]) == 1
+    return index, rows
 
-    # check if the new file is longer than the old one
-    if len(new_csv) > len(annotated_csv):
-        raise ValueError("New File is longer!")
 
-    # Check if the name and email parts of the old file is the same as the new
-    check_new_csv = [line[1:5] for line in new_csv]
-    check_old_csv = [line[1:5] for line in annotated_csv]
+def _annotate_file(
+    index: dict[tuple[str, ...], bool],
+    annotated_rows: int,
+    file_to_annotate: str,
+    new_annotated_path: str,
+):
+    """
+    Streams file_to_annotate into new_annotated_path, looking up the annotation of every
+    row in the index of the annotated file. The output only replaces an existing file
+    once every row was checked.
+    """
+    unique = None
+    rows = 0
+    tmp = f"{new_annotated_path}.tmp"
+    try:
+        with open(file_to_annotate, "r", newline="") as infile, open(
+            tmp, "w", newline=""
+        ) as outfile:
+            reader = csv.reader(infile, delimiter=",")
+            writer = csv.writer(outfile, delimiter=",", quotechar='"')
+            writer.writerow(next(reader))
+            for row in reader:
+                rows += 1
+                # Check if the name and email parts of the new row are in the old file
+                tp = index.get(tuple(row[1:5]))
+                if tp is None:
+                    unique = unique or row[1:5]
+                    continue
+                # If the row is otherwise the same except for true positive, use the
+                # annotation of the already annotated file
+                if tp:
+                    row[0] = 1
+                writer.writerow(row)
 
-    for line in check_new_csv:
-        if line not in check_old_csv:
-            print(line)
+        # check if the new file is longer than the old one
+        if rows > annotated_rows:
+            raise ValueError("New File is longer!")
+        if unique is not None:
+            print(unique)
             raise ValueError("New File contains unique data!")
+        os.replace(tmp, new_annotated_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
 
-    # If the row is otherwise the same except for true positive, use the same row from the already annotated file, and mark it true positive
-    for row in annotated_csv:
-        for i in range(len(new_csv)):
-            if new_csv[i][1:5] == row[1:5] and int(row[0]) == 1:
-                # this row of the new file is TP
-                new_csv[i][0] = 1
+
+def annotate(annotated_file: str, file_to_annotate: str, annotated_dir: str):
+    """
+    Copies the annotations from the original file to a new one.
+    Requires the new file to be smaller than the original, and the process with which
+    the new file was produced HAS TO BE REDUCTIVE compared to the old one.
+    Creates a directory named annotated if it doesn't exist, where the resulting csv file will be written.
+
+    Rows are matched on (name_1, email_1, name_2, email_2) through an index of the
+    original file, and the new file is streamed row by row, so the cost is linear in
+    the size of both files.
+    """
+    index, annotated_rows = annotation_index(annotated_file)
 
     if not os.path.exists(annotated_dir):
         os.makedirs(annotated_dir)
@@ -52,24 +90,60 @@ def annotate(annotated_file: str, file_to_annotate: str, annotated_dir: str):
     new_annotated_path = os.path.join(
         f"{annotated_dir}/{file_to_annotate.split('/')[1].split('.csv')[0]}_ANNOTATED.csv"
     )
+    _annotate_file(index, annotated_rows, file_to_annotate, new_annotated_path)
+
+
+def annotate_dir(
+    annotated_file: str, threshold_dir: str, annotated_dir: str
+) -> dict[str, str]:
+    """
+    Copies the annotations from the original file to every threshold file of a folder,
+    reading the original file only once (see annotate()).
+
+    The files with a "true_pos" column, other than the original file, are annotated
+    into "{annotated_dir}/{file}_ANNOTATED.csv". A file failing the checks of annotate()
+    is reported and skipped.
+
+    Args
+    -------
+    annotated_file : str
+        The original annotated file, the largest one.
+    threshold_dir : str
+        Folder of the threshold files to annotate, e.g. "three.js-data".
+    annotated_dir : str
+        Folder the annotated files are written to, created if missing.
+
+    Returns
+    -------
+    dict[str, str]
+        Path of the annotated copy of every file annotated.
+    """
+    index, annotated_rows = annotation_index(annotated_file)
+
+    if not os.path.exists(annotated_dir):
+        os.makedirs(annotated_dir)
 
-    # Expects no c4 -c7
-    with open(new_annotated_path, "w", newline="") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quotechar='"')
-        writer.writerow(
-            [
-                "true_pos",
-                "name_1",
-                "email_1",
-                "name_2",
-                "email_2",
-                "c1",
-                "c2",
-                "c3.1",
-                "c3.2",
-            ]
+    annotated = {}
+    for file in sorted(os.listdir(threshold_dir)):
+        path = os.path.join(threshold_dir, file)
+        if not file.endswith(".csv") or os.path.samefile(path, annotated_file):
+            continue
+        with open(path, "r", newline="") as csvfile:
+            headers = next(csv.reader(csvfile), [])
+        # Filter out files without annotation column, e.g. devs.csv
+        if headers[:1] != ["true_pos"]:
+            continue
+        new_annotated_path = os.path.join(
+            annotated_dir, f"{file.split('.csv')[0]}_ANNOTATED.csv"
         )
-        writer.writerows(new_csv)
+        try:
+            _annotate_file(index, annotated_rows, path, new_annotated_path)
+        except ValueError as error:
+            print(f"Skipped {path}: {error}")
+            continue
+        annotated[path] = new_annotated_path
+    print(f"Annotated files: {len(annotated)}")
+    return annotated
 
 
 def main():
@@ -80,6 +154,8 @@ def main():
     # Directory to put annotated files in
     annotated_dir = "annotated"
     annotate(annotated_file, file_to_annotate, annotated_dir)
+    # To annotate all the threshold files of a data folder at once, use instead
+    # annotate_dir(annotated_file, "three.js-data", annotated_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+from collections.abc import Iterable, Mapping
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from evaluators.columns import BASE_COLUMNS
+from evaluators.output import read_pairs
+
+
+def condition_scores(
+    df: pd.DataFrame | Mapping[str, np.ndarray],
+) -> dict[str, np.ndarray]:
+    """
+    Score of every condition of an evaluator output, the highest threshold at which the
+    condition is True for each pair (see the pass scores of the evaluators):
+    "c1", "c2", "c3" (min of c3.1 and c3.2, or c3 of the Jaro-Winkler evaluator), and
+    "c4" of the Jaro-Winkler evaluator or "c4-c7" of the default one, infinite for the
+    pairs meeting it. df may also be typed columns, e.g. of tools.rethreshold.
+    """
+    scores = {}
+    for col in ("c1", "c2"):
+        if col in df:
+            scores[col] = np.asarray(df[col], dtype=float)
+    if "c3.1" in df:
+        scores["c3"] = np.asarray(np.minimum(df["c3.1"], df["c3.2"]), dtype=float)
+    elif "c3" in df:
+        scores["c3"] = np.asarray(df["c3"], dtype=float)
+    if "c5" in df:
+        met = np.logical_or.reduce(
+            [np.asarray(df[col], dtype=bool) for col in ("c4", "c5", "c6", "c7")]
+        )
+        scores["c4-c7"] = np.where(met, np.inf, -np.inf)
+    elif "c4" in df:
+        scores["c4"] = np.asarray(df["c4"], dtype=float)
+    return scores
+
+
+def precision_curves(
+    annotated_file: str,
+    thresholds: Iterable[float] | None = None,
+    conditions: Iterable[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Pair counts and precision of an evaluator at every threshold and for every
+    combination of its conditions, from one annotated threshold file.
+
+    A pair passes a combination at threshold t if one of its conditions holds, i.e. if
+    the highest of their scores is >= t. For every combination, the pairs are sorted
+    once by that score, and the counts of all thresholds are read from the cumulative
+    true positives with a binary search.
+
+    The file only holds the pairs passing its own threshold, with all the conditions of
+    its evaluator, so the counts are exact for thresholds at or above it only, e.g. from
+    0.8 for "devs_similarity_no_c4c7_t=0.8_ANNOTATED.csv".
+
+    Args
+    -------
+    annotated_file : str
+        Annotated threshold file with true_pos and score columns, csv or parquet.
+    thresholds : Iterable[float] | None
+        Thresholds to evaluate. Every 0.01 from the lowest score of the file up to 1.0 if
+        not given.
+    conditions : Iterable[str] | None
+        Conditions to combine, see condition_scores(). All conditions of the file if not
+        given.
+
+    Returns
+    -------
+    pd.DataFrame
+        "conditions" (e.g. "c1+c3"), "threshold", "pairs", "tp", "fp" and "precision"
+        (NaN without pairs), for every combination and threshold.
+    """
+    # Names and emails are not needed
+    df = read_pairs(annotated_file, lambda col: col not in BASE_COLUMNS)
+    true_pos = df["true_pos"].to_numpy() == 1
+    scores = condition_scores(df)
+    if conditions is not None:
+        scores = {name: scores[name] for name in conditions}
+    if thresholds is None:
+        low = np.floor(np.min(np.maximum.reduce(list(scores.values()))) * 100) / 100
+        thresholds = np.arange(max(low, 0.0), 1.0 + 1e-9, 0.01).round(2)
+    thresholds = np.asarray(list(thresholds), dtype=float)
+
+    frames = []
+    for k in range(1, len(scores) + 1):
+        for combination in combinations(scores, k):
+            pass_score = np.maximum.reduce([scores[name] for name in combination])
+            order = np.argsort(pass_score, kind="stable")
+            sorted_scores = pass_score[order]
+            # True positives among the pairs from each position of the sort on
+            tp_from = np.concatenate([np.cumsum(true_pos[order][::-1])[::-1], [0]])
+            start = np.searchsorted(sorted_scores, thresholds, side="left")
+            pairs = len(pass_score) - start
+            tp = tp_from[start]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                precision = tp / pairs
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "conditions": "+".join(combination),
+                        "threshold": thresholds,
+                        "pairs": pairs,
+                        "tp": tp,
+                        "fp": pairs - tp,
+                        "precision": precision,
+                    }
+                )
+            )
+    return pd.concat(frames, ignore_index=True)
+
+
+def best_thresholds(curves: pd.DataFrame, min_precision: float) -> pd.DataFrame:
+    """
+    For every combination of conditions, the threshold of precision_curves() keeping
+    the most true positives with a precision of at least min_precision, the lowest such
+    threshold on ties. Combinations never reaching min_precision are left out.
+    """
+    kept = curves[curves["precision"] >= min_precision]
+    best = kept.sort_values(["tp", "threshold"], ascending=[False, True], kind="stable")
+    return (
+        best.drop_duplicates("conditions")
+        .sort_values(["tp", "precision"], ascending=False, kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def main():
+    # Annotated file of the lowest threshold
+    annotated_file = (
+        "annotated-three.js/devs_similarity_no_c4c7_t=0.9_ANNOTATED_MAIN.csv"
+    )
+    # Lowest acceptable precision, TP/(TP+FP)
+    min_precision = 0.85
+    curves = precision_curves(annotated_file)
+    print(best_thresholds(curves, min_precision).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,321 @@
+import hashlib
 import unicodedata
 import string
 import os
 import csv
-from pydriller import Repository
+import shutil
+import subprocess
+import tempfile
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from git import GitCommandError, Repo
+from pydriller import Git
+from tools.profiling import profiled, stage
 
+# File in the data folder holding the hash of the last mined commit
+LAST_COMMIT_FILE = "last_commit.txt"
+# File in the data folder mapping the aliases resolved by the .mailmap to their identity
+MAILMAP_FILE = "mailmap.csv"
+# Folder of the mirrors of remote repositories, see update_mirror()
+CLONE_CACHE = "repo-cache"
+# Generic email prefixes of main.py, shared with tools.rethreshold so that the score
+# maps are found under the same settings
+GENERIC_PREFIXES = {
+    "mail",
+    "github",
+    "git",
+    "info",
+    "hello",
+    "me",
+    "contact",
+    "dev",
+    "support",
+    "admin",
+}
+# git log format of the encoding, author and committer of a commit
+IDENTITY_FORMAT = "%e%x00%an%x00%ae%x00%cn%x00%ce%x00"
 
-def get_repository(repo_uri: str) -> tuple[list[list[str]], str]:
+
+def mirror_path(repo_uri: str, cache_dir: str) -> str:
+    """
+    Mirror of a remote repository in the clone cache, "{repo_name}-{hash}.git". The hash
+    of the URI keeps apart repositories with the same name.
+    """
+    name = os.path.basename(repo_uri.rstrip("/" + os.sep)).split(".git")[0]
+    digest = hashlib.sha1(repo_uri.encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{name}-{digest}.git")
+
+
+def update_mirror(repo_uri: str, cache_dir: str) -> str:
+    """
+    Clones a remote repository into a bare mirror in cache_dir, or, if it is already
+    there, fetches only what changed since. An existing mirror is used as it is when the
+    remote cannot be reached, e.g. offline.
+
+    Returns
+    -------
+    str
+        Path of the mirror.
+    """
+    path = mirror_path(repo_uri, cache_dir)
+    if os.path.isdir(path):
+        try:
+            Repo(path).git.remote("update", "--prune")
+        except GitCommandError as error:
+            print(f"Could not update mirror of {repo_uri}, using cached copy: {error}")
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Clone next to the mirror and move it in place once complete, an interrupted clone
+    # must not be taken as a mirror on the next run
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+        clone = os.path.join(tmp, "repo.git")
+        Repo.clone_from(repo_uri, clone, mirror=True)
+        os.replace(clone, path)
+    return path
+
+
+@contextmanager
+def local_repository(repo_uri: str, cache_dir: str | None = None) -> Iterator[str]:
+    """
+    Path of a local copy of the repository: repo_uri itself if it is a local folder
+    (bare or not), otherwise its mirror in cache_dir (see update_mirror()), or, without
+    cache_dir, a temporary bare clone, removed on exit. Only commits are read, so no
+    working tree is checked out.
+    """
+    if os.path.isdir(repo_uri):
+        yield repo_uri
+        return
+    if cache_dir is not None:
+        yield update_mirror(repo_uri, cache_dir)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "repo.git")
+        Repo.clone_from(repo_uri, path, bare=True)
+        yield path
+
+
+def _raw_identity(field: bytes, encoding: bytes) -> bytes:
+    """
+    Bytes of a name or email as stored in a commit. git log converts them from the
+    encoding of the commit to UTF-8.
+    """
+    if encoding.lower() in (b"", b"utf-8", b"utf8"):
+        return field
+    try:
+        return field.decode("utf-8").encode(encoding.decode())
+    except (LookupError, UnicodeError):
+        # git could not convert them either
+        return field
+
+
+def log_identities(path: str, rev: str = "HEAD") -> set[tuple[str, str]]:
+    """
+    Reads the author and committer of every commit in rev straight from git log, without
+    building a commit object per commit. Gives the same names and emails as PyDriller.
+
+    Args
+    -------
+    path : str
+        Path of a local clone.
+    rev : str
+        Commits to read, e.g. "HEAD" or "{hash}..HEAD".
+
+    Returns
+    -------
+    set[tuple[str, str]]
+        The (name, email) of the developers.
+    """
+    devs = set()
+    # Every field ends with a NUL and every commit with a newline, so that names or
+    # emails with unusual characters cannot shift the fields
+    log = subprocess.Popen(
+        ["git", "-C", path, "log", f"--format={IDENTITY_FORMAT}", rev, "--"],
+        stdout=subprocess.PIPE,
+    )
+    fields = []
+    rest = b""
+    while chunk := log.stdout.read(1 << 20):
+        tokens = (rest + chunk).split(b"\0")
+        rest = tokens.pop()
+        fields.extend(tokens)
+        # Five fields per commit: encoding, author name and email, committer name and
+        # email
+        end = len(fields) - len(fields) % 5
+        for k in range(0, end, 5):
+            # Drop the newline ending the previous commit
+            encoding = fields[k].lstrip(b"\n")
+            if encoding:
+                names = [_raw_identity(f, encoding) for f in fields[k + 1 : k + 5]]
+            else:
+                names = fields[k + 1 : k + 5]
+            devs.add((names[0], names[1]))
+            devs.add((names[2], names[3]))
+        del fields[:end]
+    if log.wait() != 0:
+        raise RuntimeError(f"git log failed in {path}")
+    # PyDriller (GitPython) decodes identities as UTF-8, whatever the commit encoding
+    return {
+        (n.decode("utf-8", "replace"), e.decode("utf-8", "replace")) for n, e in devs
+    }
+
+
+def mine_devs(
+    repo_uri: str,
+    since: str | None = None,
+    fast: bool = False,
+    cache_dir: str | None = None,
+) -> tuple[set[tuple[str, str]], str | None]:
+    """
+    Collects the authors and committers of the commits of a repository.
+
+    With since, only the commits reachable from HEAD but not from that commit are walked,
+    i.e. the commits added since it was mined, including those of branches merged
+    afterwards. All commits are walked if since is no longer part of the history.
+
+    Args
+    -------
+    repo_uri : str
+        The Git repository URI or local path.
+    since : str | None
+        Hash of the last mined commit.
+    fast : bool
+        Read the identities straight from git log (see log_identities()) instead of
+        walking the commits with PyDriller, much faster on large histories. Both give
+        the same developers.
+    cache_dir : str | None
+        Folder of the mirrors of remote repositories, e.g. CLONE_CACHE, kept and updated
+        between runs (see update_mirror()). A remote is cloned into a temporary folder
+        if None.
+
+    Returns
+    -------
+    tuple[set[tuple[str, str]], str | None]
+        The (name, email) of the developers, and the hash of HEAD (since for an empty
+        repository).
+    """
+    devs = set()
+    with local_repository(repo_uri, cache_dir) as path:
+        repo = Repo(path)
+        try:
+            head = repo.head.commit.hexsha
+        except ValueError:
+            # No commits yet
+            return devs, since
+
+        rev = "HEAD"
+        if since is not None:
+            if repo.is_valid_object(since, "commit"):
+                rev = f"{since}..HEAD"
+            else:
+                print(f"Last mined commit {since} not found, mining all commits")
+        repo.close()
+
+        if fast:
+            return log_identities(path, rev), head
+
+        git = Git(path)
+        for commit in git.get_list_commits(rev):
+            devs.add((commit.author.name, commit.author.email))
+            devs.add((commit.committer.name, commit.committer.email))
+        git.clear()
+    return devs, head
+
+
+def parse_mailmap(
+    text: str,
+) -> dict[tuple[str | None, str], tuple[str | None, str | None]]:
+    """
+    Reads the entries of a .mailmap file, as git does:
+
+        Proper Name <commit@email>
+        <proper@email> <commit@email>
+        Proper Name <proper@email> <commit@email>
+        Proper Name <proper@email> Commit Name <commit@email>
+
+    Returns
+    -------
+    dict[tuple[str | None, str], tuple[str | None, str | None]]
+        (commit name, commit email) -> (proper name, proper email), in lower case for the
+        keys, with None for a commit name matching any name or a part left unchanged.
+    """
+    mailmap = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        parts = []
+        rest = line
+        # Up to two "name <email>" parts, anything after them is ignored
+        while len(parts) < 2 and "<" in rest and ">" in rest.split("<", 1)[1]:
+            name, rest = rest.split("<", 1)
+            email, rest = rest.split(">", 1)
+            parts.append((name.strip() or None, email.strip()))
+        if not parts:
+            continue
+        (proper_name, proper_email), (name, email) = parts[0], parts[-1]
+        if len(parts) == 1:
+            # Only the name is mapped
+            proper_email = None
+        key = (name.lower() if name and len(parts) == 2 else None, email.lower())
+        if key[0] is None and key in mailmap:
+            # Entries for an email only fill in each other
+            old_name, old_email = mailmap[key]
+            proper_name, proper_email = (
+                proper_name or old_name,
+                proper_email or old_email,
+            )
+        mailmap[key] = (proper_name, proper_email)
+    return mailmap
+
+
+def apply_mailmap(
+    mailmap: dict[tuple[str | None, str], tuple[str | None, str | None]],
+    name: str,
+    email: str,
+) -> tuple[str, str]:
+    """
+    Canonical (name, email) of an identity, see parse_mailmap(). Entries with the commit
+    name take precedence over those with the email only, and names and emails match
+    regardless of case.
+    """
+    entry = mailmap.get((name.lower(), email.lower())) or mailmap.get(
+        (None, email.lower())
+    )
+    if entry is None:
+        return name, email
+    return entry[0] or name, entry[1] or email
+
+
+def read_mailmap(
+    path: str, rev: str = "HEAD"
+) -> dict[tuple[str | None, str], tuple[str | None, str | None]]:
+    """
+    Entries of the .mailmap committed in rev of a local clone, none if it has no
+    .mailmap (see parse_mailmap()).
+    """
+    try:
+        text = Repo(path).git.show(f"{rev}:.mailmap")
+    except GitCommandError:
+        return {}
+    return parse_mailmap(text)
+
+
+def data_folder_name(repo_uri: str) -> str:
+    """
+    Data folder of a repository, "{repo_name}-data", from its URI or local path.
+    """
+    name = os.path.basename(repo_uri.rstrip("/" + os.sep))
+    return name.split(".git")[0] + "-data"
+
+
+@profiled("get_repository")
+def get_repository(
+    repo_uri: str,
+    update: bool = False,
+    fast: bool = False,
+    cache_dir: str | None = None,
+    mailmap: bool = False,
+) -> tuple[list[list[str]], str]:
     """
     Locate a repository from its URI, collect its contributors, and ensure a data folder with
     a CSV of developers exists for that repository.
@@ -13,14 +323,30 @@ def get_repository(repo_uri: str) -> tuple[list[list[str]], str]:
     The function derives a repository base name from the provided URI, ensures a directory
     named "{repo_name}-data" exists (creating it if necessary), and writes a "devs.csv"
     file containing the unique developers (name and email) discovered by traversing commits
-    via pydriller. If the data folder already exists the function will read the existing
-    "devs.csv" instead of recreating it.
+    from git history. The hash of the last mined commit is saved next to it in
+    "last_commit.txt". If the data folder already exists the function will read the
+    existing "devs.csv" instead of recreating it, or, with update, mine only the commits
+    added since the last mined commit and merge their developers into "devs.csv".
+
+    With mailmap, the aliases listed in the .mailmap of the repository are collapsed into
+    their canonical identity before they reach "devs.csv", and every alias is written
+    with its identity to "mailmap.csv" next to it.
 
     Parameters
     ----------
     repo_uri : str
-        The Git repository URI (e.g. "https://github.com/user/repo.git"). The repository
-        base name is extracted from the URI and used to form the data folder name.
+        The Git repository URI (e.g. "https://github.com/user/repo.git") or local path.
+        The repository base name is extracted from it and used to form the data folder
+        name.
+    update : bool
+        Mine the new commits of an existing data folder.
+    fast : bool
+        Read the developers straight from git log instead of walking the commits with
+        PyDriller, see mine_devs(). The "devs.csv" is the same.
+    cache_dir : str | None
+        Folder of the mirrors of remote repositories, see mine_devs().
+    mailmap : bool
+        Resolve the aliases of the .mailmap committed in the repository.
 
     Returns
     -------
@@ -29,25 +355,74 @@ def get_repository(repo_uri: str) -> tuple[list[list[str]], str]:
         - The first element is a list of developer rows read from "devs.csv".
         - The second element is the repository base name used for the data folder.
     """
-    uri_tokens = repo_uri.split(sep="/")
-    data_folder = uri_tokens[4].split(".git")[0] + "-data"
+    data_folder = data_folder_name(repo_uri)
     devs_csv = os.path.join(f"{data_folder}", "devs.csv")
+    last_commit_file = os.path.join(data_folder, LAST_COMMIT_FILE)
+    mailmap_csv = os.path.join(data_folder, MAILMAP_FILE)
 
+    def mine(since=None):
+        # Mines and reads the .mailmap from the same local copy of the repository
+        with ExitStack() as stack:
+            with stage("clone"):
+                path = stack.enter_context(local_repository(repo_uri, cache_dir))
+            with stage("mine") as stats:
+                devs, head = mine_devs(path, since, fast)
+                stats["devs"] = len(devs)
+            return devs, head, read_mailmap(path) if mailmap else {}
+
+    old = None
     try:
         os.mkdir(f"{data_folder}")
-        DEVS = set()
-        for commit in Repository(repo_uri).traverse_commits():
-            DEVS.add((commit.author.name, commit.author.email))
-            DEVS.add((commit.committer.name, commit.committer.email))
+        try:
+            DEVS, head, entries = mine()
+        except Exception:
+            # Do not leave an empty data folder to be taken as mined on the next run
+            shutil.rmtree(data_folder)
+            raise
+        mined = True
+    except FileExistsError:
+        print(f"Using existing data folder: {data_folder}")
+        mined = update
+        if update:
+            since = None
+            if os.path.isfile(last_commit_file):
+                with open(last_commit_file, "r") as file:
+                    since = file.read().strip()
+            DEVS, head, entries = mine(since)
+            # Aliases resolved before are resolved again, the .mailmap may have changed
+            if mailmap and os.path.isfile(mailmap_csv):
+                with open(mailmap_csv, "r", newline="") as csvfile:
+                    DEVS.update(tuple(row[:2]) for row in list(csv.reader(csvfile))[1:])
+            # Merge with the developers mined before
+            if os.path.isfile(devs_csv):
+                with open(devs_csv, "r", newline="") as csvfile:
+                    old = [tuple(row) for row in csv.reader(csvfile)][1:]
+                DEVS.update(old)
 
+    if mined:
+        if mailmap:
+            aliases = {}
+            for dev in DEVS:
+                canonical = apply_mailmap(entries, *dev)
+                if canonical != dev:
+                    aliases[dev] = canonical
+            DEVS = {aliases.get(dev, dev) for dev in DEVS}
+            print(f"Mailmap: {len(aliases)} aliases resolved")
+            with open(mailmap_csv, "w", newline="") as csvfile:
+                writer = csv.writer(csvfile, delimiter=",", quotechar='"')
+                writer.writerow(["name", "email", "canonical_name", "canonical_email"])
+                writer.writerows(alias + aliases[alias] for alias in sorted(aliases))
+        if old is not None:
+            print(f"New developers: {len(DEVS.difference(old))}")
         DEVS = sorted(DEVS)
 
         with open(devs_csv, "w", newline="") as csvfile:
             writer = csv.writer(csvfile, delimiter=",", quotechar='"')
             writer.writerow(["name", "email"])
             writer.writerows(DEVS)
-    except FileExistsError:
-        print(f"Using existing data folder: {data_folder}")
+        if head is not None:
+            with open(last_commit_file, "w") as file:
+                file.write(head + "\n")
 
     # This block of code reads an existing csv of developers
     DEVS = []
@@ -126,6 +501,49 @@ def process(dev: list[str]) -> tuple[str, str, str, str, str, str, str]:
     return name, first, last, i_first, i_last, email, prefix
 
 
+@profiled("process_devs")
+def process_devs(devs: list[list[str]]) -> list[tuple[str, ...]]:
+    """
+    Normalizes every developer once so the evaluators can reuse the result in their pair loops.
+
+    Each row holds the seven values returned by process() followed by the composite keys
+    used by the Jaro-Winkler evaluator. A composite key is empty when one of its parts is
+    missing.
+
+    Args
+    -------
+    devs : list[list[str]]
+        Full list of devs from devs.csv
+
+    Returns
+    -------
+    list[tuple[str, ...]]
+        One row per developer, in the same order as devs:
+            - name, first, last, i_first, i_last, email, prefix: see process()
+            - i_first_last: First name initial + last name
+            - i_last_first: Last name initial + first name
+    """
+    table = []
+    for dev in devs:
+        name, first, last, i_first, i_last, email, prefix = process(dev)
+        i_first_last = "".join((i_first, last)) if i_first != "" and last != "" else ""
+        i_last_first = "".join((i_last, first)) if i_last != "" and first != "" else ""
+        table.append(
+            (
+                name,
+                first,
+                last,
+                i_first,
+                i_last,
+                email,
+                prefix,
+                i_first_last,
+                i_last_first,
+            )
+        )
+    return table
+
+
 def most_common_prefixes(devs: list[list[str]], number: int):
     """
     Finds the most common email prefixes and prints the specified number of them.
@@ -0,0 +1,208 @@
+import csv
+import os
+import sqlite3
+import unicodedata
+from collections.abc import Iterator
+from itertools import islice
+
+# Label database, next to the data folders
+LABELS_DB = "labels.sqlite"
+# Rows of a csv file inserted or looked up at a time
+BATCH_SIZE = 10_000
+
+
+def pair_key(name_1: str, email_1: str, name_2: str, email_2: str) -> tuple[str, ...]:
+    """
+    Key of a developer pair in the label database: the names and emails in Unicode NFC
+    with outer spaces stripped, emails in lower case, and the two developers in sorted
+    order, so that a pair has the same key in whichever order an evaluator wrote it.
+    """
+    dev_1 = (
+        unicodedata.normalize("NFC", name_1.strip()),
+        unicodedata.normalize("NFC", email_1.strip().lower()),
+    )
+    dev_2 = (
+        unicodedata.normalize("NFC", name_2.strip()),
+        unicodedata.normalize("NFC", email_2.strip().lower()),
+    )
+    return min(dev_1, dev_2) + max(dev_1, dev_2)
+
+
+def open_labels(path: str = LABELS_DB) -> sqlite3.Connection:
+    """
+    Opens the label database, creating it if missing. Labels are keyed by pair_key(),
+    the primary key is the index of the lookups.
+    """
+    connection = sqlite3.connect(path)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS labels (
+            name_1 TEXT NOT NULL,
+            email_1 TEXT NOT NULL,
+            name_2 TEXT NOT NULL,
+            email_2 TEXT NOT NULL,
+            true_pos INTEGER NOT NULL,
+            source TEXT,
+            PRIMARY KEY (name_1, email_1, name_2, email_2)
+        ) WITHOUT ROWID
+        """
+    )
+    return connection
+
+
+def _annotated_files(paths: list[str]) -> Iterator[str]:
+    """
+    csv files of the given files and folders, in order.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for file in sorted(os.listdir(path)):
+                if file.endswith(".csv"):
+                    yield os.path.join(path, file)
+        else:
+            yield path
+
+
+def _batches(reader, size: int) -> Iterator[list[list[str]]]:
+    while batch := list(islice(reader, size)):
+        yield batch
+
+
+def import_labels(connection: sqlite3.Connection, paths: list[str]) -> int:
+    """
+    Bulk imports the true_pos labels of annotated csv files, e.g. the annotated-* folders.
+
+    A pair labelled in several files is a true positive if any of them says so, as in
+    tools.combine_same_rows.annotate(). Files without a "true_pos" column are skipped.
+
+    Args
+    -------
+    connection : sqlite3.Connection
+        Label database from open_labels().
+    paths : list[str]
+        Annotated csv files, or folders of them.
+
+    Returns
+    -------
+    int
+        Number of labelled pairs in the database.
+    """
+    with connection:
+        for path in _annotated_files(paths):
+            with open(path, "r", newline="") as csvfile:
+                reader = csv.reader(csvfile, delimiter=",")
+                headers = next(reader, [])
+                # Filter out non-annotated
+                if headers[:1] != ["true_pos"]:
+                    print(f"Skipped {path}: no true_pos column")
+                    continue
+                for batch in _batches(reader, BATCH_SIZE):
+                    connection.executemany(
+                        """
+                        INSERT INTO labels VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (name_1, email_1, name_2, email_2) DO UPDATE
+                        SET source = CASE WHEN excluded.true_pos > true_pos
+                                THEN excluded.source ELSE source END,
+                            true_pos = max(true_pos, excluded.true_pos)
+                        """,
+                        ((*pair_key(*row[1:5]), int(row[0]), path) for row in batch),
+                    )
+    (count,) = connection.execute("SELECT count(*) FROM labels").fetchone()
+    print(f"Labelled pairs: {count}")
+    return count
+
+
+def _lookup(
+    connection: sqlite3.Connection, keys: list[tuple[str, ...]]
+) -> dict[tuple[str, ...], int]:
+    """
+    Labels of the keys found in the database, looked up in one query: the keys are put
+    in a temporary table joined with the labels on their primary key.
+    """
+    with connection:
+        connection.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS lookup (
+                name_1 TEXT NOT NULL,
+                email_1 TEXT NOT NULL,
+                name_2 TEXT NOT NULL,
+                email_2 TEXT NOT NULL,
+                PRIMARY KEY (name_1, email_1, name_2, email_2)
+            ) WITHOUT ROWID
+            """
+        )
+        connection.executemany("INSERT OR IGNORE INTO lookup VALUES (?, ?, ?, ?)", keys)
+        rows = connection.execute(
+            """
+            SELECT name_1, email_1, name_2, email_2, labels.true_pos
+            FROM lookup JOIN labels USING (name_1, email_1, name_2, email_2)
+            """
+        ).fetchall()
+        connection.execute("DELETE FROM lookup")
+    return {tuple(row[:4]): row[4] for row in rows}
+
+
+def label_file(
+    connection: sqlite3.Connection, pair_file: str, output_file: str
+) -> tuple[int, int, int]:
+    """
+    Labels the pairs of an evaluator output from the database, whether or not they come
+    from the files the labels were imported from.
+
+    The true_pos column is filled in for every pair found in the database and set to 0
+    for the others. A file without true_pos column, e.g. an all-pairs file, gets one.
+
+    Args
+    -------
+    connection : sqlite3.Connection
+        Label database from open_labels().
+    pair_file : str
+        csv file with "name_1", "email_1", "name_2" and "email_2" columns.
+    output_file : str
+        Labelled copy of pair_file.
+
+    Returns
+    -------
+    tuple[int, int, int]
+        Number of pairs, of pairs found in the database, and of true positives.
+    """
+    pairs = found = tp = 0
+    with open(pair_file, "r", newline="") as infile, open(
+        output_file, "w", newline=""
+    ) as outfile:
+        reader = csv.reader(infile, delimiter=",")
+        writer = csv.writer(outfile, delimiter=",", quotechar='"')
+        headers = next(reader)
+        annotated = headers[:1] == ["true_pos"]
+        if not annotated:
+            headers = ["true_pos"] + headers
+        writer.writerow(headers)
+        for batch in _batches(reader, BATCH_SIZE):
+            if not annotated:
+                batch = [["0"] + row for row in batch]
+            keys = [pair_key(*row[1:5]) for row in batch]
+            labels = _lookup(connection, keys)
+            for row, key in zip(batch, keys):
+                label = labels.get(key)
+                row[0] = label or 0
+                found += label is not None
+                tp += label == 1
+            pairs += len(batch)
+            writer.writerows(batch)
+    print(f"{pair_file}: pairs: {pairs}, labelled: {found}, TP: {tp}")
+    return pairs, found, tp
+
+
+def main():
+    # Folders of annotated files to import
+    annotated_dirs = ["annotated-three.js", "annotated-gitignore"]
+    # Evaluator output to label, and its labelled copy
+    pair_file = "three.js-data/devs_similarity_no_c4c7_improved_t=0.9.csv"
+    output_file = "three.js-data/devs_similarity_no_c4c7_improved_t=0.9_LABELLED.csv"
+    with open_labels() as connection:
+        import_labels(connection, annotated_dirs)
+        label_file(connection, pair_file, output_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import contextlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tools.helpers import data_folder_name, get_repository
+
+
+def _mine(
+    repo_uri: str, update: bool, fast: bool, cache_dir: str | None, mailmap: bool
+) -> dict:
+    """
+    Mines one repository in a worker process. Errors are returned rather than raised,
+    so that they do not stop the other repositories.
+    """
+    start = time.perf_counter()
+    result = {"repo": repo_uri, "data_folder": data_folder_name(repo_uri)}
+    try:
+        # Keep the output of parallel runs from interleaving
+        with contextlib.redirect_stdout(io.StringIO()):
+            devs, data_folder = get_repository(
+                repo_uri, update, fast, cache_dir, mailmap
+            )
+        result.update(status="ok", devs=devs, data_folder=data_folder)
+    except Exception as error:
+        result.update(status=f"failed: {type(error).__name__}: {error}", devs=None)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def mine_repositories(
+    repo_uris: list[str],
+    workers: int = 4,
+    update: bool = False,
+    fast: bool = False,
+    cache_dir: str | None = None,
+    mailmap: bool = False,
+) -> dict[str, tuple[list[list[str]], str]]:
+    """
+    Mines many repositories concurrently in a pool of processes, each into its own
+    "{repo_name}-data/devs.csv" (see get_repository()), and prints the status, time and
+    number of developers of every repository.
+
+    A repository that fails is reported in the summary and does not stop the others.
+    Repeated URIs are mined once.
+
+    Args
+    -------
+    repo_uris : list[str]
+        Git repository URIs or local paths.
+    workers : int
+        Number of repositories mined at the same time.
+    update : bool
+        Mine the new commits of existing data folders, see get_repository().
+    fast : bool
+        Read the developers straight from git log, see get_repository().
+    cache_dir : str | None
+        Folder of the mirrors of remote repositories, see get_repository().
+    mailmap : bool
+        Resolve the aliases of the .mailmap of every repository, see get_repository().
+
+    Returns
+    -------
+    dict[str, tuple[list[list[str]], str]]
+        Developers and data folder of every repository mined successfully.
+    """
+    # A repository given twice is mined once, in the order it first appears
+    repo_uris = list(dict.fromkeys(repo_uris))
+    # Repositories sharing a data folder would overwrite each other's devs.csv
+    folders = {}
+    results = {}
+    for repo_uri in repo_uris:
+        folder = data_folder_name(repo_uri)
+        if folder in folders:
+            results[repo_uri] = {
+                "repo": repo_uri,
+                "status": f"failed: same data folder as {folders[folder]}",
+                "devs": None,
+                "seconds": 0.0,
+            }
+        else:
+            folders[folder] = repo_uri
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_mine, repo_uri, update, fast, cache_dir, mailmap): repo_uri
+            for repo_uri in folders.values()
+        }
+        for future in as_completed(futures):
+            repo_uri = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                # The worker itself died
+                result = {
+                    "repo": repo_uri,
+                    "status": f"failed: {type(error).__name__}: {error}",
+                    "devs": None,
+                    "seconds": 0.0,
+                }
+            results[repo_uri] = result
+            print(f"{result['status']}: {repo_uri}")
+
+    print("\nMined repositories")
+    print(f"{'Time':>9}  {'Devs':>6}  Status  Repository")
+    for repo_uri in repo_uris:
+        result = results[repo_uri]
+        devs = len(result["devs"]) if result["devs"] is not None else "-"
+        status = "ok" if result["status"] == "ok" else "failed"
+        print(f"{result['seconds']:8.2f}s  {devs:>6}  {status:<6}  {repo_uri}")
+    failed = [r for r in results.values() if r["status"] != "ok"]
+    print(f"Repositories: {len(repo_uris)}, failed: {len(failed)}")
+    for result in failed:
+        print(f"{result['repo']}: {result['status']}")
+
+    return {
+        repo_uri: (result["devs"], result["data_folder"])
+        for repo_uri, result in results.items()
+        if result["status"] == "ok"
+    }
@@ -0,0 +1,194 @@
+import functools
+import json
+import platform
+import time
+import tracemalloc
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Stages of the profiled run, None when profiling is off
+_RUN = None
+
+
+def max_rss_mb() -> float | None:
+    """
+    Peak resident memory of the process so far in MB, None where it cannot be read.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2**20 if platform.system() == "Darwin" else peak / 2**10
+
+
+def profile_report_path(data_folder: str) -> str:
+    """
+    Report file of a run, next to the data folder and named after the time of the run,
+    so that the reports of nightly runs are kept side by side.
+    """
+    return f"{data_folder}-profile-{time.strftime('%Y%m%d-%H%M%S')}.json"
+
+
+@contextmanager
+def profile_run(report_file: str, memory: bool = False) -> Iterator[dict]:
+    """
+    Profiles the stages run inside the block (see stage()) and writes a JSON report.
+
+    Profiling is off outside of it, so stages cost nothing in normal runs.
+
+    Args
+    -------
+    report_file : str
+        JSON file of the report, e.g. from profile_report_path().
+    memory : bool
+        Also trace the peak Python memory of every stage with tracemalloc. Tracing
+        slows scoring down several times, so the times are less faithful. The peak
+        resident memory of the process is recorded either way.
+
+    Yields
+    -------
+    dict
+        The report, filled in when the block ends: "started", "seconds", "memory",
+        "max_rss_mb" and "stages". Every stage has "stage" (its path, e.g.
+        "similarity_no_c4c7/to_csv"), "calls", "seconds" (total of all calls),
+        "peak_mb" (highest traced memory during a call, None without memory),
+        "max_rss_mb" (peak resident memory of the process at its end) and its counts,
+        such as "pairs".
+    """
+    global _RUN
+    tracing = memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    _RUN = {"stages": {}, "stack": [], "memory": memory}
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "memory": memory,
+    }
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report["seconds"] = time.perf_counter() - start
+        report["max_rss_mb"] = max_rss_mb()
+        report["stages"] = [
+            {"stage": path, **entry} for path, entry in _RUN["stages"].items()
+        ]
+        _RUN = None
+        if tracing:
+            tracemalloc.stop()
+        with open(report_file, "w") as file:
+            json.dump(report, file, indent=2)
+
+        print(
+            f"{'Stage':<40} {'Calls':>6} {'Seconds':>9} {'Pairs':>11}"
+            f" {'Peak MB':>8} {'RSS MB':>8}"
+        )
+        for entry in report["stages"]:
+            peak, rss = (
+                f"{entry[key]:.1f}" if entry[key] is not None else "-"
+                for key in ("peak_mb", "max_rss_mb")
+            )
+            print(
+                f"{entry['stage']:<40} {entry['calls']:>6} {entry['seconds']:>9.3f}"
+                f" {entry.get('pairs', ''):>11} {peak:>8} {rss:>8}"
+            )
+        print(f"Profile report: {report_file}")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[dict]:
+    """
+    Records the wall time and memory of a stage of the pipeline when profiling is on
+    (see profile_run()). Stages nest, a stage entered within another is reported under
+    its path, "outer/inner". Calls of the same stage are added up.
+
+    Yields
+    -------
+    dict
+        Counts of the stage, e.g. counts["pairs"] = 100, added up over the calls.
+    """
+    if _RUN is None:
+        yield {}
+        return
+
+    stack = _RUN["stack"]
+    frame = {
+        "path": "/".join([f["path"] for f in stack[-1:]] + [name]),
+        "counts": {},
+        "peak": 0,
+    }
+    memory = _RUN["memory"] and tracemalloc.is_tracing()
+    if memory:
+        # The peak of an outer stage is kept in its frame, see below
+        if stack:
+            stack[-1]["peak"] = max(
+                stack[-1]["peak"], tracemalloc.get_traced_memory()[1]
+            )
+        tracemalloc.reset_peak()
+    stack.append(frame)
+    # Stages are reported in the order they are first entered
+    entry = _RUN["stages"].setdefault(
+        frame["path"],
+        {"calls": 0, "seconds": 0.0, "peak_mb": None, "max_rss_mb": None},
+    )
+    start = time.perf_counter()
+    try:
+        yield frame["counts"]
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        peak = None
+        if memory:
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        if peak is not None:
+            entry["peak_mb"] = max(entry["peak_mb"] or 0, peak / 2**20)
+        entry["max_rss_mb"] = max_rss_mb()
+        for key, count in frame["counts"].items():
+            entry[key] = entry.get(key, 0) + count
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorator running a whole function as a stage, see stage().
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profiled_chunks(chunks: Iterable[dict], name: str = "score") -> Iterable[dict]:
+    """
+    Records the time spent producing every chunk of scored pairs as a stage, with the
+    number of pairs. Scoring is lazy, so its time is otherwise mixed with the writing.
+    """
+    if _RUN is None:
+        return chunks
+
+    def generate():
+        iterator = iter(chunks)
+        while True:
+            with stage(name) as counts:
+                chunk = next(iterator, None)
+                if chunk is not None:
+                    counts["pairs"] = len(chunk["i"])
+            if chunk is None:
+                return
+            yield chunk
+
+    return generate()
@@ -0,0 +1,144 @@
+import os
+from collections.abc import Iterable
+
+import numpy as np
+
+from evaluators.maps import load_maps, map_chunks, maps_path, maps_settings
+from evaluators.output import print_summary, write_outputs
+from evaluators.similarity_default import default_outputs, default_pass_score
+from evaluators.similarity_jaro import jaro_outputs, jaro_pass_score
+from evaluators.similarity_no_c4c7 import no_c4c7_outputs, no_c4c7_pass_score
+from evaluators.similarity_no_c4c7_improved import improved_outputs
+from tools.curves import condition_scores
+from tools.helpers import GENERIC_PREFIXES
+from tools.profiling import profiled
+
+# Pairs read from the maps at a time
+READ_CHUNK = 1_000_000
+
+
+def _evaluator_outputs(settings: dict, thresholds: list[float]) -> tuple:
+    """
+    Outputs (see e.g. no_c4c7_outputs()) and pass score function of the evaluator of
+    score maps.
+    """
+    evaluator = settings["evaluator"]
+    if evaluator == "improved":
+        return improved_outputs(thresholds), no_c4c7_pass_score
+    outputs = {
+        "default": (default_outputs, default_pass_score),
+        "no_c4c7": (no_c4c7_outputs, no_c4c7_pass_score),
+        "jaro": (jaro_outputs, jaro_pass_score),
+    }
+    if evaluator not in outputs:
+        raise ValueError(f"Unknown evaluator: {evaluator}")
+    get_outputs, pass_score = outputs[evaluator]
+    return (
+        get_outputs(
+            settings["email_check"], set(settings["generic_prefixes"]), thresholds
+        ),
+        pass_score,
+    )
+
+
+@profiled("rethreshold")
+def rethreshold(
+    maps_folder: str,
+    thresholds: list[float],
+    data_folder: str | None = None,
+    conditions: Iterable[str] | None = None,
+    output_format: str = "csv",
+) -> tuple[int, list[int]]:
+    """
+    Writes the threshold files of an evaluator again, for other thresholds or another
+    mix of its conditions, from the score maps of an earlier run (see the score_maps
+    argument of the evaluators) instead of scoring the pairs.
+
+    The maps are memory-mapped and read READ_CHUNK pairs at a time. Only the pairs
+    passing the lowest threshold are turned into rows, so a run takes about as long as
+    reading the maps and writing the threshold files.
+
+    Args
+    -------
+    maps_folder : str
+        Score maps, e.g. maps_path("three.js-data", maps_settings("no_c4c7", True,
+        generic_prefixes)).
+    thresholds : list[float]
+        Thresholds of the new files, as for the evaluators.
+    data_folder : str | None
+        Folder the files are written to, the folder of the maps if not given.
+    conditions : Iterable[str] | None
+        Conditions a pair may pass, among those of tools.curves.condition_scores(),
+        e.g. ["c1", "c3"]. The files are then named after them, e.g.
+        "devs_similarity_no_c4c7_c1+c3_t=0.9.csv". All conditions of the evaluator if
+        not given, with the usual file names.
+    output_format : str
+        "csv" or "parquet", see evaluators.output.write_outputs().
+
+    Returns
+    -------
+    tuple[int, list[int]]
+        Number of pairs of the maps, and number of pairs written for every threshold.
+    """
+    devs, meta, maps = load_maps(maps_folder)
+    if data_folder is None:
+        data_folder = os.path.dirname(maps_folder)
+    (title, _, threshold_files), pass_score = _evaluator_outputs(
+        meta["settings"], thresholds
+    )
+
+    if conditions is not None:
+        conditions = list(conditions)
+        known = condition_scores({col: values[:0] for col, values in maps.items()})
+        for condition in conditions:
+            if condition not in known:
+                raise ValueError(f"Unknown condition: {condition}")
+        mix = "+".join(conditions)
+
+        def pass_score(columns):
+            scores = condition_scores(columns)
+            return np.maximum.reduce([scores[condition] for condition in conditions])
+
+        title = f"{title}, conditions {mix}"
+        threshold_files = [
+            (t, name.replace("_t=", f"_{mix}_t=")) for t, name in threshold_files
+        ]
+
+    low = min(thresholds, default=np.inf)
+    chunks = map_chunks(
+        maps,
+        meta["devs"],
+        lambda scores: np.flatnonzero(pass_score(scores) >= low),
+        READ_CHUNK,
+    )
+    score_types = {col: np.dtype(dtype).type for col, dtype in meta["scores"].items()}
+    _, limited = write_outputs(
+        chunks,
+        devs,
+        score_types,
+        data_folder,
+        None,
+        threshold_files,
+        pass_score,
+        stream=True,
+        output_format=output_format,
+    )
+    pairs = meta["devs"] * (meta["devs"] - 1) // 2
+    print_summary(title, pairs, thresholds, limited)
+    return pairs, limited
+
+
+def main():
+    # Settings of the evaluator of main.py run with score_maps=True
+    data_folder = "three.js-data"
+    maps_folder = maps_path(
+        data_folder, maps_settings("no_c4c7", True, GENERIC_PREFIXES)
+    )
+    # New thresholds, and optionally a mix of conditions such as ["c1", "c3"]
+    thresholds = [0.85, 0.9, 0.95]
+    conditions = None
+    rethreshold(maps_folder, thresholds, conditions=conditions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from itertools import combinations
+from math import ceil
+
+# Slack for float comparisons, keeps the bounds on the safe (inclusive) side
+EPS = 1e-9
+
+
+def _multiset(value: str) -> frozenset[tuple[str, int]]:
+    """
+    Turns a string into its character multiset, "anna" -> {a1, n1, n2, a2}, so that the
+    size of a set intersection is the number of characters two strings have in common.
+    """
+    seen = Counter()
+    tokens = []
+    for c in value:
+        seen[c] += 1
+        tokens.append((c, seen[c]))
+    return frozenset(tokens)
+
+
+def ratio_bound(set_a: frozenset, set_b: frozenset) -> float:
+    """
+    Upper bound of Levenshtein.ratio() from the character multisets of two strings.
+
+    ratio = 1 - indel / (len_a + len_b) and the indel distance is at least the number of
+    characters that do not have a partner in the other string, so
+    ratio <= 2 * common / (len_a + len_b). This also covers the length ratio bound.
+    """
+    total = len(set_a) + len(set_b)
+    if total == 0:
+        # ratio("", "") == 1
+        return 1.0
+    return 2 * len(set_a & set_b) / total
+
+
+def _field_index(values: list[str], threshold: float, skip: set[str]) -> dict:
+    """
+    Builds a prefix filtering index over one field (name, email prefix or first name) of
+    all developers. Two strings can only reach ratio >= threshold if the prefixes of their
+    character multisets, ordered from rarest to most common character, share a character.
+    Values in skip are left out of the index.
+    """
+    sets = [_multiset(v) for v in values]
+    active = [v not in skip for v in values]
+
+    freq = Counter()
+    for s, is_active in zip(sets, active):
+        if is_active:
+            freq.update(s)
+    rank = {
+        token: r for r, token in enumerate(sorted(freq, key=lambda k: (freq[k], k)))
+    }
+
+    prefixes = []
+    index = defaultdict(list)
+    # Empty strings share no characters but still have ratio 1 with each other
+    empty = []
+    for i, (s, is_active) in enumerate(zip(sets, active)):
+        if not is_active or len(s) == 0:
+            if is_active:
+                empty.append(i)
+            prefixes.append(())
+            continue
+        ordered = sorted(s, key=rank.__getitem__)
+        # Smallest overlap any partner can have with s while reaching the threshold
+        min_overlap = ceil(len(s) * threshold / (2 - threshold) - EPS)
+        prefix = ordered[: max(1, len(s) - min_overlap + 1)]
+        prefixes.append(prefix)
+        for token in prefix:
+            index[token].append(i)
+
+    return {
+        "threshold": threshold,
+        "sets": sets,
+        "active": active,
+        "prefixes": prefixes,
+        "index": index,
+        "empty": empty,
+    }
+
+
+def _probe(field: dict, i: int) -> set[int]:
+    """
+    Developers j > i whose value in the indexed field can reach the threshold with the
+    value of developer i.
+    """
+    if not field["active"][i]:
+        return set()
+    set_i = field["sets"][i]
+    if len(set_i) == 0:
+        return {j for j in field["empty"] if j > i}
+    candidates = set()
+    for token in field["prefixes"][i]:
+        candidates.update(j for j in field["index"][token] if j > i)
+    return {
+        j
+        for j in candidates
+        if ratio_bound(set_i, field["sets"][j]) >= field["threshold"] - EPS
+    }
+
+
+def _c4_c7_pairs(table: list[tuple[str, ...]]) -> dict[int, set[int]]:
+    """
+    Finds every pair where one of c4-c7 of the Bird heuristic holds, by looking up each
+    substring of an email prefix among the last and first names of the other developers.
+
+    Returns
+    -------
+    dict[int, set[int]]
+        Partners j of developer i, for i < j.
+    """
+    last_index = defaultdict(list)
+    first_index = defaultdict(list)
+    for a, (_, first, last, i_first, i_last, _, _) in enumerate(
+        norm[:7] for norm in table
+    ):
+        # c4 / c6: initial of the first name and the last name in the other prefix
+        if i_first != "" and last != "":
+            last_index[last].append(a)
+        # c5 / c7: initial of the last name and the first name in the other prefix
+        if i_last != "":
+            first_index[first].append(a)
+
+    pending = defaultdict(set)
+    for b, norm in enumerate(table):
+        prefix = norm[6]
+        substrings = {
+            prefix[s:e]
+            for s in range(len(prefix))
+            for e in range(s + 1, len(prefix) + 1)
+        }
+        for sub in substrings:
+            for a in last_index.get(sub, ()):
+                if a != b and table[a][3] in prefix:
+                    pending[min(a, b)].add(max(a, b))
+            for a in first_index.get(sub, ()):
+                if a != b and table[a][4] in prefix:
+                    pending[min(a, b)].add(max(a, b))
+    return pending
+
+
+def threshold_join_pairs(
+    table: list[tuple[str, ...]],
+    threshold: float,
+    skip_prefixes: set[str] = frozenset(),
+    c4_c7: bool = False,
+) -> Iterator[tuple[int, int]]:
+    """
+    Yields the index pairs (i, j), i < j, for which c1, c2 or c3.1 and c3.2 of the
+    Bird heuristic can reach the threshold, without computing any Levenshtein ratio.
+
+    Pairs that cannot reach the threshold are ruled out with a prefix filter and a
+    character count bound of Levenshtein.ratio(). The result is a superset of the pairs
+    passing the threshold, so the threshold files of an evaluator fed with these pairs are
+    identical to a full run. Pass the lowest threshold used. Pairs come out in the same
+    order as combinations(range(len(table)), 2). The number of kept and pruned pairs is
+    printed once the stream is exhausted.
+
+    Args
+    -------
+    table : list[tuple[str, ...]]
+        Normalized developers from process_devs()
+    threshold : float
+        Lowest threshold the evaluator will apply.
+    skip_prefixes : set[str]
+        Email prefixes for which c2 is always 0, i.e. the generic prefixes when the
+        evaluator runs with email_check. Leave empty for similarity_no_c4c7_email_improved.
+    c4_c7 : bool
+        Also yield the pairs where one of c4-c7 holds, needed for similarity_default.
+    """
+    total = len(table) * (len(table) - 1) // 2
+
+    # Every pair reaches a threshold of 0
+    if threshold <= 0:
+        yield from combinations(range(len(table)), 2)
+        print(f"Similarity join: {total} candidate pairs, pruned 0 of {total}")
+        return
+
+    names = _field_index([norm[0] for norm in table], threshold, set())
+    prefixes = _field_index([norm[6] for norm in table], threshold, skip_prefixes)
+    firsts = _field_index([norm[1] for norm in table], threshold, set())
+    last_sets = [_multiset(norm[2]) for norm in table]
+    pending = _c4_c7_pairs(table) if c4_c7 else {}
+
+    kept = 0
+    for i in range(len(table)):
+        candidates = _probe(names, i) | _probe(prefixes, i)
+        # c3 needs both the first and the last name to reach the threshold
+        candidates.update(
+            j
+            for j in _probe(firsts, i)
+            if ratio_bound(last_sets[i], last_sets[j]) >= threshold - EPS
+        )
+        candidates.update(pending.get(i, ()))
+        kept += len(candidates)
+        for j in sorted(candidates):
+            yield i, j
+
+    print(f"Similarity join: {kept} candidate pairs, pruned {total - kept} of {total}")
@@ -0,0 +1,113 @@
+import random
+import unicodedata
+
+FIRST_NAMES = [
+    "John", "Jane", "José", "María", "François", "Zoë", "Jürgen", "Søren", "Łukasz",
+    "Ana", "Mikko", "Aino", "Hiroshi", "Wei", "Priya", "Ahmed", "Olga", "Chloé",
+    "Matías", "Björn", "Ines", "Tomás", "Emma", "Liam", "Noah", "Sofia", "Amélie",
+    "Kai", "Lucía", "Mateo", "Nina", "Omar", "Paulo", "Ravi", "Sara", "Timo",
+]  # fmt: skip
+LAST_NAMES = [
+    "Smith", "García", "Müller", "Nguyen", "Rodić", "Kowalski", "Virtanen", "Tanaka",
+    "Zhang", "Patel", "Haddad", "Ivanova", "Dubois", "Paavilainen", "Jensen", "Silva",
+    "O'Brien", "van der Berg", "Núñez", "Schröder", "Rossi", "Kim", "Popescu", "Novák",
+    "Andersson", "Costa", "Fernández", "Lefèvre", "Nieminen", "Yilmaz",
+]  # fmt: skip
+DOMAINS = [
+    "gmail.com", "outlook.com", "example.com", "example.org", "yahoo.com",
+    "protonmail.com", "company.io", "univ.edu",
+]  # fmt: skip
+GENERIC_PREFIXES = ["github", "mail", "git", "info", "hello", "me", "contact", "dev"]
+
+
+def _ascii(text: str) -> str:
+    """
+    text without accents, as often typed in git configs.
+    """
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+
+def _email(rng: random.Random, first: str, last: str, generic_rate: float) -> str:
+    """
+    Email of a developer, with a generic prefix for a share generic_rate of them.
+    """
+    first, last = _ascii(first).lower(), _ascii(last).lower().replace(" ", "")
+    domain = rng.choice(DOMAINS)
+    if rng.random() < generic_rate:
+        # Generic prefix on a personal domain
+        return f"{rng.choice(GENERIC_PREFIXES)}@{first}{last}.dev"
+    style = rng.randrange(5)
+    if style == 0:
+        prefix = f"{first}.{last}"
+    elif style == 1:
+        prefix = f"{first[0]}{last}"
+    elif style == 2:
+        prefix = f"{first}{last}{rng.randrange(100)}"
+    elif style == 3:
+        prefix = f"{last}{first[0]}"
+    else:
+        return f"{rng.randrange(10**7)}+{first}{last}@users.noreply.github.com"
+    return f"{prefix}@{domain}"
+
+
+def _alias(rng: random.Random, first: str, last: str) -> str:
+    """
+    Another spelling of the name of a developer.
+    """
+    style = rng.randrange(6)
+    if style == 0:
+        return _ascii(f"{first} {last}")
+    elif style == 1:
+        return f"{first} {last}".lower()
+    elif style == 2:
+        return f"{last}, {first}"
+    elif style == 3:
+        return f"{first[0]}. {last}"
+    elif style == 4:
+        return f"{first}{last}".lower().replace(" ", "")
+    return f"{first} {rng.choice(FIRST_NAMES)} {last}"
+
+
+def synthetic_devs(
+    n: int, seed: int = 0, alias_rate: float = 0.3, generic_rate: float = 0.1
+) -> list[list[str]]:
+    """
+    Generates n distinct developers, as in devs.csv, for benchmarks and tests.
+
+    Names mix accented and plain spellings from several languages. Some emails have a
+    generic prefix such as "github" or "mail", or are GitHub noreply addresses. People
+    have several identities, alias families, with other spellings of their name and
+    other emails. The same seed always gives the same developers.
+
+    Args
+    -------
+    n : int
+        Number of developers.
+    seed : int
+        Seed of the random generator.
+    alias_rate : float
+        Chance that a person gets one more identity, repeated, so families of 2, 3 or
+        more identities get rarer.
+    generic_rate : float
+        Share of emails with a generic prefix.
+
+    Returns
+    -------
+    list[list[str]]
+        List of developer lists containing ["name", "email"], sorted as in devs.csv.
+    """
+    rng = random.Random(seed)
+    devs = set()
+    while len(devs) < n:
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        emails = [_email(rng, first, last, generic_rate)]
+        devs.add((f"{first} {last}", emails[0]))
+        while len(devs) < n and rng.random() < alias_rate:
+            # Aliases keep an email of the family about half of the time
+            if rng.random() < 0.5:
+                email = rng.choice(emails)
+            else:
+                email = _email(rng, first, last, generic_rate)
+                emails.append(email)
+            devs.add((_alias(rng, first, last), email))
+    return [list(dev) for dev in sorted(devs)]
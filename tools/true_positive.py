@@ -1,5 +1,99 @@
 import csv
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Columns of the results of tp_stats()
+STATS_COLUMNS = ["path", "file", "pairs", "tp", "fp", "tp_fp", "precision"]
+
+
+def count_tp(path: str) -> dict | None:
+    """
+    Counts the pairs and true positives of an annotated csv file in a single streaming
+    pass, reading only the true_pos value of every row.
+
+    Returns
+    -------
+    dict | None
+        "path", "file", "pairs", "tp", "fp", and the ratios "tp_fp" (TP/FP) and
+        "precision" (TP/(TP+FP)), None when undefined. None for a file without true_pos
+        column.
+    """
+    pairs = tp = 0
+    with open(path, "r", newline="") as csvfile:
+        reader = csv.reader(csvfile, delimiter=",")
+        headers = next(reader, [])
+        # Filter out non-annotated
+        if headers[:1] != ["true_pos"]:
+            return None
+        # Rows are counted as they are read, none of them is kept
+        for row in reader:
+            pairs += 1
+            tp += int(row[0]) == 1
+    fp = pairs - tp
+    return {
+        "path": path,
+        "file": os.path.basename(path),
+        "pairs": pairs,
+        "tp": tp,
+        "fp": fp,
+        "tp_fp": tp / fp if fp else None,
+        "precision": tp / pairs if pairs else None,
+    }
+
+
+def tp_stats(paths: list[str], workers: int = 1) -> list[dict]:
+    """
+    True positive statistics of many annotated files, see count_tp().
+
+    Args
+    -------
+    paths : list[str]
+        Annotated csv files, or folders of them, e.g. glob.glob("annotated-*").
+    workers : int
+        Number of processes counting files in parallel.
+
+    Returns
+    -------
+    list[dict]
+        Statistics of every annotated file, in the order of paths and of the file names
+        in a folder. Files without true_pos column are left out.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, file)
+                for file in sorted(os.listdir(path))
+                if file.endswith(".csv")
+            )
+        else:
+            files.append(path)
+
+    if workers <= 1:
+        results = map(count_tp, files)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Thousands of small files, send them in batches
+            chunksize = max(1, len(files) // (workers * 4))
+            results = list(executor.map(count_tp, files, chunksize=chunksize))
+    results = [result for result in results if result is not None]
+    print(f"Files: {len(files)}, annotated: {len(results)}")
+    return results
+
+
+def write_tp_stats(results: list[dict], output_file: str):
+    """
+    Writes the results of tp_stats() to a .json file, or to a .csv file with the columns
+    of STATS_COLUMNS.
+    """
+    with open(output_file, "w", newline="") as file:
+        if output_file.endswith(".json"):
+            json.dump(results, file, indent=2)
+        else:
+            writer = csv.DictWriter(file, fieldnames=STATS_COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)
 
 
 def calc_tp(annotated_path: str) -> list[str | None]:
@@ -10,20 +104,11 @@ def calc_tp(annotated_path: str) -> list[str | None]:
     results = []
     for file in files:
         if file.endswith(".csv"):
-            rows = []
-            with open(os.path.join(annotated_path, file), "r", newline="") as csvfile:
-                reader = csv.reader(csvfile, delimiter=",")
-                for row in reader:
-                    rows.append(row)
-            headers = rows[0]
-            # Filter out non-annotated
-            if headers[0] != "true_pos":
+            stats = count_tp(os.path.join(annotated_path, file))
+            if stats is None:
                 results.append(None)
                 continue
-            # First element is header, skip
-            rows = rows[1:]
-            pos = len(rows)
-            tp = len([row for row in rows if int(row[0]) == 1])
+            pos, tp = stats["pairs"], stats["tp"]
             results.append(
                 f"\nFile: {file} \nPairs: {pos}, TP: {tp}, FP: {pos - tp}, TP/FP: {tp/(pos-tp):.2f}, TP/(TP+FP): {tp/pos:.2f}"
             )
@@ -35,6 +120,8 @@ def main():
     for result in calc_tp(annotated_path):
         if result:
             print(result)
+    # For a report over many folders, use instead
+    # write_tp_stats(tp_stats(glob.glob("annotated-*"), workers=8), "tp_stats.csv")
 
 
 if __name__ == "__main__":